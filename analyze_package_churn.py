@@ -0,0 +1,45 @@
+# /// script
+# requires-python = "~=3.12.0"
+# ///
+
+"""
+Reports package-churn across the projects' full backup histories: which packages change most, how long their versions
+  stay pinned, and which top-level requirements cause the most update-nights. See lib_churn_analytics.py.
+(`query_run_history.py package-churn` covers only runs recorded in the run-history database.)
+
+Usage...
+`$ uv run ./analyze_package_churn.py /path/to/project_a_code/ /path/to/project_b_code/ [--top 20]`
+`$ uv run ./analyze_package_churn.py /path/to/*/project_code/`
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import lib_churn_analytics
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Analyze package-churn across projects' requirements-backups.")
+    parser.add_argument(
+        'project_paths',
+        nargs='+',
+        type=Path,
+        help='project code-directories; each backup-dir is its `../requirements_backups`',
+    )
+    parser.add_argument('--top', type=int, default=20, help='rows per table')
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> str:
+    """
+    Scans the backup histories; returns the report.
+    """
+    options: argparse.Namespace = parse_args(args)
+    project_paths: list[Path] = sorted({path.resolve() for path in options.project_paths})
+    (table, stats) = lib_churn_analytics.scan_projects(project_paths)
+    return lib_churn_analytics.make_report(table, stats, options.top)
+
+
+if __name__ == '__main__':
+    print(main(sys.argv[1:]))
@@ -0,0 +1,142 @@
+# /// script
+# requires-python = "~=3.12.0"
+# dependencies = ["python-dotenv~=1.0.0"]
+# ///
+
+"""
+Measures the import-time (cold-start cost) of each self-updater entry point, in fresh interpreters.
+
+For each entry point, reports the median and min cumulative import-time over the samples,
+  and the largest imports it pulls in (cumulative, from the last sample).
+
+Also measures building the update-email for large diffs (rendering, and the MIME message; no sending):
+  median time and peak memory, with the diff inlined and with it attached gzipped (see lib_emailer.py).
+
+Usage...
+`$ uv run ./benchmark_imports.py [--samples 7] [--top 8]`
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+from lib_benchmarker import median
+from lib_startup_profiler import parse_importtime_output
+
+ENTRY_POINTS: list[str] = [
+    'self_updater',
+    'query_run_history',
+    'dedup_venvs',
+    'analyze_package_churn',
+    'roll_out_updates',
+    'benchmark_imports',
+]
+DIFF_SIZES: list[int] = [100_000, 1_000_000, 10_000_000]  # bytes; update-email measurements
+
+
+def measure_entry_point(module_name: str, sample_count: int) -> tuple[list[int], dict]:
+    """
+    Imports the module `sample_count` times, each in a fresh interpreter;
+      returns the module's cumulative import-times (microseconds), and the last sample's per-module times.
+    """
+    code_dir: Path = Path(__file__).resolve().parent
+    samples: list[int] = []
+    import_times: dict = {}
+    for _ in range(sample_count):
+        result: subprocess.CompletedProcess = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+            cwd=str(code_dir),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        import_times = parse_importtime_output(result.stderr)
+        samples.append(import_times[module_name])
+    return (samples, import_times)
+
+
+def make_report(module_name: str, samples: list[int], import_times: dict, top_count: int) -> str:
+    """
+    Formats one entry point's measurements.
+    """
+    lines: list[str] = [
+        f'{module_name}: median {median(samples) / 1000:.1f} ms, min {min(samples) / 1000:.1f} ms ({len(samples)} samples)'
+    ]
+    largest: list[tuple[str, int]] = sorted(
+        ((name, usec) for name, usec in import_times.items() if name != module_name), key=lambda item: item[1], reverse=True
+    )
+    for name, usec in largest[:top_count]:
+        lines.append(f'    {usec / 1000:7.1f} ms  {name}')
+    return '\n'.join(lines)
+
+
+def make_diff_text(size: int) -> str:
+    """
+    Returns a synthetic requirements-diff of about `size` bytes.
+    """
+    lines: list[str] = []
+    for i in range(size // 48 + 1):
+        lines.append(f'-package-number-{i:07d}==1.0.0\n+package-number-{i:07d}==1.0.1')
+    return '\n'.join(lines)[:size]
+
+
+def measure_diff_email(diff_size: int, inline: bool, sample_count: int) -> tuple[list[float], int, int]:
+    """
+    Builds the update-email for a diff of `diff_size` bytes, `sample_count` times;
+      returns the build-times (seconds), the peak traced memory (bytes), and the message's size.
+    """
+    import lib_emailer  # imported here; only needed for this measurement
+
+    settings = SimpleNamespace(
+        sys_admin_recipients=[], email_from='benchmark@localhost', email_host='localhost', email_host_port=25
+    )
+    emailer = lib_emailer.Emailer(Path('benchmark_project'), settings)
+    emailer.diff_inline_max_bytes = diff_size if inline else 0
+    diff_text: str = make_diff_text(diff_size)
+    (samples, peak, message_size) = ([], 0, 0)
+    for _ in range(sample_count):
+        tracemalloc.start()
+        start: float = time.perf_counter()
+        message: str = emailer.create_update_ok_message(diff_text)
+        attachments: list[tuple[str, bytes]] = emailer.make_diff_attachments(diff_text)
+        message_size = len(emailer.build_message(['"admin" <admin@localhost>'], message, attachments).as_string())
+        samples.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return (samples, peak, message_size)
+
+
+def make_diff_email_report(sample_count: int) -> str:
+    """
+    Formats the update-email measurements, for each diff size, inlined and attached.
+    """
+    lines: list[str] = ['update-email build, by diff size (median time, peak memory, message size):']
+    for diff_size in DIFF_SIZES:
+        for inline in (True, False):
+            (samples, peak, message_size) = measure_diff_email(diff_size, inline, sample_count)
+            lines.append(
+                f'    {diff_size / 1_000_000:5.1f} MB diff, {"inlined " if inline else "attached"}: '
+                f'{median(samples) * 1000:8.1f} ms, {peak / 1_000_000:6.1f} MB peak, {message_size / 1_000_000:6.2f} MB message'
+            )
+    return '\n'.join(lines)
+
+
+def main(args: list[str]) -> str:
+    parser = argparse.ArgumentParser(description='Measure the import-time of each self-updater entry point.')
+    parser.add_argument('--samples', type=int, default=7)
+    parser.add_argument('--top', type=int, default=8, help='number of largest imports to list')
+    options: argparse.Namespace = parser.parse_args(args)
+    reports: list[str] = []
+    for module_name in ENTRY_POINTS:
+        (samples, import_times) = measure_entry_point(module_name, options.samples)
+        reports.append(make_report(module_name, samples, import_times, options.top))
+    reports.append(make_diff_email_report(options.samples))
+    return '\n\n'.join(reports)
+
+
+if __name__ == '__main__':
+    print(main(sys.argv[1:]))
@@ -0,0 +1,58 @@
+# /// script
+# requires-python = "~=3.12.0"
+# dependencies = ["python-dotenv~=1.0.0"]
+# ///
+
+"""
+Reports byte-identical files across the projects' venvs, and the disk and page-cache memory sharing them would save;
+  with `--consolidate`, hardlinks them to a shared content-store. See lib_venv_dedup.py.
+
+Usage...
+`$ uv run ./dedup_venvs.py /path/to/project_a_code/ /path/to/project_b_code/ [--min-size 1024]`
+`$ uv run ./dedup_venvs.py /path/to/*/project_code/ --consolidate [--store /path/to/venv_store]`
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import lib_common
+import lib_venv_dedup
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Find (and optionally hardlink) identical files across projects' venvs.")
+    parser.add_argument('project_paths', nargs='+', type=Path, help='project code-directories; each venv is its `../env`')
+    parser.add_argument('--min-size', type=int, default=1024, help='ignore files smaller than this, in bytes')
+    parser.add_argument('--consolidate', action='store_true', help='hardlink the duplicates to the content-store')
+    parser.add_argument(
+        '--store', type=Path, default=None, help='content-store directory (default: "outer-stuff" `venv_store/`)'
+    )
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> str:
+    """
+    Scans the venvs; consolidates if asked; returns the report.
+    """
+    options: argparse.Namespace = parse_args(args)
+    venv_paths: list[Path] = sorted({lib_common.determine_venv_paths(path.resolve())[1] for path in options.project_paths})
+    scanned_at_ns: int = time.time_ns()
+    groups: dict[str, list[tuple[Path, tuple]]] = lib_venv_dedup.find_duplicate_groups(venv_paths, options.min_size)
+    summary: dict = lib_venv_dedup.summarize(groups)
+    consolidation: dict | None = None
+    pruned: int = 0
+    if options.consolidate:
+        store_dir: Path = options.store
+        if store_dir is None:
+            import lib_settings  # imported here; only needed without `--store`
+
+            store_dir = lib_settings.get_settings().stuff_dir / 'venv_store'
+        consolidation = lib_venv_dedup.consolidate(groups, store_dir, scanned_at_ns)
+        pruned = lib_venv_dedup.prune_store(store_dir)
+    return lib_venv_dedup.make_report(summary, len(venv_paths), consolidation, pruned)
+
+
+if __name__ == '__main__':
+    print(main(sys.argv[1:]))
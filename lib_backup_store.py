@@ -0,0 +1,296 @@
+"""
+Module used by self_updater.py
+Contains code for the `requirements_backups` store: recent compiles as loose files, older ones deduplicated and archived.
+
+Layout, in `requirements_backups/`:
+- `{env}_{timestamp}.txt` -- the recent distinct compiles, as loose files (what the compare, diff, sync etc read).
+- `backup_index.jsonl` -- one line per recorded compile: its name and body-digest (a "pointer" per timestamp).
+- `backup_archive.zip` -- LZMA-compressed; one `{digest}.txt` member per distinct body, holding the older compiles.
+- `active` -- a symlink to the compile the venv was last synced to (ie "what is deployed right now"); backups themselves
+    are never rewritten. (Backups from before the symlink existed were marked by a `# ACTIVE` first line.)
+
+A compile identical to the previous one is recorded as a pointer only; its loose file is removed.
+Loose files beyond the most-recent `keep_loose` are packed into the archive (once per distinct body), then removed --
+  only after the new archive, written beside the old, is renamed into place; an interrupted pack loses nothing.
+Archived entries are dropped by the optional retention envars (oldest first): `SLFUPDTR__BACKUP_RETENTION_DAYS`,
+  `SLFUPDTR__BACKUP_RETENTION_COUNT` and `SLFUPDTR__BACKUP_RETENTION_BYTES` (the archive's size).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+INDEX_NAME = 'backup_index.jsonl'
+ARCHIVE_NAME = 'backup_archive.zip'
+ACTIVE_LINK_NAME = 'active'
+LEGACY_ACTIVE_MARKER = '# ACTIVE\n'
+
+
+def strip_header(lines: list[str]) -> list[str]:
+    """
+    Returns a compile's body -- its lines after the initial comments, which hold the compile-command
+      (with its timestamped output-path, so always different), and, in legacy backups, `# ACTIVE`.
+    """
+    non_comment_index: int = next((i for i, line in enumerate(lines) if not line.startswith('#')), len(lines))
+    return lines[non_comment_index:]
+
+
+def body_digest(text: str) -> str:
+    """
+    Returns the digest of a compile's body.
+    """
+    body: list[str] = strip_header(text.splitlines(keepends=True))
+    return hashlib.sha256(''.join(body).encode()).hexdigest()[:16]
+
+
+def find_recent_backups(backup_dir: Path, count: int | None = 2) -> list[Path]:
+    """
+    Returns the newest `count` (or, if None, all) loose backups, newest first.
+    """
+    backups: list[Path] = sorted((f for f in backup_dir.iterdir() if f.suffix == '.txt' and f.is_file()), reverse=True)
+    return backups[:count]
+
+
+def load_index(backup_dir: Path) -> list[dict]:
+    """
+    Returns the index entries, oldest first.
+    """
+    index_path: Path = backup_dir / INDEX_NAME
+    if not index_path.exists():
+        return []
+    return [json.loads(line) for line in index_path.read_text().splitlines() if line.strip()]
+
+
+def append_index_entry(backup_dir: Path, name: str, digest: str) -> None:
+    with (backup_dir / INDEX_NAME).open('a') as f:
+        f.write(json.dumps({'name': name, 'digest': digest}) + '\n')
+    return
+
+
+def record_backup(backup_path: Path) -> str:
+    """
+    Adds a kept compile to the index; returns its body-digest.
+    Called by self_updater.manage_update() once an update is in place.
+    """
+    digest: str = body_digest(backup_path.read_text())
+    append_index_entry(backup_path.parent, backup_path.stem, digest)
+    log.debug(f'recorded backup ``{backup_path.name}``, digest ``{digest}``')
+    return digest
+
+
+def record_unchanged_backup(backup_path: Path) -> str:
+    """
+    Records a compile identical to the previous one as a pointer only, and removes its loose file
+      (so the loose files stay distinct, and the previous compile stays the newest).
+    Called by self_updater.manage_update() when no differences were found.
+    """
+    digest: str = record_backup(backup_path)
+    backup_path.unlink()
+    log.info(f'ok / unchanged compile ``{backup_path.name}`` recorded as a pointer')
+    return digest
+
+
+def mark_active(backup_path: Path) -> None:
+    """
+    Points the `active` symlink at the backup, atomically (a new symlink is renamed over the old one).
+    Called by self_updater.mark_active().
+    """
+    backup_dir: Path = backup_path.parent
+    tmp_link: Path = backup_dir / f'.{ACTIVE_LINK_NAME}.tmp'
+    tmp_link.unlink(missing_ok=True)  # ie left by an interrupted run
+    tmp_link.symlink_to(backup_path.name)  # relative, so the backup-dir can be moved
+    os.replace(tmp_link, backup_dir / ACTIVE_LINK_NAME)
+    log.debug(f'active -> ``{backup_path.name}``')
+    return
+
+
+def find_active_backup(backup_dir: Path) -> Path | None:
+    """
+    Returns the active backup (the compile the venv was last synced to), or None if there isn't one yet.
+    Falls back to the newest legacy backup marked `# ACTIVE`, for project-dirs not yet updated since the symlink.
+    """
+    active_link: Path = backup_dir / ACTIVE_LINK_NAME
+    if active_link.is_symlink():
+        return backup_dir / os.readlink(active_link)
+    for backup_path in find_recent_backups(backup_dir, count=None):
+        with backup_path.open() as f:
+            if f.readline() == LEGACY_ACTIVE_MARKER:
+                return backup_path
+    return None
+
+
+def read_backup(backup_dir: Path, name: str) -> str:
+    """
+    Returns the text of a recorded compile, ie `local_2025-01-15T02-00-04`, whether loose or archived.
+    """
+    loose_path: Path = backup_dir / f'{name}.txt'
+    if loose_path.exists():
+        return loose_path.read_text()
+    entries: list[dict] = load_index(backup_dir)
+    digest: str | None = next((entry['digest'] for entry in entries if entry['name'] == name), None)
+    if digest is None:
+        raise KeyError(f'no backup named ``{name}``')
+    archive_path: Path = backup_dir / ARCHIVE_NAME
+    if archive_path.exists():
+        with zipfile.ZipFile(archive_path) as archive:
+            if f'{digest}.txt' in archive.namelist():
+                return archive.read(f'{digest}.txt').decode()
+    for entry in entries:  # ie a pointer to a body that's still loose
+        same_body_path: Path = backup_dir / f'{entry["name"]}.txt'
+        if entry['digest'] == digest and same_body_path.exists():
+            return same_body_path.read_text()
+    raise KeyError(f'body of backup ``{name}`` not found')
+
+
+def iter_backups(backup_dir: Path) -> Iterator[tuple[str, str, str | None]]:
+    """
+    Yields every recorded compile, oldest first, as (name, body-digest, text).
+    The text is None for a body already yielded, so each distinct body is read (and decompressed) just once;
+      the archive is opened once. Includes loose backups from before the index existed.
+    Called by lib_churn_analytics.scan_backup_dir().
+    """
+    digests: dict[str, str | None] = {entry['name']: entry['digest'] for entry in load_index(backup_dir)}
+    loose_paths: dict[str, Path] = {path.stem: path for path in find_recent_backups(backup_dir, count=None)}
+    loose_by_digest: dict[str, Path] = {digests[name]: path for name, path in loose_paths.items() if digests.get(name)}
+    for name in loose_paths:
+        digests.setdefault(name, None)  # digested when read
+    archive_path: Path = backup_dir / ARCHIVE_NAME
+    archive: zipfile.ZipFile | None = zipfile.ZipFile(archive_path) if archive_path.exists() else None
+    try:
+        members: set[str] = set(archive.namelist()) if archive else set()
+        seen: set[str] = set()
+        for name in sorted(digests, key=lambda name: name.rsplit('_', 1)[1]):
+            digest: str | None = digests[name]
+            if digest in seen:
+                yield (name, digest, None)
+                continue
+            if name in loose_paths:
+                text: str = loose_paths[name].read_text()
+                digest = digest or body_digest(text)
+            elif f'{digest}.txt' in members:
+                text = archive.read(f'{digest}.txt').decode()
+            elif digest in loose_by_digest:
+                text = loose_by_digest[digest].read_text()
+            else:
+                log.warning(f'body of backup ``{name}`` not found; skipping it')
+                continue
+            if digest in seen:  # ie a legacy loose file, identical to an earlier one
+                yield (name, digest, None)
+                continue
+            seen.add(digest)
+            yield (name, digest, text)
+    finally:
+        if archive:
+            archive.close()
+    return
+
+
+def archive_old_backups(backup_dir: Path, keep_loose: int = 30) -> None:
+    """
+    Packs the loose backups beyond the newest `keep_loose` into the archive, then applies the retention settings.
+    Called by self_updater.archive_old_backups().
+    """
+    loose: list[Path] = find_recent_backups(backup_dir, count=None)
+    active_path: Path | None = find_active_backup(backup_dir)
+    to_pack: list[Path] = [path for path in loose[keep_loose:] if path != active_path]  # the active one stays loose
+    if to_pack:
+        indexed_names: set[str] = {entry['name'] for entry in load_index(backup_dir)}
+        archive_path: Path = backup_dir / ARCHIVE_NAME
+        archive_tmp: Path = backup_dir / f'{ARCHIVE_NAME}.tmp'
+        digests: dict[Path, str] = {}
+        ## write a new archive -- the existing members plus the new -- beside the old one
+        with zipfile.ZipFile(archive_tmp, 'w', compression=zipfile.ZIP_LZMA) as new:
+            archived: set[str] = set()
+            if archive_path.exists():
+                with zipfile.ZipFile(archive_path) as old:
+                    for member in old.namelist():
+                        new.writestr(member, old.read(member))
+                        archived.add(member)
+            for backup_path in sorted(to_pack):
+                text: str = backup_path.read_text()
+                digests[backup_path] = body_digest(text)
+                if f'{digests[backup_path]}.txt' not in archived:
+                    new.writestr(f'{digests[backup_path]}.txt', text)
+                    archived.add(f'{digests[backup_path]}.txt')
+        os.replace(archive_tmp, archive_path)  # the archive is always a complete old or new version
+        ## only then index and remove the loose files ---------------
+        for backup_path, digest in digests.items():
+            if backup_path.stem not in indexed_names:  # ie a backup from before the index existed
+                append_index_entry(backup_dir, backup_path.stem, digest)
+            backup_path.unlink()
+        log.debug(f'packed ``{len(to_pack)}`` backups into the archive')
+    apply_retention(backup_dir, {path.stem for path in loose if path.exists()})
+    return
+
+
+def determine_retention_settings() -> tuple[int | None, int | None, int | None]:
+    """
+    Returns the optional (max-age-days, max-count, max-archive-bytes) retention settings.
+    """
+    settings: list[int | None] = []
+    for envar in ('SLFUPDTR__BACKUP_RETENTION_DAYS', 'SLFUPDTR__BACKUP_RETENTION_COUNT', 'SLFUPDTR__BACKUP_RETENTION_BYTES'):
+        value: str = os.environ.get(envar, '')
+        settings.append(int(value) if value.strip() else None)
+    return (settings[0], settings[1], settings[2])
+
+
+def parse_backup_timestamp(name: str) -> datetime:
+    """
+    Returns the timestamp of a backup-name, ie `local_2025-01-15T02-00-04` -> datetime(2025, 1, 15, 2, 0, 4).
+    """
+    return datetime.strptime(name.rsplit('_', 1)[1], '%Y-%m-%dT%H-%M-%S')
+
+
+def apply_retention(backup_dir: Path, loose_names: set[str]) -> None:
+    """
+    Drops archived entries (oldest first) beyond the retention settings; loose backups are never dropped.
+    Rewrites the archive without any member no longer referenced.
+    Called by archive_old_backups().
+    """
+    (max_days, max_count, max_bytes) = determine_retention_settings()
+    if max_days is None and max_count is None and max_bytes is None:
+        return
+    entries: list[dict] = sorted(load_index(backup_dir), key=lambda entry: entry['name'].rsplit('_', 1)[1])
+    archive_path: Path = backup_dir / ARCHIVE_NAME
+    member_sizes: dict = {}
+    if archive_path.exists():
+        with zipfile.ZipFile(archive_path) as archive:
+            member_sizes = {info.filename: info.compress_size for info in archive.infolist()}
+    cutoff: datetime | None = datetime.now() - timedelta(days=max_days) if max_days is not None else None
+    kept: list[dict] = list(entries)
+    for oldest in entries:
+        if oldest['name'] in loose_names:
+            continue  # ie the `active` backup, kept loose even when it's old (after a rollback)
+        kept_digests: set[str] = {entry['digest'] for entry in kept}
+        archive_bytes: int = sum(member_sizes.get(f'{digest}.txt', 0) for digest in kept_digests)
+        too_old: bool = cutoff is not None and parse_backup_timestamp(oldest['name']) < cutoff
+        too_many: bool = max_count is not None and len(kept) > max_count
+        too_big: bool = max_bytes is not None and archive_bytes > max_bytes
+        if not (too_old or too_many or too_big):
+            break  # entries are oldest-first; the rest are newer
+        kept.remove(oldest)
+    if len(kept) == len(entries):
+        return
+    ## rewrite the index and archive --------------------------------
+    index_tmp: Path = backup_dir / f'{INDEX_NAME}.tmp'
+    index_tmp.write_text(''.join(json.dumps(entry) + '\n' for entry in kept))
+    os.replace(index_tmp, backup_dir / INDEX_NAME)
+    if archive_path.exists():
+        kept_members: set[str] = {f'{entry["digest"]}.txt' for entry in kept}
+        if set(member_sizes) - kept_members:
+            archive_tmp: Path = backup_dir / f'{ARCHIVE_NAME}.tmp'
+            with zipfile.ZipFile(archive_path) as old, zipfile.ZipFile(
+                archive_tmp, 'w', compression=zipfile.ZIP_LZMA
+            ) as new:
+                for member in sorted(set(member_sizes) & kept_members):
+                    new.writestr(member, old.read(member))
+            os.replace(archive_tmp, archive_path)
+    log.info(f'ok / retention dropped ``{len(entries) - len(kept)}`` archived backups')
+    return
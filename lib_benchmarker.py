@@ -0,0 +1,199 @@
+"""
+Module used by self_updater.py
+Contains code for the optional performance-regression gate around a dependency update.
+
+If the project has a `run_benchmarks.py` next to its `run_tests.py`, it's run repeatedly before and after the sync.
+The script may print a JSON object of metric-name -> seconds as its last stdout line, ie `{"home_page": 0.12}`;
+  otherwise the wall-time of the whole script is used as a single `wall_time` metric.
+Before/after samples are compared with a one-sided Mann-Whitney U test, which doesn't assume normally-distributed timings.
+"""
+
+import json
+import logging
+import math
+import os
+import subprocess
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import lib_common
+import lib_process_runner
+from lib_call_runtests import make_local_scoped_env
+
+log = logging.getLogger(__name__)
+
+
+def find_benchmark_script(project_path: Path) -> Path | None:
+    """
+    Returns the path to the project's `run_benchmarks.py`, or None if the project doesn't have one.
+    """
+    benchmark_path: Path = project_path / 'run_benchmarks.py'
+    return_val: Path | None = benchmark_path if benchmark_path.exists() else None
+    log.debug(f'benchmark_path, ``{return_val}``')
+    return return_val
+
+
+def run_benchmark_samples(project_path: Path, sample_count: int) -> dict:
+    """
+    Runs the project's `run_benchmarks.py` in the project venv `sample_count` times.
+    Returns a dict of metric-name -> list of sample-seconds; empty if the script fails
+      (a broken benchmark shouldn't halt the update; the failure is logged).
+    Called by self_updater.manage_update(), before and after the sync.
+    """
+    log.info(f'::: running ``{sample_count}`` benchmark samples ----------')
+    (venv_bin_path, venv_path) = lib_common.determine_venv_paths(project_path)
+    local_scoped_env: dict = make_local_scoped_env(project_path, venv_bin_path, venv_path)
+    command: list[str] = [str(venv_bin_path / 'python3'), str(project_path / 'run_benchmarks.py')]
+    samples: dict = {}
+    for _ in range(sample_count):
+        start: float = time.monotonic()
+        try:
+            result: subprocess.CompletedProcess = lib_process_runner.run(
+                command,
+                phase='benchmark',
+                cwd=str(project_path),
+                env=local_scoped_env,
+                capture_output=True,
+                text=True,
+                low_impact=False,
+            )  # low_impact=False, so duty-cycle pauses and rlimits don't skew the measurement
+        except lib_process_runner.ProcessTimeoutError:
+            log.exception('benchmark script timed out')
+            return {}
+        wall_time: float = time.monotonic() - start
+        if result.returncode != 0:
+            log.error(f'benchmark script failed; stderr, ``{result.stderr}``')
+            return {}
+        for metric, seconds in parse_benchmark_output(result.stdout, wall_time).items():
+            samples.setdefault(metric, []).append(seconds)
+    log.info(f'ok / benchmark samples, ``{samples}``')
+    return samples
+
+
+def parse_benchmark_output(stdout: str, wall_time: float) -> dict:
+    """
+    Returns the metrics from the last stdout line if it's a JSON object of numbers; otherwise `{'wall_time': wall_time}`.
+    Called by run_benchmark_samples().
+    """
+    lines: list[str] = stdout.strip().splitlines()
+    try:
+        metrics: dict = json.loads(lines[-1])
+        if not (isinstance(metrics, dict) and metrics):
+            raise ValueError('not a non-empty JSON object')
+        return_val: dict = {str(k): float(v) for k, v in metrics.items()}
+    except (IndexError, ValueError, TypeError):
+        return_val = {'wall_time': wall_time}
+    return return_val
+
+
+def compare_benchmarks(before: dict, after: dict, threshold: float, alpha: float = 0.05) -> list[dict]:
+    """
+    Returns the metrics that regressed: where the after-median exceeds the before-median by more than `threshold`
+      (ie 0.10 for 10%), and the one-sided Mann-Whitney U test says the slowdown isn't noise (p < alpha).
+    Called by self_updater.manage_update().
+    """
+    regressions: list[dict] = []
+    for metric in sorted(set(before) & set(after)):
+        before_median: float = median(before[metric])
+        after_median: float = median(after[metric])
+        ratio: float = after_median / before_median if before_median > 0 else math.inf
+        p_value: float = mann_whitney_p_value(before[metric], after[metric])
+        log.debug(f'metric, ``{metric}``; ratio, ``{ratio:.3f}``; p_value, ``{p_value:.4f}``')
+        if ratio > 1 + threshold and p_value < alpha:
+            regressions.append(
+                {'metric': metric, 'before': before_median, 'after': after_median, 'ratio': ratio, 'p_value': p_value}
+            )
+    log.info(f'ok / regressions, ``{regressions}``')
+    return regressions
+
+
+def make_benchmark_report(regressions: list[dict], rolled_back: bool) -> None | str:
+    """
+    Returns a problem-message for the update-email, or None if there were no regressions.
+    Called by self_updater.manage_update().
+    """
+    if not regressions:
+        return None
+    report_lines: list[str] = ['Performance regression detected by run_benchmarks.py (median seconds, before --> after):']
+    for regression in regressions:
+        report_lines.append(
+            f'- {regression["metric"]}: {regression["before"]:.4f} --> {regression["after"]:.4f} '
+            f'({(regression["ratio"] - 1) * 100:+.0f}%, p={regression["p_value"]:.3f})'
+        )
+    if rolled_back:
+        report_lines.append(
+            'The venv was rolled back to the previous requirements; the update will be retried on the next run.'
+        )
+    return '\n'.join(report_lines)
+
+
+def determine_benchmark_settings() -> tuple[int, float, str]:
+    """
+    Returns (sample_count, threshold, action) from the optional envars:
+    - `SLFUPDTR__BENCHMARK_SAMPLES` (default 5)
+    - `SLFUPDTR__BENCHMARK_THRESHOLD` (default 0.10, ie a 10% slowdown)
+    - `SLFUPDTR__BENCHMARK_ACTION`, either `report` (the default) or `rollback`
+    An invalid value is logged, and its default used; a typo shouldn't halt the update.
+    """
+    try:
+        sample_count: int = max(2, int(os.environ.get('SLFUPDTR__BENCHMARK_SAMPLES', '5')))
+    except ValueError:
+        log.warning('invalid SLFUPDTR__BENCHMARK_SAMPLES value; using 5')
+        sample_count = 5
+    try:
+        threshold: float = float(os.environ.get('SLFUPDTR__BENCHMARK_THRESHOLD', '0.10'))
+    except ValueError:
+        log.warning('invalid SLFUPDTR__BENCHMARK_THRESHOLD value; using 0.10')
+        threshold = 0.10
+    action: str = os.environ.get('SLFUPDTR__BENCHMARK_ACTION', 'report').lower()
+    if action not in ('report', 'rollback'):
+        log.warning(f'invalid SLFUPDTR__BENCHMARK_ACTION value, ``{action}``; using report')
+        action = 'report'
+    log.debug(f'sample_count, ``{sample_count}``; threshold, ``{threshold}``; action, ``{action}``')
+    return (sample_count, threshold, action)
+
+
+## statistics helpers -----------------------------------------------
+
+
+def median(values: list[float]) -> float:
+    ordered: list[float] = sorted(values)
+    middle: int = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def mann_whitney_p_value(before: list[float], after: list[float]) -> float:
+    """
+    Returns the one-sided Mann-Whitney U p-value for "after tends to be larger than before".
+    Uses the exact U-distribution for small samples, and the normal approximation for larger ones.
+    """
+    m, n = len(after), len(before)
+    u_stat: float = sum(1.0 if a > b else 0.5 if a == b else 0.0 for a in after for b in before)
+    if m <= 25 and n <= 25:
+        counts: tuple[int, ...] = _u_distribution(m, n)
+        first: int = math.ceil(u_stat)
+        p_value: float = sum(counts[first:]) / math.comb(m + n, m)
+    else:
+        mean: float = m * n / 2
+        sd: float = math.sqrt(m * n * (m + n + 1) / 12)
+        z: float = (u_stat - 0.5 - mean) / sd  # with continuity-correction
+        p_value = 0.5 * math.erfc(z / math.sqrt(2))
+    return p_value
+
+
+@lru_cache(maxsize=None)
+def _u_distribution(m: int, n: int) -> tuple[int, ...]:
+    """
+    Returns counts of the orderings giving each U value (0..m*n) for sample sizes m and n.
+    """
+    if m == 0 or n == 0:
+        return (1,)
+    with_last_from_m: tuple[int, ...] = _u_distribution(m - 1, n)  # largest value is from m; adds n to U
+    with_last_from_n: tuple[int, ...] = _u_distribution(m, n - 1)
+    counts: list[int] = [0] * (m * n + 1)
+    for u, count in enumerate(with_last_from_m):
+        counts[u + n] += count
+    for u, count in enumerate(with_last_from_n):
+        counts[u] += count
+    return tuple(counts)
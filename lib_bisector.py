@@ -0,0 +1,194 @@
+"""
+Module used by self_updater.py
+Contains code for bisecting a dependency-update that breaks the project's tests.
+
+Given the previous (passing) and new (failing) compiled backups, builds candidate intermediate lockfiles --
+  the previous lockfile with some of the package-changes applied -- and tests them in parallel throwaway venvs.
+  The throwaway venvs are populated by `uv pip sync`, which links from the uv cache, so they're cheap to create.
+  Each candidate's tests get their own `SLFUPDTR__TEST_DB_SUFFIX` (ie `_bisect3`), as a sharded test-run's shards do,
+  so concurrent candidates don't share the project's test-database.
+Reports the smallest set of package-changes that reproduces the failure.
+"""
+
+import itertools
+import logging
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import lib_process_runner
+from lib_call_runtests import make_local_scoped_env, make_run_tests_command, run_run_tests_command
+
+log = logging.getLogger(__name__)
+
+
+def run_bisect(
+    old_path: Path, new_path: Path, project_path: Path, python_path: str, uv_path: Path, max_workers: int = 4
+) -> str:
+    """
+    Manages the bisect; returns a report for the update-email.
+    Does not raise: a bisect problem is reported in the returned text, since the update itself has already happened.
+    Called by self_updater.manage_update() when followup tests fail.
+    """
+    log.info('::: bisecting dependency changes ----------')
+    start: float = time.monotonic()
+    try:
+        old_packages: dict = parse_lockfile(old_path.read_text())
+        new_packages: dict = parse_lockfile(new_path.read_text())
+        changes: list[str] = find_changed_packages(old_packages, new_packages)
+        log.debug(f'changes, ``{changes}``')
+        tested_count: list[int] = [0]  # list, so the nested function can update it
+        candidate_numbers = itertools.count(1)  # thread-safe; numbers each candidate's test-db
+
+        def reproduces(change_set: frozenset) -> bool:
+            tested_count[0] += 1
+            candidate_text: str = build_candidate_lockfile(old_packages, new_packages, change_set)
+            db_suffix: str = f'_bisect{next(candidate_numbers)}'
+            return run_candidate_tests(candidate_text, project_path, python_path, uv_path, db_suffix) is False
+
+        if not changes:
+            report = 'Bisect: no package-changes found between the two lockfiles.'
+        elif not reproduces(frozenset(changes)):
+            report = 'Bisect: the failure did not reproduce in a throwaway venv with the full update; it may not be dependency-related.'
+        else:
+            minimal: list[str] = find_minimal_failing_changes(changes, reproduces, max_workers)
+            report_lines: list[str] = ['Bisect: smallest set of package-changes that reproduces the test-failure:']
+            for name in minimal:
+                old_lines: str = ' | '.join(old_packages.get(name, [])) or '(not present)'
+                new_lines: str = ' | '.join(new_packages.get(name, [])) or '(removed)'
+                report_lines.append(f'- {old_lines}  -->  {new_lines}')
+            report = '\n'.join(report_lines)
+        elapsed: float = time.monotonic() - start
+        report += f'\n(bisect tested {tested_count[0]} candidate(s) out of {len(changes)} package-change(s) in {elapsed:.1f} seconds)'
+    except Exception as e:
+        report = f'Bisect: problem bisecting the update; error: ``{e}``'
+        log.exception(report)
+    log.info(f'ok / bisect report, ``{report}``')
+    return report
+
+
+def parse_lockfile(lockfile_text: str) -> dict:
+    """
+    Parses compiled-requirements text into a dict of normalized-package-name -> list of requirement lines.
+    A list, because a `--universal` compile can pin one package more than once, with different environment-markers.
+    Comment lines (including the indented `# via` lines) are skipped.
+    Called by run_bisect().
+    """
+    packages: dict = {}
+    for line in lockfile_text.splitlines():
+        stripped: str = line.strip()
+        if not stripped or stripped.startswith('#') or line.startswith((' ', '\t')):
+            continue
+        name: str = stripped.split(';')[0].split('==')[0].split('@')[0].strip()
+        name = name.split('[')[0].lower().replace('_', '-').replace('.', '-')
+        packages.setdefault(name, []).append(stripped)
+    return packages
+
+
+def find_changed_packages(old_packages: dict, new_packages: dict) -> list[str]:
+    """
+    Returns the sorted names of packages that were added, removed, or changed between the two lockfiles.
+    Called by run_bisect().
+    """
+    names: set[str] = set(old_packages) | set(new_packages)
+    changes: list[str] = sorted(name for name in names if old_packages.get(name) != new_packages.get(name))
+    return changes
+
+
+def build_candidate_lockfile(old_packages: dict, new_packages: dict, change_set: frozenset) -> str:
+    """
+    Builds an intermediate lockfile: the old lockfile, with the new lines for just the packages in `change_set`.
+    Called by run_bisect().
+    """
+    candidate_lines: list[str] = []
+    for name in sorted(set(old_packages) | set(new_packages)):
+        source: dict = new_packages if name in change_set else old_packages
+        candidate_lines.extend(source.get(name, []))
+    return '\n'.join(candidate_lines) + '\n'
+
+
+def run_candidate_tests(
+    candidate_text: str, project_path: Path, python_path: str, uv_path: Path, db_suffix: str
+) -> bool | None:
+    """
+    Creates a throwaway venv, syncs the candidate lockfile into it, and runs the project's tests there,
+      with `SLFUPDTR__TEST_DB_SUFFIX` set to `db_suffix`, so they don't share a test-database with another candidate's.
+    Returns True if the tests pass, False if they fail, and None if the candidate couldn't be installed
+      (an intermediate lockfile can be inconsistent; that counts as "does not reproduce").
+    Called by run_bisect().
+    """
+    with tempfile.TemporaryDirectory(prefix='self_updater_bisect_') as temp_dir:
+        venv_path = Path(temp_dir) / 'env'
+        candidate_path = Path(temp_dir) / 'candidate.txt'
+        candidate_path.write_text(candidate_text)
+        venv_bin_path: Path = venv_path / 'bin'
+        local_scoped_env: dict = make_local_scoped_env(project_path, venv_bin_path, venv_path)
+        local_scoped_env['SLFUPDTR__TEST_DB_SUFFIX'] = db_suffix
+        try:
+            lib_process_runner.run(
+                [str(uv_path), 'venv', str(venv_path), '--python', python_path],
+                phase='bisect',
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            lib_process_runner.run(
+                [str(uv_path), 'pip', 'sync', str(candidate_path)],
+                phase='bisect',
+                check=True,
+                env=local_scoped_env,
+                capture_output=True,
+                text=True,
+            )
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            log.debug(f'candidate could not be installed; stderr, ``{e.stderr}``')
+            return None
+        command: list[str] = make_run_tests_command(project_path, venv_bin_path)
+        (ok, _output) = run_run_tests_command(command, project_path, local_scoped_env)
+    return ok
+
+
+def find_minimal_failing_changes(
+    changes: list[str], reproduces: Callable[[frozenset], bool], max_workers: int = 4
+) -> list[str]:
+    """
+    Finds a minimal subset of `changes` for which `reproduces()` is True, via delta-debugging (ddmin).
+    Each round's candidate subsets and complements are tested concurrently; results are cached.
+    Assumes `reproduces()` is True for the full set of changes.
+    Called by run_bisect().
+    """
+    cache: dict = {}
+
+    def check_all(change_sets: list[frozenset]) -> list[bool]:
+        todo: list[frozenset] = list(dict.fromkeys(s for s in change_sets if s not in cache))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for change_set, result in zip(todo, executor.map(reproduces, todo)):
+                cache[change_set] = result
+        return [cache[s] for s in change_sets]
+
+    current: list[str] = sorted(changes)
+    granularity = 2
+    while len(current) >= 2:
+        chunk_size: float = len(current) / granularity
+        subsets: list[frozenset] = [
+            frozenset(current[int(i * chunk_size) : int((i + 1) * chunk_size)]) for i in range(granularity)
+        ]
+        complements: list[frozenset] = [frozenset(current) - s for s in subsets] if granularity > 2 else []
+        results: list[bool] = check_all(subsets + complements)
+        subset_hits: list[frozenset] = [s for s, r in zip(subsets, results[: len(subsets)]) if r]
+        complement_hits: list[frozenset] = [s for s, r in zip(complements, results[len(subsets) :]) if r]
+        if subset_hits:
+            current = sorted(subset_hits[0])
+            granularity = 2
+        elif complement_hits:
+            current = sorted(complement_hits[0])
+            granularity = max(granularity - 1, 2)
+        elif granularity >= len(current):
+            break
+        else:
+            granularity = min(len(current), granularity * 2)
+    log.debug(f'minimal failing changes, ``{current}``')
+    return current
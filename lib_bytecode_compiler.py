@@ -0,0 +1,89 @@
+"""
+Module used by self_updater.py
+Contains code for byte-compiling the packages changed by a sync, before the restart is triggered.
+
+Without this, the first Passenger workers after the `restart.txt` touch compile the new `.pyc` files on demand,
+  often several workers racing on the same files.
+"""
+
+import logging
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import lib_process_runner
+
+log = logging.getLogger(__name__)
+
+
+def snapshot_dist_infos(venv_path: Path) -> set[Path]:
+    """
+    Returns the venv's installed `.dist-info` directories.
+    Taken before the sync, so the dist-info directories the sync created (ie new or changed packages) can be found.
+    """
+    dist_infos: set[Path] = set(venv_path.glob('lib/python*/site-packages/*.dist-info'))
+    log.debug(f'found ``{len(dist_infos)}`` dist-info directories')
+    return dist_infos
+
+
+def find_changed_py_files(venv_path: Path, dist_infos_before: set[Path]) -> list[Path]:
+    """
+    Returns the `.py` files belonging to distributions installed (or re-installed at a new version) by the sync,
+      from each new dist-info directory's `RECORD` file.
+    """
+    changed_dist_infos: set[Path] = snapshot_dist_infos(venv_path) - dist_infos_before
+    log.debug(f'changed_dist_infos, ``{sorted(d.name for d in changed_dist_infos)}``')
+    py_files: list[Path] = []
+    for dist_info in sorted(changed_dist_infos):
+        site_packages: Path = dist_info.parent
+        record_path: Path = dist_info / 'RECORD'
+        if not record_path.exists():
+            continue
+        for line in record_path.read_text().splitlines():
+            relative_path: str = line.split(',')[0]
+            if relative_path.endswith('.py'):
+                py_file: Path = (site_packages / relative_path).resolve()
+                if py_file.is_file():
+                    py_files.append(py_file)
+    return py_files
+
+
+def precompile_files(venv_bin_path: Path, py_files: list[Path], worker_count: int | None = None) -> tuple[int, float]:
+    """
+    Byte-compiles the files across a pool of venv-python `compileall` processes.
+    Uses the venv's python, so the `.pyc` files match the interpreter that will import them.
+    Each process reads its share of the file-list from stdin (`-i -`), avoiding command-line length limits.
+    Returns (file_count, elapsed_seconds). Failures are logged, not raised; the workers will just compile on demand.
+    """
+    log.info('::: byte-compiling changed packages ----------')
+    start: float = time.monotonic()
+    if not py_files:
+        log.info('ok / no changed files to byte-compile')
+        return (0, 0.0)
+    worker_count = worker_count or os.cpu_count() or 1
+    worker_count = min(worker_count, len(py_files))
+    chunks: list[list[Path]] = [py_files[i::worker_count] for i in range(worker_count)]
+    command: list[str] = [str(venv_bin_path / 'python3'), '-m', 'compileall', '-q', '-i', '-']
+
+    def compile_chunk(chunk: list[Path]) -> int:
+        file_list: str = '\n'.join(str(path) for path in chunk) + '\n'
+        try:
+            result: subprocess.CompletedProcess = lib_process_runner.run(
+                command, phase='precompile', input=file_list, capture_output=True, text=True
+            )
+        except lib_process_runner.ProcessTimeoutError:
+            log.exception('byte-compile timed out; the remaining files will be compiled on demand')
+            return -1
+        if result.returncode != 0:
+            log.warning(f'some files failed to byte-compile; output, ``{result.stdout[-2000:]}``')
+        return result.returncode
+
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        list(executor.map(compile_chunk, chunks))
+    elapsed: float = time.monotonic() - start
+    log.info(
+        f'ok / byte-compiled ``{len(py_files)}`` files in ``{elapsed:.2f}`` seconds across ``{worker_count}`` processes'
+    )
+    return (len(py_files), elapsed)
@@ -1,10 +1,15 @@
+import fnmatch
+import json
 import logging
 import os
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import lib_common
-from lib_emailer import Emailer
+import lib_process_runner
+from lib_emailer import get_emailer
 
 log = logging.getLogger(__name__)
 
@@ -52,17 +57,14 @@ def run_initial_tests(uv_path: Path, project_path: Path, project_email_addresses
     ## set the venv -------------------------------------------------
     venv_tuple: tuple[Path, Path] = lib_common.determine_venv_paths(project_path)  # these are resolved-paths
     (venv_bin_path, venv_path) = venv_tuple
-    local_scoped_env: dict = make_local_scoped_env(project_path, venv_bin_path, venv_path)  # dict of envar-keys and paths
-    ## prep the command ---------------------------------------------
-    command: list[str] = make_run_tests_command(project_path, venv_bin_path)
-    ## run the command ----------------------------------------------
-    command_result: tuple[bool, dict] = run_run_tests_command(command, project_path, local_scoped_env)
+    ## run the tests (sharded, if configured) -----------------------
+    command_result: tuple[bool, dict] = run_project_tests(project_path, venv_bin_path, venv_path)
     (ok, output) = command_result
     if not ok:
         message = f'Error on initial run_tests() call: ``{output}``. Halting self-update.'
         log.exception(message)
         ## email sys-admins -----------------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(project_email_addresses, email_message)
         ## raise exception -----------------------------------------
@@ -86,11 +88,8 @@ def run_followup_tests(uv_path: Path, project_path: Path, project_email_addresse
     ## set the venv -------------------------------------------------
     venv_tuple: tuple[Path, Path] = lib_common.determine_venv_paths(project_path)  # these are resolved-paths
     (venv_bin_path, venv_path) = venv_tuple
-    local_scoped_env: dict = make_local_scoped_env(project_path, venv_bin_path, venv_path)
-    ## prep the command ---------------------------------------------
-    command: list[str] = make_run_tests_command(project_path, venv_bin_path)
-    ## run the command ----------------------------------------------
-    command_result: tuple[bool, dict] = run_run_tests_command(command, project_path, local_scoped_env)
+    ## run the tests (sharded, if configured) -----------------------
+    command_result: tuple[bool, dict] = run_project_tests(project_path, venv_bin_path, venv_path)
     (ok, output) = command_result
     if not ok:
         return_val = f'Error on followup run_tests() call: ``{output}``. Continuing processing to update permissions.'
@@ -135,22 +134,190 @@ def run_followup_tests(uv_path: Path, project_path: Path, project_email_addresse
 ## helpers to the above main functions ------------------------------
 
 
+def run_project_tests(project_path: Path, venv_bin_path: Path, venv_path: Path) -> tuple[bool, dict]:
+    """
+    Runs the project's run_tests.py, either as a single process or sharded across worker processes.
+    Returns tuple (ok, data_dict) either way.
+    Called by run_initial_tests() and run_followup_tests().
+    """
+    shard_count: int = determine_shard_count()
+    test_modules: list[str] = discover_test_modules(project_path) if shard_count > 1 else []
+    if shard_count > 1 and len(test_modules) > 1:
+        return_val: tuple[bool, dict] = run_sharded_tests(project_path, venv_bin_path, venv_path, test_modules, shard_count)
+    else:
+        local_scoped_env: dict = make_local_scoped_env(
+            project_path, venv_bin_path, venv_path
+        )  # dict of envar-keys and paths
+        command: list[str] = make_run_tests_command(project_path, venv_bin_path)
+        return_val: tuple[bool, dict] = run_run_tests_command(command, project_path, local_scoped_env)
+    return return_val
+
+
+def determine_shard_count() -> int:
+    """
+    Returns the number of test-shards to run, from the optional `SLFUPDTR__TEST_SHARDS` envar.
+    Defaults to 1 (ie, a single unsharded run_tests.py process).
+    """
+    try:
+        shard_count: int = max(1, int(os.environ.get('SLFUPDTR__TEST_SHARDS', '1')))
+    except ValueError:
+        log.warning('invalid SLFUPDTR__TEST_SHARDS value; running tests unsharded')
+        shard_count = 1
+    log.debug(f'shard_count, ``{shard_count}``')
+    return shard_count
+
+
+def discover_test_modules(project_path: Path) -> list[str]:
+    """
+    Finds the project's test modules, and returns them as sorted dotted labels,
+      ie `foo_app/tests/test_views.py` becomes `foo_app.tests.test_views`.
+    A test module is a `tests.py` file, or a `test*.py` file inside a `tests` package -- so helpers like
+      `test_settings.py` or `testing_utils.py` next to the app-code aren't run as tests.
+    Skips hidden directories and directories that never hold project tests.
+    Called by run_project_tests().
+    """
+    skip_dirs: set[str] = {'__pycache__', 'env', 'venv', 'node_modules', 'static', 'staticfiles', 'media'}
+    test_modules: list[str] = []
+    for dirpath, dirnames, filenames in os.walk(project_path):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in skip_dirs]  # prunes the walk
+        relative_dir: Path = Path(dirpath).relative_to(project_path)
+        in_tests_package: bool = Path(dirpath).name == 'tests'
+        for filename in filenames:
+            if filename == 'tests.py' or (in_tests_package and fnmatch.fnmatch(filename, 'test*.py')):
+                module_parts: list[str] = [*relative_dir.parts, filename[:-3]]
+                test_modules.append('.'.join(module_parts))
+    test_modules.sort()
+    log.debug(f'test_modules, ``{test_modules}``')
+    return test_modules
+
+
+def estimate_durations(test_modules: list[str], shard_timings: list[dict]) -> dict:
+    """
+    Returns each module's estimated duration, from the previous run's per-shard timings.
+    A shard's process doesn't report per-module times, so a module is estimated at its last shard's run-time divided by
+      the shard's module-count; a module that wasn't in the last run gets the average estimate (or 1 second if none).
+    Called by balance_shards().
+    """
+    known: dict = {}
+    for shard in shard_timings:
+        for module in shard['modules']:
+            known[module] = shard['seconds'] / len(shard['modules'])
+    default_duration: float = sum(known.values()) / len(known) if known else 1.0
+    return {m: known.get(m, default_duration) for m in test_modules}
+
+
+def balance_shards(test_modules: list[str], shard_timings: list[dict], shard_count: int) -> list[list[str]]:
+    """
+    Spreads test modules across shards so the shards' estimated run-times are as even as possible.
+    Uses the longest-first greedy approach: each module, slowest first, goes to the currently-lightest shard.
+    Module estimates come from the previous run's per-shard timings; see estimate_durations().
+    Called by run_sharded_tests().
+    """
+    estimates: dict = estimate_durations(test_modules, shard_timings)
+    shards: list[list[str]] = [[] for _ in range(min(shard_count, len(test_modules)))]
+    loads: list[float] = [0.0] * len(shards)
+    for module in sorted(test_modules, key=lambda m: (-estimates[m], m)):
+        lightest: int = loads.index(min(loads))
+        shards[lightest].append(module)
+        loads[lightest] += estimates[module]
+    log.debug(f'shards, ``{shards}``; estimated loads, ``{loads}``')
+    return shards
+
+
+def run_sharded_tests(
+    project_path: Path, venv_bin_path: Path, venv_path: Path, test_modules: list[str], shard_count: int
+) -> tuple[bool, dict]:
+    """
+    Runs the test modules across `shard_count` concurrent worker processes, and merges the results.
+    Each shard is one process running all its modules -- ie `python3 run_tests.py foo_app.tests.test_views bar_app.tests`
+      -- so the test-database is set up once per shard, not once per module.
+    Each shard gets its own scoped env, with `SLFUPDTR__TEST_SHARD` (ie `1`) and `SLFUPDTR__TEST_DB_SUFFIX` (ie `_shard1`)
+      set, for the project's test-settings to give each shard its own test-database.
+    Returns tuple (ok, data_dict), like run_run_tests_command().
+    Called by run_project_tests().
+    """
+    log.info(f'::: running tests in ``{shard_count}`` shards ----------')
+    timings_path: Path = lib_common.determine_data_dir(project_path) / 'test_shard_timings.json'
+    shard_timings: list[dict] = load_shard_timings(timings_path)
+    shards: list[list[str]] = balance_shards(test_modules, shard_timings, shard_count)
+
+    def run_shard(shard_index: int, shard_modules: list[str]) -> tuple[list[str], bool, dict, float]:
+        local_scoped_env: dict = make_local_scoped_env(project_path, venv_bin_path, venv_path)
+        local_scoped_env['SLFUPDTR__TEST_SHARD'] = str(shard_index)
+        local_scoped_env['SLFUPDTR__TEST_DB_SUFFIX'] = f'_shard{shard_index}'
+        command: list[str] = make_run_tests_command(project_path, venv_bin_path) + shard_modules
+        start: float = time.monotonic()
+        (shard_ok, shard_output) = run_run_tests_command(command, project_path, local_scoped_env)
+        return (shard_modules, shard_ok, shard_output, time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(run_shard, i, shard_modules) for i, shard_modules in enumerate(shards)]
+        results: list[tuple[list[str], bool, dict, float]] = [future.result() for future in futures]
+    (ok, output) = merge_shard_results(results)
+    save_shard_timings(timings_path, results)
+    log.info(f'ok / sharded tests finished; ok, ``{ok}``')
+    return (ok, output)
+
+
+def merge_shard_results(results: list[tuple[list[str], bool, dict, float]]) -> tuple[bool, dict]:
+    """
+    Merges the shards' (modules, ok, output, seconds) results into one (ok, data_dict); the run is ok if every shard is.
+    Called by run_sharded_tests().
+    """
+    ok: bool = all(result[1] for result in results)
+    stdout_parts: list[str] = []
+    stderr_parts: list[str] = []
+    for shard_index, (shard_modules, shard_ok, shard_output, seconds) in enumerate(results):
+        header = f'## shard {shard_index}: {" ".join(shard_modules)} -- {"ok" if shard_ok else "FAILED"} ({seconds:.1f}s)\n'
+        stdout_parts.append(header + shard_output['stdout'])
+        stderr_parts.append(header + shard_output['stderr'])
+    output = {'stdout': '\n'.join(stdout_parts), 'stderr': '\n'.join(stderr_parts)}
+    return (ok, output)
+
+
+def load_shard_timings(timings_path: Path) -> list[dict]:
+    """
+    Loads the previous sharded run's per-shard timings, ie `[{"modules": [...], "seconds": 12.3}, ...]`;
+      returns an empty list if there are none (or they're unreadable).
+    Called by run_sharded_tests().
+    """
+    try:
+        shard_timings: list[dict] = json.loads(timings_path.read_text())
+        shard_timings = [shard for shard in shard_timings if shard['modules'] and isinstance(shard['seconds'], (int, float))]
+    except (FileNotFoundError, ValueError, TypeError, KeyError):
+        shard_timings = []
+    return shard_timings
+
+
+def save_shard_timings(timings_path: Path, results: list[tuple[list[str], bool, dict, float]]) -> None:
+    """
+    Saves each shard's modules and measured run-time, for balancing the next sharded run.
+    Called by run_sharded_tests().
+    """
+    shard_timings: list[dict] = [
+        {'modules': shard_modules, 'seconds': round(seconds, 3)} for (shard_modules, _ok, _output, seconds) in results
+    ]
+    timings_path.write_text(json.dumps(shard_timings, indent=2))
+    log.debug(f'saved test-shard timings to ``{timings_path}``')
+    return
+
+
 def make_local_scoped_env(project_path: Path, venv_bin_path: Path, venv_path: Path) -> dict:
     """
     Creates a local-scoped environment for use in subprocess.run() calls.
-    Called by run_initial_tests() and run_followup_tests().
+    Called by run_project_tests() and run_sharded_tests().
     """
     local_scoped_env = os.environ.copy()
     local_scoped_env['PATH'] = f'{venv_bin_path}:{local_scoped_env["PATH"]}'  # prioritizes venv-path
     local_scoped_env['VIRTUAL_ENV'] = str(venv_path)
-    log.debug(f'local_scoped_env, ``{local_scoped_env}``')
+    log.debug(f'local_scoped_env PATH, ``{local_scoped_env["PATH"]}``; VIRTUAL_ENV, ``{venv_path}``')  # not the whole env
     return local_scoped_env
 
 
 def make_run_tests_command(project_path: Path, venv_bin_path: Path) -> list[str]:
     """
     Prepares the run_tests command.
-    Called by run_initial_tests() and run_followup_tests().
+    Called by run_project_tests() and run_sharded_tests().
     Note: we're NOT calling resolve() on the python_path.
         The venv_bin_path is already resolved, so this will use the venv python-path, which we want.
         Resolving again would use the system python-path, which we do not want.
@@ -168,12 +335,12 @@ def run_run_tests_command(command: list, project_path: Path, local_scoped_env) -
     Runs subprocess command and returns tuple (ok, data_dict).
     (Based on similar to `Go` style convention (err, data).)
     """
-    result: subprocess.CompletedProcess = subprocess.run(
-        command, cwd=str(project_path), env=local_scoped_env, capture_output=True, text=True
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        command, phase='tests', cwd=str(project_path), env=local_scoped_env, capture_output=True, text=True, timeout_ok=True
     )
-    log.debug(f'result: {result}')
+    log.debug('result: %s', result)
     ok = True if result.returncode == 0 else False
     output = {'stdout': f'{result.stdout}', 'stderr': f'{result.stderr}'}
     return_val = (ok, output)
-    log.debug(f'return_val: {return_val}')
+    log.debug('return_val: %s', return_val)
     return return_val
@@ -0,0 +1,143 @@
+"""
+Module used by self_updater.py
+Contains code for manage_update()'s checkpoint-journal, so an update interrupted part-way (a crash, a kill, a reboot)
+  is finished by the next run, rather than lost.
+
+Why: once a new compile has been synced, the next run's compile matches the newest backup -- "no changes" --
+  so without a journal the interrupted update would never be committed, emailed, or have its permissions fixed.
+
+Once a compile is found to differ, manage_update() starts a journal -- `checkpoint.json` in the project's
+  `self_updater_data` directory -- recording the new compile and the previous one. Each later phase (sync, mark-active,
+  warm-up, diff, copy-to-codebase, followup-tests, email, etc) is recorded as started, then with its result.
+  Every journal-write is atomic, so the journal is always a complete old or new version.
+After a finished update (or a rollback) the journal is removed.
+
+A run that finds a journal skips the initial tests, compile and compare, and runs only the phases not yet recorded
+  as done, using the recorded results of the others (ie for the email).
+A journal whose compile-file is gone, or that's older than `SLFUPDTR__CHECKPOINT_MAX_AGE_HOURS` (default 72),
+  is discarded.
+"""
+
+import json
+import logging
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import lib_common
+
+log = logging.getLogger(__name__)
+
+JOURNAL_NAME = 'checkpoint.json'
+DEFAULT_MAX_AGE_HOURS = 72  # overridable via `SLFUPDTR__CHECKPOINT_MAX_AGE_HOURS`; an invalid value falls back to it
+
+
+class Checkpoint:
+    """
+    Holds, and atomically saves, the journal of an in-progress update.
+    Until begin() or a successful load(), there's no journal, and run_phase() just runs the phase.
+    """
+
+    def __init__(self, project_path: Path) -> None:
+        self.journal_path: Path = lib_common.determine_data_dir(project_path) / JOURNAL_NAME
+        self.state: dict = {}
+        self.interrupted_phase: str | None = None  # set by load(); the phase that was started but not finished
+
+    def load(self) -> bool:
+        """
+        Loads the journal of an interrupted update, if there's a usable one; returns True if so.
+        Called by self_updater.manage_update() at startup.
+        """
+        if not self.journal_path.exists():
+            return False
+        try:
+            state: dict = json.loads(self.journal_path.read_text())
+            compiled_path = Path(state['compiled_requirements'])
+            started_at: datetime = datetime.fromisoformat(state['started_at'])
+        except (ValueError, KeyError):
+            log.exception(f'unreadable checkpoint-journal, ``{self.journal_path}``; discarding it')
+            self.clear()
+            return False
+        max_age_hours: float = lib_common.read_number_envar(
+            'SLFUPDTR__CHECKPOINT_MAX_AGE_HOURS', DEFAULT_MAX_AGE_HOURS, float
+        )
+        if not compiled_path.exists() or datetime.now() - started_at > timedelta(hours=max_age_hours):
+            log.warning(f'stale checkpoint-journal from run ``{state.get("run_id")}``; discarding it')
+            self.clear()
+            return False
+        self.state = state
+        self.interrupted_phase = state.get('started_phase')
+        self.state['resume_count'] = state.get('resume_count', 0) + 1
+        self.write()
+        log.info(
+            f'ok / resuming run ``{state["run_id"]}``; done: ``{list(state["results"])}``, '
+            f'interrupted: ``{self.interrupted_phase}``'
+        )
+        return True
+
+    def begin(self, run_id: str, compiled_requirements: Path, old_path: Path | None) -> None:
+        """
+        Starts the journal for an update of the venv to `compiled_requirements`.
+        Called by self_updater.manage_update() once the compile is found to differ.
+        """
+        self.state = {
+            'run_id': run_id,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'compiled_requirements': str(compiled_requirements),
+            'old_path': str(old_path) if old_path else None,
+            'started_phase': None,
+            'results': {},
+        }
+        self.write()
+        return
+
+    @property
+    def compiled_requirements(self) -> Path:
+        return Path(self.state['compiled_requirements'])
+
+    @property
+    def old_path(self) -> Path | None:
+        return Path(self.state['old_path']) if self.state['old_path'] else None
+
+    @property
+    def results(self) -> dict:
+        return self.state.get('results', {})
+
+    def run_phase(self, phase: str, func: Callable, *args, **kwargs):
+        """
+        Runs the phase and records its (JSON-able) result -- or, if an earlier run already did, returns that result.
+        Tuples come back from the journal as lists; they unpack the same way.
+        """
+        if phase in self.results:
+            log.info(f'ok / skipping ``{phase}``; done by the interrupted run')
+            return self.results[phase]
+        if self.state:
+            self.state['started_phase'] = phase
+            self.write()
+        result = func(*args, **kwargs)
+        self.record(phase, result)
+        return result
+
+    def record(self, phase: str, result) -> None:
+        """
+        Records a phase's result, if there's a journal.
+        """
+        if not self.state:
+            return
+        self.state['results'][phase] = result
+        self.state['started_phase'] = None
+        self.write()
+        return
+
+    def write(self) -> None:
+        lib_common.write_text_atomically(self.journal_path, json.dumps(self.state, indent=2))
+        return
+
+    def clear(self) -> None:
+        """
+        Removes the journal.
+        Called by self_updater.manage_update() once the update is finished, or rolled back.
+        """
+        self.journal_path.unlink(missing_ok=True)
+        self.state = {}
+        return
@@ -0,0 +1,246 @@
+"""
+Module used by analyze_package_churn.py
+Contains code for package-churn analytics over every project's `requirements_backups` history.
+
+Each project's backups are a time-series of resolved environments. They're read in one streamed pass per project
+  (see `lib_backup_store.iter_backups()`): each distinct lockfile-body is read and parsed once -- most nights'
+  compiles are unchanged, so thousands of backups are typically a few hundred parses.
+
+The parsed history is held as a compact columnar table: one column per package, one row per backup ("snapshot"),
+  each cell an int-coded version (`-1` if the package isn't in that snapshot), in an `array`.
+From it:
+- churn -- per package: its version-changes, the projects it changed in, and changes per 30 days of presence.
+- pin durations -- per package: how many days each version stayed pinned (median and max, of versions since replaced).
+- update causes -- per top-level requirement (the `-r requirements/*.in` entries): the nights on which it,
+    or a package it pulls in (per the lockfile's `# via` comments), changed.
+"""
+
+import logging
+import statistics
+import time
+from array import array
+from collections import defaultdict
+from pathlib import Path
+
+import lib_run_history
+from lib_backup_store import iter_backups, parse_backup_timestamp
+
+log = logging.getLogger(__name__)
+
+
+def parse_lockfile_body(text: str) -> tuple[dict[str, str], dict[str, set[str]]]:
+    """
+    Returns the lockfile's pins (normalized-name -> version) and each package's top-level requirements ("roots"),
+      from the `# via` comments. A package pinned more than once (with environment-markers) gets its versions joined.
+    """
+    pins: dict[str, str] = {}
+    parents: dict[str, set[str]] = defaultdict(set)
+    current: str | None = None
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith((' ', '\t')):
+            comment: str = line.strip().removeprefix('#').strip()
+            if current and comment.startswith('via '):
+                comment = comment[len('via ') :]
+            if current and comment and comment != 'via':
+                parents[current].add('' if comment.startswith('-r ') else normalize(comment))  # '' marks a top-level
+            continue
+        requirement: str = line.split(';')[0].strip()
+        if '==' not in requirement:
+            current = None
+            continue
+        (name, version) = requirement.split('==', 1)
+        current = normalize(name.split('[')[0])
+        pins[current] = f'{pins[current]}|{version.strip()}' if current in pins else version.strip()
+    return (pins, find_roots(parents))
+
+
+def normalize(name: str) -> str:
+    return name.strip().lower().replace('_', '-').replace('.', '-')
+
+
+def find_roots(parents: dict[str, set[str]]) -> dict[str, set[str]]:
+    """
+    Returns each package's top-level requirements: itself, if it's one, plus those of the packages that pull it in.
+    """
+    roots: dict[str, set[str]] = {}
+
+    def visit(name: str, visiting: set[str]) -> set[str]:
+        if name in roots:
+            return roots[name]
+        found: set[str] = set()
+        for parent in parents.get(name, ()):
+            if parent == '':
+                found.add(name)
+            elif parent not in visiting:
+                found |= visit(parent, visiting | {name})
+        roots[name] = found or {name}  # ie no `# via` info: count the package itself
+        return roots[name]
+
+    for name in list(parents):
+        visit(name, set())
+    return roots
+
+
+class ChurnTable:
+    """
+    The package x snapshot -> version table, built one snapshot at a time.
+    """
+
+    def __init__(self) -> None:
+        self.series: list[str] = []  # ie `project_a/local`
+        self.series_index: array = array('i')  # per snapshot
+        self.timestamps: array = array('d')  # per snapshot; epoch-seconds
+        self.digests: list[str] = []  # per snapshot
+        self.columns: dict[str, array] = {}  # package -> version-code per snapshot
+        self.versions: list[str] = []
+        self.version_codes: dict[str, int] = {}
+        self.roots_by_digest: dict[str, dict[str, set[str]]] = {}
+
+    def add_snapshot(self, series: str, timestamp: float, digest: str, pins: dict[str, str]) -> None:
+        """
+        Appends a row; a series' snapshots must be added together, oldest first.
+        """
+        if not self.series or self.series[-1] != series:
+            self.series.append(series)
+        row_count: int = len(self.timestamps)
+        self.series_index.append(len(self.series) - 1)
+        self.timestamps.append(timestamp)
+        self.digests.append(digest)
+        for name in pins.keys() - self.columns.keys():
+            self.columns[name] = array('i', [-1]) * row_count
+        for name, column in self.columns.items():
+            version: str | None = pins.get(name)
+            if version is None:
+                column.append(-1)
+                continue
+            if version not in self.version_codes:
+                self.version_codes[version] = len(self.versions)
+                self.versions.append(version)
+            column.append(self.version_codes[version])
+        return
+
+
+def scan_backup_dir(table: ChurnTable, series: str, backup_dir: Path) -> int:
+    """
+    Adds a backup-directory's snapshots to the table; returns the count of distinct bodies parsed.
+    """
+    parsed: dict[str, dict[str, str]] = {}
+    snapshots: list[tuple[str, float, str]] = []
+    for name, digest, text in iter_backups(backup_dir):
+        if text is not None:
+            (parsed[digest], table.roots_by_digest[digest]) = parse_lockfile_body(text)
+        snapshots.append((f'{series}/{name.rsplit("_", 1)[0]}', parse_backup_timestamp(name).timestamp(), digest))
+    for snapshot_series, timestamp, digest in sorted(snapshots, key=lambda snapshot: snapshot[0]):  # stable; by time within
+        table.add_snapshot(snapshot_series, timestamp, digest, parsed[digest])
+    return len(parsed)
+
+
+def compute_churn(table: ChurnTable) -> list[tuple]:
+    """
+    Returns per-package rows: (package, changes, projects, changes_per_30d, median_pin_days, max_pin_days),
+      most-changed first.
+    """
+    rows: list[tuple] = []
+    for name, column in table.columns.items():
+        changes: int = 0
+        projects: set[str] = set()
+        present_days: float = 0.0
+        pin_days: list[float] = []
+        pin_start: float | None = None
+        for i in range(1, len(column)):
+            if table.series_index[i] != table.series_index[i - 1]:
+                pin_start = None
+                continue
+            (previous, current) = (column[i - 1], column[i])
+            if previous != -1 and current != -1:
+                present_days += (table.timestamps[i] - table.timestamps[i - 1]) / 86400
+            if previous != -1 and pin_start is None:
+                pin_start = table.timestamps[i - 1]
+            if current != previous:
+                if previous != -1 and current != -1:
+                    changes += 1
+                    projects.add(table.series[table.series_index[i]].split('/')[0])
+                if previous != -1 and pin_start is not None:
+                    pin_days.append((table.timestamps[i] - pin_start) / 86400)
+                pin_start = table.timestamps[i] if current != -1 else None
+        rate: float = round(changes / present_days * 30, 2) if present_days else 0.0
+        median_days: float | None = round(statistics.median(pin_days), 1) if pin_days else None
+        max_days: float | None = round(max(pin_days), 1) if pin_days else None
+        rows.append((name, changes, len(projects), rate, median_days, max_days))
+    return sorted(rows, key=lambda row: (-row[1], row[0]))
+
+
+def compute_update_causes(table: ChurnTable) -> list[tuple]:
+    """
+    Returns per-top-level-requirement rows: (requirement, update_nights, packages_changed), most nights first.
+    An update-night is a snapshot whose lockfile differs from the previous one of the same series.
+    """
+    nights: dict[str, int] = defaultdict(int)
+    packages_changed: dict[str, set[str]] = defaultdict(set)
+    for i in range(1, len(table.timestamps)):
+        if table.series_index[i] != table.series_index[i - 1] or table.digests[i] == table.digests[i - 1]:
+            continue
+        roots: dict[str, set[str]] = table.roots_by_digest[table.digests[i]]
+        night_causes: set[str] = set()
+        for name, column in table.columns.items():
+            if column[i] != column[i - 1] and column[i] != -1:
+                for root in roots.get(name, {name}):
+                    night_causes.add(root)
+                    packages_changed[root].add(name)
+        for root in night_causes:
+            nights[root] += 1
+    rows: list[tuple] = [(root, count, len(packages_changed[root])) for root, count in nights.items()]
+    return sorted(rows, key=lambda row: (-row[1], row[0]))
+
+
+def scan_projects(project_paths: list[Path]) -> tuple[ChurnTable, dict]:
+    """
+    Builds the table from each project's `requirements_backups` (beside its code-directory); returns it and scan-stats.
+    """
+    log.info('::: scanning backup histories ----------')
+    start: float = time.monotonic()
+    table = ChurnTable()
+    parsed_count: int = 0
+    for project_path in project_paths:
+        backup_dir: Path = project_path.parent / 'requirements_backups'
+        if not backup_dir.exists():
+            log.warning(f'no backups for ``{project_path}``; skipping it')
+            continue
+        parsed_count += scan_backup_dir(table, project_path.parent.name, backup_dir)
+    stats: dict = {
+        'snapshots': len(table.timestamps),
+        'parsed': parsed_count,
+        'series': len(table.series),
+        'packages': len(table.columns),
+        'seconds': round(time.monotonic() - start, 2),
+    }
+    log.info(f'ok / scan stats, ``{stats}``')
+    return (table, stats)
+
+
+def make_report(table: ChurnTable, stats: dict, top_count: int = 20) -> str:
+    """
+    Formats the churn, pin-duration and update-cause tables as plain text.
+    """
+    churn_rows: list[tuple] = compute_churn(table)[:top_count]
+    cause_rows: list[tuple] = compute_update_causes(table)[:top_count]
+    summary: str = (
+        f'snapshots: {stats["snapshots"]} ({stats["parsed"]} distinct lockfiles parsed), series: {stats["series"]}, '
+        f'packages: {stats["packages"]}, scanned in {stats["seconds"]}s'
+    )
+    return '\n'.join(
+        [
+            summary,
+            '',
+            'most-changed packages:',
+            lib_run_history.format_rows(
+                ['package', 'changes', 'projects', 'per_30d', 'median_pin_days', 'max_pin_days'],
+                churn_rows,
+            ),
+            '',
+            'top-level requirements causing the most update-nights:',
+            lib_run_history.format_rows(['requirement', 'update_nights', 'packages_changed'], cause_rows),
+        ]
+    )
@@ -1,4 +1,7 @@
 import logging
+import os
+import shutil
+from collections.abc import Callable
 from pathlib import Path
 
 log = logging.getLogger(__name__)
@@ -23,3 +26,54 @@ def determine_venv_paths(project_path: Path) -> tuple[Path, Path]:
     log.debug(f'venv_bin_path: ``{venv_bin_path}``')
     log.debug(f'venv_path: ``{venv_path}``')
     return (venv_bin_path, venv_path)
+
+
+def determine_data_dir(project_path: Path) -> Path:
+    """
+    Given a project path, returns the self-updater's data-directory for that project, creating it if needed.
+
+    Lives in the "outer-stuff" directory, next to `requirements_backups`; holds the updater's own records
+      (eg recorded test-durations), which should not be committed to the project's codebase.
+    """
+    data_dir: Path = project_path.parent / 'self_updater_data'
+    data_dir.mkdir(parents=True, exist_ok=True)
+    log.debug(f'data_dir: ``{data_dir}``')
+    return data_dir
+
+
+def write_text_atomically(path: Path, text: str) -> None:
+    """
+    Writes the file so it's never seen (or left, by a crash) half-written.
+
+    The text goes to a temp-file in the same directory, which is flushed to disk, then renamed over the target;
+      a rename is atomic, so readers see either the old file or the new one. The target's permissions are kept.
+    """
+    tmp_path: Path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with tmp_path.open('w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)  # ie if the write failed
+    return
+
+
+def read_number_envar(name: str, default: int | float, convert: Callable = int) -> int | float:
+    """
+    Returns the optional numeric envar, converted by `convert` (ie `int`, or `float`); `default` if it's unset.
+
+    An invalid value is logged, and `default` used; a mistyped setting shouldn't halt the update
+      (or the error-path that would email about it).
+    """
+    value: str = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        log.warning(f'invalid {name} value, ``{value}``; using ``{default}``')
+        return default
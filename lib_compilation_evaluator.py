@@ -7,14 +7,16 @@ import difflib
 import logging
 from pathlib import Path
 
+import lib_common
 import lib_git_handler
+from lib_backup_store import find_recent_backups, strip_header
 
 log = logging.getLogger(__name__)
 
 
 class CompiledComparator:
     def __init__(self):
-        pass
+        self.old_path: Path | None = None  # set by compare_with_previous_backup(); used for bisecting a failed update
 
     def compare_with_previous_backup(
         self, new_path: Path, old_path: Path | None = None, project_path: Path | None = None
@@ -32,9 +34,10 @@ class CompiledComparator:
             log.debug('old_path not passed in; looking for it in `requirements_backups`')
             backup_dir: Path = project_path.parent / 'requirements_backups'
             log.debug(f'backup_dir: ``{backup_dir}``')
-            backup_files: list[Path] = sorted([f for f in backup_dir.iterdir() if f.suffix == '.txt'], reverse=True)
+            backup_files: list[Path] = find_recent_backups(backup_dir, count=2)
             old_path: Path | None = backup_files[1] if len(backup_files) > 1 else None
             log.debug(f'old_file: ``{old_path}``')
+        self.old_path = old_path
         if not old_path:
             log.debug('no previous backups found, so changes=False.')
             changes = False
@@ -53,16 +56,12 @@ class CompiledComparator:
 
     def filter_initial_comments(self, lines: list[str]) -> list[str]:
         """
-        Filters out initial lines starting with '#' from a list of lines.
-        The reason for this is that:
-        - one of the first line of the backup file includes a timestamp, which would always be different.
-        - if a generated `.txt` file is used to update the venv, the string `# ACTIVE`
-            is added to the top of the file, which would always be different from a fresh compile.
-        Called by `compare_with_previous_backup()`.
+        Filters out initial lines starting with '#' from a list of lines;
+          the compile-command among them includes a timestamp, which would always be different.
+        (Backups are no longer rewritten to mark the active one -- see lib_backup_store.mark_active().)
+        Called by `compare_with_previous_backup()` and `make_diff_text()`.
         """
-        log.debug('starting filter_initial_comments()')
-        non_comment_index = next((i for i, line in enumerate(lines) if not line.startswith('#')), len(lines))
-        return lines[non_comment_index:]
+        return strip_header(lines)
 
     def make_diff_text(self, project_path: Path) -> str:
         """
@@ -73,7 +72,7 @@ class CompiledComparator:
         ## get the two most recent backup files -------------------------
         backup_dir: Path = project_path.parent / 'requirements_backups'
         log.debug(f'backup_dir: ``{backup_dir}``')
-        backup_files: list[Path] = sorted([f for f in backup_dir.iterdir() if f.suffix == '.txt'], reverse=True)
+        backup_files: list[Path] = find_recent_backups(backup_dir, count=2)
         current_file: Path = backup_files[0]
         log.debug(f'current_file: ``{current_file}``')
         previous_file: Path | None = backup_files[1] if len(backup_files) > 1 else None
@@ -89,7 +88,7 @@ class CompiledComparator:
             diff_lines = [f'--- {previous_file.name}\n', f'+++ {current_file.name}\n']
             diff_lines.extend(difflib.unified_diff(prev_lines_filtered, curr_lines_filtered))
             diff_text = ''.join(diff_lines)
-        log.info(f'ok / diff_text, ``{diff_text}``')
+        log.info('ok / diff_text, ``%s``', diff_text)
         return diff_text
 
     def copy_new_compile_to_codebase(self, compiled_requirements: Path, project_path: Path, environment_type: str) -> str:
@@ -98,6 +97,7 @@ class CompiledComparator:
         Then commits and pushes the changes to the project's git repository.
 
         Note: reads and writes the requirements `.txt` file to avoid explicit full-path references.
+        The write is atomic, so an interrupted run never leaves a half-written requirements file in the codebase.
 
         Called by self_updater.py.
         """
@@ -111,7 +111,7 @@ class CompiledComparator:
             ## copy the new requirements file to the project --------
             compiled_requirements_lines = compiled_requirements.read_text().splitlines()
             compiled_requirements_lines = [line for line in compiled_requirements_lines if not line.startswith('#')]
-            save_path.write_text('\n'.join(compiled_requirements_lines))
+            lib_common.write_text_atomically(save_path, '\n'.join(compiled_requirements_lines))
             log.info('ok / new requirements file copied to project.')
         except Exception as e:
             problem_message = f'Error copying new requirements file to project; error: ``{e}``'
@@ -4,6 +4,8 @@ import pprint
 import subprocess
 from pathlib import Path
 
+import lib_process_runner
+
 log = logging.getLogger(__name__)
 
 
@@ -35,9 +37,12 @@ def run_collectstatic(project_path: Path) -> None | str:
     log.debug(f'cwd: {os.getcwd()}')
     command = ['bash', '-c', 'source ../env/bin/activate && python ./manage.py collectstatic --noinput']
     log.debug(f'command: {command}')
-    subprocess.run(command, check=True)
-    result: subprocess.CompletedProcess = subprocess.run(command, cwd=str(project_path), capture_output=True, text=True)
-    log.debug(f'result: {result}')
+    result: subprocess.CompletedProcess = lib_process_runner.run(command, phase='collectstatic', check=True, timeout_ok=True)
+    if result.returncode == 0:  # ie not timed out
+        result = lib_process_runner.run(
+            command, phase='collectstatic', cwd=str(project_path), capture_output=True, text=True, timeout_ok=True
+        )
+    log.debug('result: %s', result)
     ok = True if result.returncode == 0 else False
     if ok is True:
         log.info('ok / collectstatic successful')
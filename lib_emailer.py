@@ -1,80 +1,153 @@
-import json
+"""
+Module used by self_updater.py, lib_environment_checker.py, lib_call_runtests.py and roll_out_updates.py
+Contains code for the run's emails.
+
+A run uses one shared Emailer per project (see get_emailer()): the settings and hostname are read once, and every
+  email of the run goes over one SMTP session, closed by close_emailers() at the end of the run.
+Messages are rendered from templates built once, at import.
+A diff larger than `SLFUPDTR__EMAIL_DIFF_INLINE_MAX_BYTES` (default 50,000; also used if the value is invalid) is attached
+  gzipped, rather than inlined.
+"""
+
+import gzip
 import logging
-import os
-import smtplib
 import socket
-from email.mime.text import MIMEText
 from pathlib import Path
+from string import Template
+
+import lib_common
+import lib_settings
 
-from dotenv import find_dotenv, load_dotenv
+log = logging.getLogger(__name__)
 
-## load envars ------------------------------------------------------
-this_file_path = Path(__file__).resolve()
-stuff_dir = this_file_path.parent.parent
-dotenv_path = stuff_dir / '.env'
-assert dotenv_path.exists(), f'file does not exist, ``{dotenv_path}``'
-load_dotenv(find_dotenv(str(dotenv_path), raise_error_if_not_found=True), override=True)
+USAGE_URL = 'https://github.com/Brown-University-Library/self_updater_code?tab=readme-ov-file#usage'
+DIFF_ATTACHMENT_NAME = 'requirements_diff.txt.gz'
+DEFAULT_DIFF_INLINE_MAX_BYTES = 50_000
+PROBLEM_KEYS: tuple[str, ...] = (  # the `followup_problems` entries, in the order they're listed in the update-email
+    'collectstatic_problems',
+    'copy_problems',
+    'test_problems',
+    'timeout_problems',
+    'warmup_problems',
+    'benchmark_problems',
+    'startup_report',
+    'bisect_report',
+)
 
+SETUP_PROBLEM_TEMPLATE = Template(
+    '\nThere was a problem running the self-updater script. \n\n'
+    'Message: ``$message``.\n\n'
+    "Suggestion, after fixing the problem, manually run the self-updater script again to make sure there aren't "
+    'other environmental setup issues. \n\n'
+    f'Usage instructions are at:\n<{USAGE_URL}>\n\n'
+    '(end-of-message)\n'
+)
+UPDATE_OK_TEMPLATE = Template(
+    '\nThe venv for the project ``$project_name`` has been auto-updated successfully. \n'
+    '$notes_section\n'
+    '$diff_section\n\n'
+    '(end-of-message)\n'
+)
+UPDATE_PROBLEM_TEMPLATE = Template(
+    '\nThe venv for the project ``$project_name`` has been auto-updated and is active. \n\n'
+    'However, there were post-update problems which should be reviewed:\n'
+    '$problems\n'
+    '$notes_section\n'
+    '$diff_section\n\n'
+    '(end-of-message)\n'
+)
+INLINE_DIFF_TEMPLATE = Template('The requirements.txt diff:\n\n$diff_text.')
+ATTACHED_DIFF_TEMPLATE = Template(
+    'The requirements.txt diff ($line_count lines) is attached, gzipped, as ``$attachment_name``.'
+)
 
-log = logging.getLogger(__name__)
+shared_emailers: dict[Path, 'Emailer'] = {}  # the run's Emailers, by resolved project-path; see get_emailer()
 
 
 def send_email_of_diffs(
-    project_path: Path, diff_text: str, followup_problems: dict, project_email_addresses: list[list[str, str]]
-) -> None:
+    project_path: Path,
+    diff_text: str,
+    followup_problems: dict,
+    project_email_addresses: list[list[str, str]],
+    followup_notes: list[str] | None = None,
+) -> bool:
     """
     Manages the sending of an email with the differences between the previous and current requirements files.
 
     If the followup copy-new-requirements.in file or run-tests failed, a note to that effect will be included in the email.
 
+    Any `followup_notes` (informational, like warm-up timings) are included whether or not there were problems.
+
     Note that on an email-send error, the error will be logged, but the script will continue,
       so the permissions-update will still occur.
 
+    Returns whether the email was sent (recorded in the run-history).
+
     Called by: self_updater.manage_update()
     """
     ## prepare problem-message --------------------------------------
     log.info('::: preparing problem-message ----------')
-    problem_message: str = ''
-    if followup_problems['collectstatic_problems']:
-        problem_message = followup_problems['collectstatic_problems']
-    if followup_problems['copy_problems']:
-        if problem_message:
-            problem_message += '\n\n'
-        problem_message += followup_problems['copy_problems']
-    if followup_problems['test_problems']:
-        if problem_message:
-            problem_message += '\n\n'
-        problem_message += followup_problems['test_problems']
+    problem_message: str = '\n\n'.join(filter(None, (followup_problems.get(key) for key in PROBLEM_KEYS)))
     if problem_message:
-        log.info(f'ok / problem_message, ``{problem_message}``')
+        log.info('ok / problem_message, ``%s``', problem_message)
     else:
         log.info('ok / no problem_message')
+    notes_text: str = '\n'.join(followup_notes) if followup_notes else ''
     ## send email ---------------------------------------------------
-    emailer = Emailer(project_path)
+    emailer: Emailer = get_emailer(project_path)
     if problem_message:
-        email_message: str = emailer.create_update_problem_message(diff_text, problem_message)
+        email_message: str = emailer.create_update_problem_message(diff_text, problem_message, notes_text)
     else:
-        email_message: str = emailer.create_update_ok_message(diff_text)
+        email_message: str = emailer.create_update_ok_message(diff_text, notes_text)
+    email_sent: bool = True
     try:
-        emailer.send_email(project_email_addresses, email_message)
+        emailer.send_email(project_email_addresses, email_message, emailer.make_diff_attachments(diff_text))
     except Exception:
         message = 'problem sending email'
         log.exception(message)
+        email_sent = False
+    return email_sent
+
+
+def get_emailer(project_path: Path | str) -> 'Emailer':
+    """
+    Returns the run's shared Emailer for the project, creating it on first use.
+    """
+    key: Path = Path(project_path).resolve()
+    if key not in shared_emailers:
+        shared_emailers[key] = Emailer(key)
+    return shared_emailers[key]
+
+
+def close_emailers() -> None:
+    """
+    Closes the run's SMTP sessions.
+    Called by self_updater.py's dundermain, after the run.
+    """
+    for emailer in shared_emailers.values():
+        emailer.close()
+    shared_emailers.clear()
     return
 
 
 class Emailer:
     """
     Handles emailing updater-sys-admins and project-admins.
+    Keeps its SMTP session open between emails; see close().
     """
 
-    def __init__(self, project_path: Path) -> None:
+    def __init__(self, project_path: Path, settings: lib_settings.Settings | None = None) -> None:
         self.project_path: Path = project_path
-        self.sys_admin_recipients: list = json.loads(os.environ['SLFUPDTR__SYS_ADMIN_RECIPIENTS_JSON'])
-        self.self_updater_email_from: str = os.environ['SLFUPDTR__EMAIL_FROM']
-        self.email_host: str = os.environ['SLFUPDTR__EMAIL_HOST']
-        self.email_host_port: int = int(os.environ['SLFUPDTR__EMAIL_HOST_PORT'])
+        settings = settings or lib_settings.get_settings()  # passed in by benchmark_imports.py, which doesn't send
+        self.sys_admin_recipients: list = settings.sys_admin_recipients
+        self.self_updater_email_from: str = settings.email_from
+        self.email_host: str = settings.email_host
+        self.email_host_port: int = settings.email_host_port
         self.server_name: str = socket.gethostname()
+        self.diff_inline_max_bytes: int = lib_common.read_number_envar(
+            'SLFUPDTR__EMAIL_DIFF_INLINE_MAX_BYTES', DEFAULT_DIFF_INLINE_MAX_BYTES
+        )
+        self.smtp = None  # the open SMTP session, if any; see connect()
 
     def create_setup_problem_message(self, message: str) -> str:
         """
@@ -82,64 +155,73 @@ class Emailer:
         The incoming `message` parameter is the error message from the exception that was raised.
         """
         log.debug('starting create_setup_problem_message()')
-        email_message = f"""
-        There was a problem running the self-updater script. 
-
-        Message: ``{message}``.
-
-        Suggestion, after fixing the problem, manually run the self-updater script again to make sure there aren't other environmental setup issues. 
+        return SETUP_PROBLEM_TEMPLATE.substitute(message=message)
 
-        Usage instructions are at:
-        <https://github.com/Brown-University-Library/self_updater_code?tab=readme-ov-file#usage>
-
-        (end-of-message)
-        """
-        email_message: str = email_message.replace('        ', '')  # removes indentation-spaces
-        return email_message
-
-    def create_update_ok_message(self, diff_text: str) -> str:
+    def create_update_ok_message(self, diff_text: str, notes_text: str = '') -> str:
         """
         Prepares update-ok email message.
-        Includes the differences between the previous and current requirements.
+        Includes the differences between the previous and current requirements (or a note that they're attached),
+          and any informational notes.
         """
         log.debug('starting create_update_ok_message()')
-        email_message = f"""
-        The venv for the project ``{self.project_path.name}`` has been auto-updated successfully. 
-        
-        The requirements.txt diff:\n\n{diff_text}.
-
-        (end-of-message)
-        """
-        email_message: str = email_message.replace('        ', '')  # removes indentation-spaces
-        return email_message
+        return UPDATE_OK_TEMPLATE.substitute(
+            project_name=self.project_path.name,
+            notes_section=f'\n{notes_text}\n' if notes_text else '',
+            diff_section=self.render_diff_section(diff_text),
+        )
 
-    def create_update_problem_message(self, diff_text: str, followup_test_problems: str) -> str:
+    def create_update_problem_message(self, diff_text: str, followup_test_problems: str, notes_text: str = '') -> str:
         """
         Prepares "update-happened, but there are post-update test failures" email message.
-        Includes the differences between the previous and current requirements.
+        Includes the differences between the previous and current requirements (or a note that they're attached),
+          and any informational notes.
         """
         log.debug('starting create_update_problem_message()')
-        email_message = f"""
-        The venv for the project ``{self.project_path.name}`` has been auto-updated and is active. 
+        return UPDATE_PROBLEM_TEMPLATE.substitute(
+            project_name=self.project_path.name,
+            problems=followup_test_problems,
+            notes_section=f'\n{notes_text}\n' if notes_text else '',
+            diff_section=self.render_diff_section(diff_text),
+        )
 
-        However, there were post-update problems which should be reviewed:
-        {followup_test_problems}
-        
-        The requirements.txt diff:\n\n{diff_text}.
+    def render_diff_section(self, diff_text: str) -> str:
+        if len(diff_text.encode()) > self.diff_inline_max_bytes:
+            return ATTACHED_DIFF_TEMPLATE.substitute(
+                line_count=diff_text.count('\n') + 1, attachment_name=DIFF_ATTACHMENT_NAME
+            )
+        return INLINE_DIFF_TEMPLATE.substitute(diff_text=diff_text)
 
-        (end-of-message)
+    def make_diff_attachments(self, diff_text: str) -> list[tuple[str, bytes]]:
         """
-        email_message: str = email_message.replace('        ', '')  # removes indentation-spaces
-        return email_message
+        Returns the gzipped diff as a (filename, bytes) attachment, if it's too large to inline; otherwise none.
+        """
+        diff_bytes: bytes = diff_text.encode()
+        if len(diff_bytes) <= self.diff_inline_max_bytes:
+            return []
+        return [(DIFF_ATTACHMENT_NAME, gzip.compress(diff_bytes))]
+
+    def connect(self):
+        """
+        Returns the open SMTP session, opening it if needed.
+        """
+        if self.smtp is None:
+            import smtplib  # imported here; smtplib pulls in ssl and the email package, only needed when sending
+
+            self.smtp = smtplib.SMTP(self.email_host, self.email_host_port)
+        return self.smtp
 
-    def send_email(self, email_addresses: list[list[str, str]], message: str) -> None:
+    def send_email(
+        self, email_addresses: list[list[str, str]], message: str, attachments: list[tuple[str, bytes]] | None = None
+    ) -> None:
         """
-        Builds and sends email.
+        Builds and sends email, over the Emailer's SMTP session.
 
         On a successful update email, the email_addresses will be the project-admins.
         On a setup problem email, the email_addresses will be the self-updater sys-admins.
         """
         log.info('::: sending email ----------')
+        import smtplib  # imported here; see connect()
+
         log.debug(f'email_addresses: ``{email_addresses}``')
         ## prep email data ----------------------------------------------
         built_recipients = []
@@ -147,19 +229,57 @@ class Emailer:
             built_recipients.append(f'"{name}" <{email}>')
         log.debug(f'built_recipients: {built_recipients}')
         ## build email message ------------------------------------------
-        eml = MIMEText(message)
-        eml['Subject'] = f'bul-self-updater info from server ``{self.server_name}`` for project ``{self.project_path.name}``'
-        eml['From'] = self.self_updater_email_from
-        eml['To'] = ', '.join(built_recipients)
+        eml_text: str = self.build_message(built_recipients, message, attachments).as_string()
         ## send email ---------------------------------------------------
         try:
-            s = smtplib.SMTP(self.email_host, self.email_host_port)
-            s.sendmail(self.self_updater_email_from, built_recipients, eml.as_string())
+            try:
+                self.connect().sendmail(self.self_updater_email_from, built_recipients, eml_text)
+            except smtplib.SMTPServerDisconnected:  # ie the server closed an idle session; retries on a new one
+                self.smtp = None
+                self.connect().sendmail(self.self_updater_email_from, built_recipients, eml_text)
             log.info('ok / email sent')
         except Exception as e:
             err = repr(e)
             log.exception(f'problem sending self-updater mail, ``{err}``')
+            self.close()
             raise Exception(err)
         return
 
+    def build_message(self, built_recipients: list[str], message: str, attachments: list[tuple[str, bytes]] | None = None):
+        """
+        Returns the MIME message: plain text, or multipart with the attachments.
+        Called by send_email(), and by benchmark_imports.py.
+        """
+        from email.mime.application import MIMEApplication  # imported here; see connect()
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
+        if attachments:
+            eml = MIMEMultipart()
+            eml.attach(MIMEText(message))
+            for filename, data in attachments:
+                eml.attach(MIMEApplication(data, Name=filename))
+                eml.get_payload()[-1]['Content-Disposition'] = f'attachment; filename="{filename}"'
+        else:
+            eml = MIMEText(message)
+        eml['Subject'] = f'bul-self-updater info from server ``{self.server_name}`` for project ``{self.project_path.name}``'
+        eml['From'] = self.self_updater_email_from
+        eml['To'] = ', '.join(built_recipients)
+        return eml
+
+    def close(self) -> None:
+        """
+        Ends the SMTP session, if one is open. A session the server already dropped is just discarded.
+        """
+        if self.smtp is None:
+            return
+        import smtplib  # imported here; see connect()
+
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            log.debug('problem closing the SMTP session; ignoring')
+        self.smtp = None
+        return
+
     ## end class Emailer
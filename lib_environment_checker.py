@@ -11,7 +11,8 @@ from pathlib import Path
 import dotenv
 
 import lib_git_handler
-from lib_emailer import Emailer
+import lib_process_runner
+from lib_emailer import get_emailer
 
 log = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ def validate_project_path(project_path: Path) -> None:
         message = f'Error: The provided project_path ``{project_path}`` does not exist. Halting self-update.'
         log.exception(message)
         ## email project sys-admins ---------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(emailer.sys_admin_recipients, email_message)
         ## raise exception -----------------------------------------
@@ -65,7 +66,7 @@ def determine_project_email_addresses(project_path: Path) -> list[list[str, str]
         message = f'Error determining email addresses: {e}'
         log.exception(message)
         ## email project sys-admins ---------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(emailer.sys_admin_recipients, email_message)
         ## raise exception -----------------------------------------
@@ -85,7 +86,7 @@ def check_branch(project_path, project_email_addresses) -> None:
         message = f'Error: Project is on branch ``{branch}`` instead of ``main``'
         log.exception(message)
         ## email project sys-admins ---------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(project_email_addresses, email_message)
         ## raise exception -----------------------------------------
@@ -138,7 +139,7 @@ def check_git_status(project_path: Path, project_email_addresses: list[list[str,
         message = 'Error: git-status check failed.'
         log.exception(message)
         ## email project sys-admins ---------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(project_email_addresses, email_message)
         ## raise exception -----------------------------------------
@@ -175,13 +176,16 @@ def determine_python_version(project_path: Path, project_email_addresses: list[l
         message = 'Error: Virtual environment not found.'
         log.exception(message)
         ## email project sys-admins ---------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(project_email_addresses, email_message)
         ## raise exception -----------------------------------------
         raise Exception(message)
     ## get version --------------------------------------------------
-    python_version: str = subprocess.check_output([str(env_python_path), '--version'], text=True).strip().split()[-1]
+    version_result: subprocess.CompletedProcess = lib_process_runner.run(
+        [str(env_python_path), '--version'], phase='checks', capture_output=True, text=True, check=True
+    )
+    python_version: str = version_result.stdout.strip().split()[-1]
     log.debug(f'python_version: {python_version}')
     ## tildify version ----------------------------------------------
     parts: list = python_version.split('.')
@@ -195,7 +199,7 @@ def determine_python_version(project_path: Path, project_email_addresses: list[l
         message = 'Error: Invalid Python version.'
         log.exception(message)
         ## email project-admins -------------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(project_email_addresses, email_message)
         ## raise exception -----------------------------------------
@@ -221,13 +225,17 @@ def determine_environment_type(project_path: Path, project_email_addresses: list
             message = f'Error: {full_path} not found'
             log.exception(message)
             ## email project-admins ---------------------------------
-            emailer = Emailer(project_path)
+            emailer = get_emailer(project_path)
             email_message: str = emailer.create_setup_problem_message(message)
             emailer.send_email(project_email_addresses, email_message)
             ## raise exception --------------------------------------
             raise Exception(message)
     ## determine proper one -----------------------------------------
-    hostname: str = subprocess.check_output(['hostname'], text=True).strip().lower()
+    hostname: str = (
+        lib_process_runner.run(['hostname'], phase='checks', capture_output=True, text=True, check=True)
+        .stdout.strip()
+        .lower()
+    )
     if hostname.startswith('d') or hostname.startswith('q'):
         env_type: str = 'staging'
     elif hostname.startswith('p'):
@@ -246,7 +254,9 @@ def determine_uv_path() -> Path:
     """
     log.info('::: determining uv path ----------')
     try:
-        uv_initial_path: str = subprocess.check_output(['which', 'uv'], text=True).strip()
+        uv_initial_path: str = lib_process_runner.run(
+            ['which', 'uv'], phase='checks', capture_output=True, text=True, check=True
+        ).stdout.strip()
         uv_path = Path(uv_initial_path).resolve()  # to ensure an absolute-path
     except subprocess.CalledProcessError:
         log.debug("`which` unsuccessful; accessing this script's venv")
@@ -267,7 +277,10 @@ def determine_group(project_path: Path, project_email_addresses: list[list[str,
     """
     log.info('::: determining group ----------')
     try:
-        group_list: list[str] = subprocess.check_output(['ls', '-l', str(project_path)], text=True).splitlines()
+        ls_result: subprocess.CompletedProcess = lib_process_runner.run(
+            ['ls', '-l', str(project_path)], phase='checks', capture_output=True, text=True, check=True
+        )
+        group_list: list[str] = ls_result.stdout.splitlines()
         groups = [line.split()[3] for line in group_list if len(line.split()) > 3]
         most_common_group: str = max(set(groups), key=groups.count)
         log.info(f'ok / most_common_group, ``{most_common_group}``')
@@ -276,7 +289,7 @@ def determine_group(project_path: Path, project_email_addresses: list[list[str,
         message = f'Error inferring group: {e}'
         log.exception(message)
         ## email sys-admins -----------------------------------------
-        emailer = Emailer(project_path)
+        emailer = get_emailer(project_path)
         email_message: str = emailer.create_setup_problem_message(message)
         emailer.send_email(project_email_addresses, email_message)
         ## raise exception -----------------------------------------
@@ -0,0 +1,147 @@
+"""
+Module used by self_updater.py
+Contains code for caching the project's environment-facts between runs, so a run needn't rediscover them.
+
+The facts -- the project-admins' email addresses (from the `.env`), the venv's python version, the uv path
+  (from `which`), and the project's group (from `ls -l`) -- almost never change, but discovering them each run
+  means parsing files and launching processes.
+
+Each fact is cached in `facts.json`, in the project's `self_updater_data` directory, with a fingerprint of its sources:
+- email_addresses -- the "outer-stuff" `.env`
+- python_version -- `env/pyvenv.cfg`, the `env` symlink's target, and the venv's `python3` (resolved)
+- uv_path -- `PATH`, each of its directories, and the uv executable
+- group -- the project code-directory, and the group of each of its (non-hidden) entries, as `ls -l` lists them
+A file's fingerprint is its resolved path, inode, mtime, and size; a fact whose fingerprint differs is rediscovered.
+  (Not ctime: update_permissions()'s `chgrp -R` of the venv changes it every run.) A replaced file (ie a new `.env`
+  renamed into place, or a rebuilt venv) has a new inode, even if its mtime was preserved; and a fact whose sources
+  changed within the last couple of seconds isn't cached (a second edit in the same mtime-tick couldn't be told
+  apart), so it's rediscovered next run.
+
+Enabled by default; `SLFUPDTR__FACTS_CACHE=false` rediscovers every fact each run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import lib_common
+
+log = logging.getLogger(__name__)
+
+FACTS_NAME = 'facts.json'
+RACY_SECONDS = 2  # sources changed this recently aren't trusted to fingerprint a cached fact
+DECODERS: dict[str, Callable] = {'python_version': tuple, 'uv_path': Path}  # JSON values back to the callers' types
+
+
+def is_enabled() -> bool:
+    return os.environ.get('SLFUPDTR__FACTS_CACHE', 'true').lower() != 'false'
+
+
+def stat_fingerprint(path: Path | str) -> list | None:
+    """
+    Returns [resolved-path, inode, mtime_ns, size]; None if the path doesn't exist.
+    """
+    try:
+        stat_result: os.stat_result = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return [os.path.realpath(path), stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size]
+
+
+def dir_fingerprint(path: Path) -> list | None:
+    """
+    Returns the directory's stat-fingerprint, plus a digest of its non-hidden entries' groups; None if it doesn't exist.
+    (A `chgrp` of an entry doesn't change the directory's mtime, so the groups are fingerprinted too.)
+    """
+    fingerprint: list | None = stat_fingerprint(path)
+    if fingerprint is None:
+        return None
+    entry_groups: list[str] = sorted(
+        f'{entry.name}:{entry.stat(follow_symlinks=False).st_gid}'
+        for entry in os.scandir(path)
+        if not entry.name.startswith('.')
+    )
+    return [*fingerprint, hashlib.sha256('\n'.join(entry_groups).encode()).hexdigest()]
+
+
+def determine_sources(fact: str, project_path: Path, value) -> dict:
+    """
+    Returns the fingerprints of the fact's sources. The uv_path's sources include the (cached or new) uv path itself.
+    """
+    outer_path: Path = project_path.parent
+    if fact == 'email_addresses':
+        return {'.env': stat_fingerprint(outer_path / '.env')}
+    if fact == 'python_version':
+        return {
+            'env': os.path.realpath(outer_path / 'env'),
+            'pyvenv.cfg': stat_fingerprint(outer_path / 'env' / 'pyvenv.cfg'),
+            'python3': stat_fingerprint(outer_path / 'env' / 'bin' / 'python3'),
+        }
+    if fact == 'uv_path':
+        path_envar: str = os.environ.get('PATH', '')
+        return {
+            'PATH': path_envar,
+            'path_dirs': [stat_fingerprint(path_dir) for path_dir in path_envar.split(os.pathsep) if path_dir],
+            'uv': stat_fingerprint(value),
+        }
+    if fact == 'group':
+        return {'project_dir': dir_fingerprint(project_path)}
+    raise Exception(f'unknown fact, ``{fact}``')
+
+
+def is_racy(sources: dict) -> bool:
+    """
+    Checks whether any source changed within the last `RACY_SECONDS`.
+    """
+    cutoff_ns: int = time.time_ns() - RACY_SECONDS * 1_000_000_000
+    fingerprints: list[list] = []
+    for source in sources.values():
+        if isinstance(source, list) and source and isinstance(source[0], list | None):  # ie the PATH directories
+            fingerprints.extend(fingerprint for fingerprint in source if fingerprint)
+        elif isinstance(source, list):
+            fingerprints.append(source)
+    return any(fingerprint[2] >= cutoff_ns for fingerprint in fingerprints)
+
+
+class FactsCache:
+    """
+    Holds the project's cached facts; get() returns a fact from the cache, or rediscovers (and caches) it.
+    """
+
+    def __init__(self, project_path: Path) -> None:
+        self.project_path: Path = project_path
+        self.facts_path: Path = lib_common.determine_data_dir(project_path) / FACTS_NAME
+        self.facts: dict = {}
+        if is_enabled() and self.facts_path.exists():
+            try:
+                self.facts = json.loads(self.facts_path.read_text())
+            except ValueError:
+                log.exception(f'unreadable facts-cache, ``{self.facts_path}``; rediscovering')
+
+    def get(self, fact: str, discover: Callable, *args):
+        """
+        Returns the cached fact if its sources are unchanged; otherwise calls `discover(*args)`, caches, and returns it.
+        Called by self_updater.manage_update().
+        """
+        if not is_enabled():
+            return discover(*args)
+        entry: dict | None = self.facts.get(fact)
+        if entry:
+            sources: dict = json.loads(json.dumps(determine_sources(fact, self.project_path, entry['value'])))
+            if sources == entry['sources']:
+                log.info(f'ok / ``{fact}`` from the facts-cache')
+                return DECODERS.get(fact, lambda value: value)(entry['value'])
+            log.debug(f'``{fact}`` sources changed; rediscovering')
+        value = discover(*args)
+        sources = json.loads(json.dumps(determine_sources(fact, self.project_path, value)))
+        if is_racy(sources):
+            log.debug(f'``{fact}`` sources changed just now; not caching')
+            self.facts.pop(fact, None)
+        else:
+            self.facts[fact] = {'value': json.loads(json.dumps(value, default=str)), 'sources': sources}
+        lib_common.write_text_atomically(self.facts_path, json.dumps(self.facts, indent=2))
+        return value
@@ -2,6 +2,8 @@ import logging
 import subprocess
 from pathlib import Path
 
+import lib_process_runner
+
 log = logging.getLogger(__name__)
 
 
@@ -10,12 +12,14 @@ def run_git_status(project_path: Path) -> tuple[bool, dict]:
     Runs `git status` and return the output similar to Go's (ok, err) format.
     """
     command = ['git', 'status']
-    result: subprocess.CompletedProcess = subprocess.run(command, cwd=str(project_path), capture_output=True, text=True)
-    log.debug(f'result: {result}')
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        command, phase='git', cwd=str(project_path), capture_output=True, text=True, timeout_ok=True
+    )
+    log.debug('result: %s', result)
     ok = True if result.returncode == 0 else False
     output = {'stdout': f'{result.stdout}', 'stderr': f'{result.stderr}'}
     return_val = (ok, output)
-    log.debug(f'return_val: {return_val}')
+    log.debug('return_val: %s', return_val)
     return return_val
 
 
@@ -28,14 +32,16 @@ def run_git_pull(project_path: Path) -> tuple[bool, dict]:
     """
     log.info('::: running git pull ----------')
     command = ['git', 'pull']
-    result: subprocess.CompletedProcess = subprocess.run(command, cwd=str(project_path), capture_output=True, text=True)
-    log.debug(f'result: {result}')
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        command, phase='git', cwd=str(project_path), capture_output=True, text=True, timeout_ok=True
+    )
+    log.debug('result: %s', result)
     ok = True if result.returncode == 0 else False
     if ok is True:
         log.info('ok / git pull successful')
     output = {'stdout': f'{result.stdout}', 'stderr': f'{result.stderr}'}
     return_val = (ok, output)
-    log.debug(f'return_val: {return_val}')
+    log.debug('return_val: %s', return_val)
     return return_val
 
 
@@ -45,14 +51,16 @@ def run_git_add(requirements_path: Path, project_path: Path) -> tuple[bool, dict
     """
     log.info('::: running git add ----------')
     command = ['git', 'add', str(requirements_path)]
-    result: subprocess.CompletedProcess = subprocess.run(command, cwd=str(project_path), capture_output=True, text=True)
-    log.debug(f'result: {result}')
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        command, phase='git', cwd=str(project_path), capture_output=True, text=True, timeout_ok=True
+    )
+    log.debug('result: %s', result)
     ok = True if result.returncode == 0 else False
     if ok is True:
         log.info('ok / git add successful')
     output = {'stdout': f'{result.stdout}', 'stderr': f'{result.stderr}'}
     return_val = (ok, output)
-    log.debug(f'return_val: {return_val}')
+    log.debug('return_val: %s', return_val)
     return return_val
 
 
@@ -64,8 +72,10 @@ def run_git_commit(project_path: Path, commit_message: str | None = None) -> tup
     if commit_message is None:
         commit_message = 'auto-update of requirements'
     command = ['git', 'commit', '-m', commit_message]
-    result: subprocess.CompletedProcess = subprocess.run(command, cwd=str(project_path), capture_output=True, text=True)
-    log.debug(f'result: {result}')
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        command, phase='git', cwd=str(project_path), capture_output=True, text=True, timeout_ok=True
+    )
+    log.debug('result: %s', result)
     ok = True if result.returncode == 0 else False
     if ok is True:
         log.info('ok / git commit successful')
@@ -74,7 +84,7 @@ def run_git_commit(project_path: Path, commit_message: str | None = None) -> tup
             log.info('ok / nothing to commit')
     output = {'stdout': f'{result.stdout}', 'stderr': f'{result.stderr}'}
     return_val = (ok, output)
-    log.debug(f'return_val: {return_val}')
+    log.debug('return_val: %s', return_val)
     return return_val
 
 
@@ -84,8 +94,10 @@ def run_git_push(project_path: Path) -> tuple[bool, dict]:
     """
     log.info('::: running git push ----------')
     command = ['git', 'push', 'origin', 'main']
-    result: subprocess.CompletedProcess = subprocess.run(command, cwd=str(project_path), capture_output=True, text=True)
-    log.debug(f'result: {result}')
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        command, phase='git', cwd=str(project_path), capture_output=True, text=True, timeout_ok=True
+    )
+    log.debug('result: %s', result)
     ok = True if result.returncode == 0 else False
     if ok is True:
         if 'Everything up-to-date' in result.stderr:
@@ -94,5 +106,5 @@ def run_git_push(project_path: Path) -> tuple[bool, dict]:
             log.info('ok / git push successful')
     output = {'stdout': f'{result.stdout}', 'stderr': f'{result.stderr}'}
     return_val = (ok, output)
-    log.debug(f'return_val: {return_val}')
+    log.debug('return_val: %s', return_val)
     return return_val
@@ -0,0 +1,166 @@
+"""
+Module used by self_updater.py
+Contains code for the updater's logging: non-blocking, structured (JSON-lines), size-capped and rotated.
+
+- Callers' log-records are put on a queue; a background QueueListener thread formats and writes them,
+    so the update's hot-path doesn't pay for formatting (lazy `%s` args are only rendered by the listener).
+- Each line is a JSON object, tagged with the run-id (see `set_run_id()`), so one run's lines can be grepped out.
+- A message longer than the limit is cut short in the log; its full text is written to a gzipped artifact file,
+    which the log-line names.
+- The log rotates by size, and rotated logs are gzipped.
+- Each project's runs log to their own file (see `determine_log_name()`): the rollout updates projects in parallel,
+    and several processes rotating one shared file would race -- renaming, or gzipping, another's live log.
+
+Envars (all optional): `SLFUPDTR__LOG_MAX_BYTES` (default 10 MB), `SLFUPDTR__LOG_BACKUP_COUNT` (default 10),
+  `SLFUPDTR__LOG_MAX_MESSAGE_CHARS` (default 5000), `SLFUPDTR__LOG_ARTIFACTS_KEEP` (default 200);
+  an invalid value falls back to the default.
+"""
+
+import atexit
+import gzip
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import lib_common
+
+run_id: str = '-'  # set per run; stamped on every record
+artifact_counter = itertools.count(1)
+
+
+def set_run_id(new_run_id: str) -> None:
+    """
+    Sets the run-id stamped on every subsequent log-record.
+    Called by self_updater.manage_update() at startup.
+    """
+    global run_id
+    run_id = new_run_id
+    return
+
+
+class RunIdFilter(logging.Filter):
+    """
+    Stamps the current run-id on each record, in the caller's thread (so it's the id at logging-time).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = run_id
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues the record as-is.
+    The stock QueueHandler.prepare() renders the message (and any traceback) in the caller's thread;
+      here that's left to the listener. The queue is in-process, so records needn't be pickle-safe.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON line; over-long messages are moved to an artifact file.
+    """
+
+    def __init__(self, artifacts_dir: Path, max_message_chars: int) -> None:
+        super().__init__()
+        self.artifacts_dir: Path = artifacts_dir
+        self.max_message_chars: int = max_message_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        message: str = record.getMessage()
+        if record.exc_info:
+            message = f'{message}\n{self.formatException(record.exc_info)}'
+        if len(message) > self.max_message_chars:
+            artifact_path: Path = self.write_artifact(message, getattr(record, 'run_id', '-'))
+            message = (
+                f'{message[: self.max_message_chars]} ... [truncated {len(message)} chars; full text in ``{artifact_path}``]'
+            )
+        entry: dict = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'run_id': getattr(record, 'run_id', '-'),
+            'where': f'{record.module}-{record.funcName}()::{record.lineno}',
+            'thread': record.threadName,
+            'message': message,
+        }
+        return json.dumps(entry)
+
+    def write_artifact(self, message: str, record_run_id: str) -> Path:
+        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+        artifact_path: Path = self.artifacts_dir / f'{record_run_id}_{next(artifact_counter):04d}.txt.gz'
+        with gzip.open(artifact_path, 'wt') as f:
+            f.write(message)
+        return artifact_path
+
+
+def determine_log_name(project_path: str) -> str:
+    """
+    Returns the log's file-name for a run on the project, ie `self_updater__project_x.log`.
+    A project is updated by one run at a time (its cron-job, or a rollout-wave), so only one process writes, and rotates,
+      each log.
+    Called by self_updater.set_up_settings_and_logging().
+    """
+    project_name: str = Path(project_path).resolve().name or 'root'
+    return f'self_updater__{project_name}.log'
+
+
+def gzip_rotator(source: str, destination: str) -> None:
+    """
+    Compresses a rotated log; used by the RotatingFileHandler.
+    """
+    with open(source, 'rb') as f_in, gzip.open(destination, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+    return
+
+
+def prune_artifacts(artifacts_dir: Path, keep: int) -> None:
+    """
+    Removes all but the newest `keep` artifact files.
+    """
+    if not artifacts_dir.exists():
+        return
+    artifacts: list[Path] = sorted(artifacts_dir.glob('*.txt.gz'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old_artifact in artifacts[keep:]:
+        old_artifact.unlink(missing_ok=True)
+    return
+
+
+def configure_logging(log_file_path: Path, level: int = logging.DEBUG) -> logging.handlers.QueueListener:
+    """
+    Routes root-logger records through a queue to a background listener writing rotated, gzipped JSON-lines.
+    The listener is stopped (flushing the queue) at interpreter exit.
+    An invalid envar falls back to its default; the warning, logged before the handlers are set up, goes to stderr.
+    Called by self_updater.py at startup.
+    """
+    max_bytes: int = lib_common.read_number_envar('SLFUPDTR__LOG_MAX_BYTES', 10 * 1024 * 1024)
+    backup_count: int = lib_common.read_number_envar('SLFUPDTR__LOG_BACKUP_COUNT', 10)
+    max_message_chars: int = lib_common.read_number_envar('SLFUPDTR__LOG_MAX_MESSAGE_CHARS', 5000)
+    artifacts_keep: int = lib_common.read_number_envar('SLFUPDTR__LOG_ARTIFACTS_KEEP', 200)
+    artifacts_dir: Path = log_file_path.parent / 'artifacts'
+    prune_artifacts(artifacts_dir, artifacts_keep)
+    ## file-handler, run by the listener-thread ---------------------
+    file_handler = logging.handlers.RotatingFileHandler(log_file_path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.namer = lambda name: f'{name}.gz'
+    file_handler.rotator = gzip_rotator
+    file_handler.setFormatter(JsonLinesFormatter(artifacts_dir, max_message_chars))
+    ## queue-handler, run by the callers ----------------------------
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RunIdFilter())
+    root_logger: logging.Logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,459 @@
+"""
+Module used by self_updater.py and the lib_ modules.
+Contains the central runner for every child process the self-updater starts.
+
+`run()` takes the same main arguments as `subprocess.run()`, and returns a `subprocess.CompletedProcess`.
+
+Low-impact mode (`SLFUPDTR__LOW_IMPACT='true'`), for hosts that are also serving traffic:
+- CPU niceness and I/O scheduling-class are applied to the self-updater process itself at startup,
+    so every child process (and grandchild, like the project's test-processes) inherits them.
+- Optional memory and CPU-time rlimits are applied to each child process.
+- A duty-cycle limits the fraction of time the updater's children keep the CPU busy:
+    after each child finishes, the runner pauses in proportion to the CPU-time the child used.
+
+Timeouts:
+- Each child runs under its phase's time-budget (see `DEFAULT_PHASE_TIMEOUTS`), and under the whole-run deadline.
+- Each child is started in its own process-group, so on expiry the watchdog kills the child *and* its children
+    (ie a test-runner's workers, or git's ssh), first with SIGTERM, then, after a grace period, SIGKILL.
+- An expiry raises `ProcessTimeoutError` (or, with `timeout_ok=True`, returns a failed result), and is recorded in `timeout_failures` for the update-email, and the usage-history.
+
+Resource accounting:
+- Each child's wall-time, user/system CPU, max RSS, and block I/O (from its `wait4()` rusage) are added to `phase_usage`.
+- At the end of a run, the per-phase totals (and any timeout-records) are appended to `resource_history.jsonl`
+    in the `self_updater_data` directory, for capacity-planning how many projects a host can update at once.
+"""
+
+import ctypes
+import functools
+import json
+import logging
+import os
+import resource
+import signal
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import lib_common
+
+log = logging.getLogger(__name__)
+
+IOPRIO_SYSCALL_NUMBERS: dict = {'x86_64': 251, 'aarch64': 30, 'i686': 289, 'armv7l': 314, 'ppc64le': 273, 's390x': 282}
+IOPRIO_CLASSES: dict = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+
+DEFAULT_PHASE_TIMEOUTS: dict = {  # seconds; overridable via `SLFUPDTR__PHASE_TIMEOUTS_JSON`
+    'checks': 60,
+    'compile': 600,
+    'sync': 900,
+    'precompile': 600,
+    'tests': 1800,
+    'collectstatic': 600,
+    'git': 120,
+    'permissions': 600,
+    'benchmark': 900,
+    'startup_profile': 300,
+    'bisect': 1800,
+    'wheel_build': 1200,
+}
+DEFAULT_RUN_DEADLINE_SECONDS = 4 * 60 * 60  # overridable via `SLFUPDTR__RUN_DEADLINE_SECONDS`
+KILL_GRACE_SECONDS = 10
+
+run_deadline: float | None = None  # monotonic-time; set by start_run_deadline()
+timeout_failures: list[dict] = []  # structured records of expired children, for the update-email and usage-history
+phase_usage: dict = {}  # phase -> resource-usage totals of its children; see record_usage()
+phase_usage_lock = threading.Lock()  # children of different phases can run concurrently
+signal_lock = threading.Lock()  # serializes watchdog-signals with the reaping of children; see kill_process_group()
+
+
+class ProcessTimeoutError(subprocess.TimeoutExpired):
+    """
+    Raised when a child process exceeds its phase's time-budget, or the whole-run deadline.
+    """
+
+    def __init__(self, record: dict, output=None, stderr=None) -> None:
+        super().__init__(record['command'], record['timeout'], output=output, stderr=stderr)
+        self.record: dict = record
+
+    def __str__(self) -> str:
+        return format_timeout_failure(self.record)
+
+
+def determine_low_impact_settings() -> dict:
+    """
+    Returns the low-impact settings from the optional envars:
+    - `SLFUPDTR__LOW_IMPACT` -- `true` to enable (default off)
+    - `SLFUPDTR__NICENESS` -- CPU niceness increment (default 10)
+    - `SLFUPDTR__IONICE_CLASS` -- `idle` (the default), `best-effort`, or `none`
+    - `SLFUPDTR__RLIMIT_AS_MB` -- per-child address-space limit, in MB (default none)
+    - `SLFUPDTR__RLIMIT_CPU_SECONDS` -- per-child CPU-time limit (default none)
+    - `SLFUPDTR__DUTY_CYCLE` -- max fraction of time children may keep a CPU busy, ie `0.5` (default 1.0, no pausing)
+    An invalid number is logged, and its default used; this runs for every child, including the error-paths' git and email.
+    """
+    settings: dict = {
+        'enabled': os.environ.get('SLFUPDTR__LOW_IMPACT', '').lower() == 'true',
+        'niceness': lib_common.read_number_envar('SLFUPDTR__NICENESS', 10),
+        'ionice_class': os.environ.get('SLFUPDTR__IONICE_CLASS', 'idle').lower(),
+        'rlimit_as_mb': lib_common.read_number_envar('SLFUPDTR__RLIMIT_AS_MB', 0),
+        'rlimit_cpu_seconds': lib_common.read_number_envar('SLFUPDTR__RLIMIT_CPU_SECONDS', 0),
+        'duty_cycle': min(1.0, max(0.05, lib_common.read_number_envar('SLFUPDTR__DUTY_CYCLE', 1.0, float))),
+    }
+    return settings
+
+
+def apply_low_impact_to_current_process() -> None:
+    """
+    Lowers the self-updater's own CPU and I/O priority, if low-impact mode is enabled; child processes inherit both.
+    Failures are logged, not raised; the update should still run at normal priority.
+    Called by self_updater.manage_update() at startup.
+    """
+    settings: dict = determine_low_impact_settings()
+    if not settings['enabled']:
+        return
+    log.info('::: applying low-impact priorities ----------')
+    try:
+        os.nice(settings['niceness'])
+    except OSError:
+        log.exception('problem setting niceness')
+    if settings['ionice_class'] in IOPRIO_CLASSES:
+        set_io_priority(0, IOPRIO_CLASSES[settings['ionice_class']], level=7)
+    log.info(f'ok / low-impact settings, ``{settings}``')
+    return
+
+
+def set_io_priority(pid: int, ioprio_class: int, level: int = 7) -> bool:
+    """
+    Sets the I/O scheduling-class of a process (0 means the current process) via the Linux `ioprio_set` syscall.
+    Returns False, after logging, where that isn't available.
+    """
+    syscall_number: int | None = IOPRIO_SYSCALL_NUMBERS.get(os.uname().machine)
+    if syscall_number is None:
+        log.warning(f'ioprio_set not supported on machine, ``{os.uname().machine}``')
+        return False
+    ioprio_who_process, ioprio_class_shift = 1, 13
+    libc = ctypes.CDLL(None, use_errno=True)
+    result: int = libc.syscall(syscall_number, ioprio_who_process, pid, (ioprio_class << ioprio_class_shift) | level)
+    if result != 0:
+        log.warning(f'ioprio_set failed; errno, ``{ctypes.get_errno()}``')
+        return False
+    return True
+
+
+def start_run_deadline(seconds: float | None = None) -> None:
+    """
+    Starts the whole-run deadline; after it passes, running children are killed and new ones aren't started.
+    Also clears the previous run's timeout and resource-usage records.
+    Called by self_updater.manage_update() at startup.
+    """
+    global run_deadline
+    if seconds is None:
+        seconds = lib_common.read_number_envar('SLFUPDTR__RUN_DEADLINE_SECONDS', DEFAULT_RUN_DEADLINE_SECONDS, float)
+    run_deadline = time.monotonic() + seconds
+    timeout_failures.clear()
+    with phase_usage_lock:
+        phase_usage.clear()
+    log.debug(f'run deadline set to ``{seconds}`` seconds from now')
+    return
+
+
+def determine_timeout(phase: str) -> float | None:
+    """
+    Returns the smaller of the phase's time-budget and the time left before the run-deadline; None if neither applies.
+    Phase budgets come from `DEFAULT_PHASE_TIMEOUTS`, updated by the optional `SLFUPDTR__PHASE_TIMEOUTS_JSON` envar,
+      ie `SLFUPDTR__PHASE_TIMEOUTS_JSON='{"tests": 3600}'`.
+    Called by run().
+    """
+    phase_timeouts: dict = parse_phase_timeouts(os.environ.get('SLFUPDTR__PHASE_TIMEOUTS_JSON', '').strip())
+    candidates: list[float] = []
+    if phase_timeouts.get(phase):
+        candidates.append(float(phase_timeouts[phase]))
+    if run_deadline is not None:
+        candidates.append(run_deadline - time.monotonic())
+    return min(candidates) if candidates else None
+
+
+@functools.lru_cache(maxsize=8)
+def parse_phase_timeouts(raw: str) -> dict:
+    """
+    Returns `DEFAULT_PHASE_TIMEOUTS`, updated by the raw `SLFUPDTR__PHASE_TIMEOUTS_JSON` value
+      (a JSON object of phase -> seconds, or null for no budget).
+    An invalid value is logged (once; results are cached by the raw string), and the defaults used;
+      this runs for every child, including the error-paths' git and email.
+    Called by determine_timeout().
+    """
+    if not raw:
+        return dict(DEFAULT_PHASE_TIMEOUTS)
+    try:
+        overrides = json.loads(raw)
+        if not isinstance(overrides, dict):
+            raise ValueError('not a JSON object')
+        for phase, seconds in overrides.items():
+            if seconds is not None and (isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds < 0):
+                raise ValueError(f'invalid seconds for phase ``{phase}``')
+    except ValueError as e:
+        log.warning(f'invalid SLFUPDTR__PHASE_TIMEOUTS_JSON value, ``{raw}`` ({e}); using the default phase-timeouts')
+        return dict(DEFAULT_PHASE_TIMEOUTS)
+    return {**DEFAULT_PHASE_TIMEOUTS, **overrides}
+
+
+def run(
+    command: list[str],
+    *,
+    phase: str,
+    cwd: str | None = None,
+    env: dict | None = None,
+    capture_output: bool = False,
+    text: bool = False,
+    input: str | bytes | None = None,
+    check: bool = False,
+    low_impact: bool = True,
+    timeout_ok: bool = False,
+) -> subprocess.CompletedProcess:
+    """
+    Runs a child process, like `subprocess.run()`, under the `phase`'s time-budget; see the module docstring.
+    If low-impact mode is enabled (and `low_impact` isn't turned off by the caller, as the measurement-stages do),
+      applies the rlimits to the child, and pauses afterwards according to the duty-cycle.
+    The child is reaped with `os.wait4()`, so its resource-usage is available as the result's `rusage` attribute.
+    Raises ProcessTimeoutError if the child is killed by the watchdog; or, with `timeout_ok`, returns the timeout as a
+      failed result (see timeout_result()), for callers that report failures via the `(ok, output)` convention.
+    """
+    settings: dict = determine_low_impact_settings()
+    timeout: float | None = determine_timeout(phase)
+    if timeout is not None and timeout <= 0:
+        record: dict = record_timeout(phase, command, 0.0, 0.0)
+        return raise_or_convert_timeout(ProcessTimeoutError(record), timeout_ok)
+    pipe = subprocess.PIPE if capture_output else None
+    start: float = time.monotonic()
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=pipe,
+        stderr=pipe,
+        text=text,
+        start_new_session=True,  # own process-group, so the watchdog can kill the child's children too
+    )
+    if settings['enabled'] and low_impact:
+        apply_child_rlimits(process.pid, settings)
+    ## start the watchdog -------------------------------------------
+    expired = threading.Event()
+    finished = threading.Event()
+    watchdog: threading.Timer | None = None
+    if timeout is not None:
+        watchdog = threading.Timer(timeout, kill_process_group, args=(process.pid, expired, finished))
+        watchdog.daemon = True
+        watchdog.start()
+    ## collect output, stop the watchdog, then reap -----------------
+    (stdout, stderr) = communicate_without_reaping(process, input)
+    os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)  # waits for exit, leaving a zombie that holds the pgid
+    with signal_lock:  # waits out a signal the watchdog is sending right now
+        finished.set()  # before reaping: once reaped, the child's pgid can be reused, so no signal may follow
+    if watchdog is not None:
+        watchdog.cancel()
+    (_pid, status, rusage) = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    record_usage(phase, time.monotonic() - start, rusage)
+    if expired.is_set():
+        record = record_timeout(phase, command, timeout, time.monotonic() - start)
+        return raise_or_convert_timeout(ProcessTimeoutError(record, output=stdout, stderr=stderr), timeout_ok)
+    result = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+    result.rusage = rusage
+    if settings['enabled'] and low_impact:
+        pause_for_duty_cycle(rusage.ru_utime + rusage.ru_stime, settings['duty_cycle'])
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, command, output=stdout, stderr=stderr)
+    return result
+
+
+def record_usage(phase: str, wall_seconds: float, rusage: resource.struct_rusage) -> None:
+    """
+    Adds a child's resource-usage to its phase's totals. Max RSS is the phase's largest child, in MB
+      (Linux reports `ru_maxrss` in KB); block I/O counts are 512-byte blocks.
+    Called by run().
+    """
+    with phase_usage_lock:
+        totals: dict = phase_usage.setdefault(
+            phase,
+            {'children': 0, 'wall': 0.0, 'user': 0.0, 'system': 0.0, 'max_rss_mb': 0.0, 'in_blocks': 0, 'out_blocks': 0},
+        )
+        totals['children'] += 1
+        totals['wall'] += wall_seconds
+        totals['user'] += rusage.ru_utime
+        totals['system'] += rusage.ru_stime
+        totals['max_rss_mb'] = max(totals['max_rss_mb'], rusage.ru_maxrss / 1024)
+        totals['in_blocks'] += rusage.ru_inblock
+        totals['out_blocks'] += rusage.ru_oublock
+    return
+
+
+def summarize_usage() -> dict:
+    """
+    Returns a copy of the run's per-phase resource-usage totals, with times rounded for readability.
+    """
+    with phase_usage_lock:
+        summary: dict = {
+            phase: {key: round(value, 3) if isinstance(value, float) else value for key, value in totals.items()}
+            for phase, totals in phase_usage.items()
+        }
+    return summary
+
+
+def save_usage_history(project_path: Path) -> None:
+    """
+    Appends the run's per-phase resource-usage totals, and its timeout-records (including those that didn't halt the run),
+      as one JSON line, to the project's `resource_history.jsonl`.
+    Failures are logged, not raised; accounting shouldn't break an update.
+    Called by self_updater.py's dundermain, after the run (whether or not it succeeded).
+    """
+    summary: dict = summarize_usage()
+    log.info(f'resource usage by phase, ``{summary}``')
+    if not (summary or timeout_failures) or not project_path.exists():
+        return  # ie a run that halted on an invalid project-path; don't create a data-directory next to it
+    try:
+        history_path: Path = lib_common.determine_data_dir(project_path) / 'resource_history.jsonl'
+        entry: dict = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'project': project_path.name,
+            'phases': summary,
+            'timeouts': timeout_failures,
+        }
+        with history_path.open('a') as history_file:
+            history_file.write(json.dumps(entry, sort_keys=True) + '\n')
+    except Exception:
+        log.exception('problem saving resource-usage history')
+    return
+
+
+def kill_process_group(pgid: int, expired: threading.Event, finished: threading.Event) -> None:
+    """
+    Watchdog action: SIGTERMs the child's process-group, then SIGKILLs whatever is left after a grace period.
+    Stops as soon as run() sets `finished` (which it does before reaping the child), so no signal can reach
+      a reused pgid; `signal_lock` makes each check-then-signal atomic with respect to setting `finished`.
+    Called, in a timer-thread, by run().
+    """
+    with signal_lock:
+        if finished.is_set():
+            return  # the child exited just as the budget ran out
+        expired.set()
+    log.warning(f'time-budget expired; killing process-group, ``{pgid}``')
+    for sig, pause in ((signal.SIGTERM, KILL_GRACE_SECONDS), (signal.SIGKILL, 0)):
+        with signal_lock:
+            if finished.is_set():
+                return  # the child is done, and about to be reaped
+            try:
+                os.killpg(pgid, sig)
+            except ProcessLookupError:
+                return  # the whole group is gone
+        finished.wait(pause)  # wakes early if the child exits after the SIGTERM
+    return
+
+
+def raise_or_convert_timeout(error: ProcessTimeoutError, timeout_ok: bool) -> subprocess.CompletedProcess:
+    """
+    Raises the timeout; or, with `timeout_ok`, returns it as a failed result.
+    Called by run().
+    """
+    if not timeout_ok:
+        raise error
+    return timeout_result(error)
+
+
+def record_timeout(phase: str, command: list[str], timeout: float, elapsed: float) -> dict:
+    """
+    Records a structured timeout-failure, for the update-email; returns the record.
+    Called by run().
+    """
+    record: dict = {'phase': phase, 'command': command, 'timeout': round(timeout, 1), 'elapsed': round(elapsed, 1)}
+    timeout_failures.append(record)
+    log.error(f'timeout, ``{record}``')
+    return record
+
+
+def format_timeout_failure(record: dict) -> str:
+    """
+    Returns a one-line description of a timeout-failure record.
+    """
+    return (
+        f'Timeout in phase ``{record["phase"]}``: command ``{" ".join(str(part) for part in record["command"])}`` '
+        f'was killed after {record["elapsed"]} seconds (budget {record["timeout"]} seconds).'
+    )
+
+
+def timeout_result(error: ProcessTimeoutError) -> subprocess.CompletedProcess:
+    """
+    Converts a (text-mode) timeout into a failed CompletedProcess, with the timeout-description appended to stderr,
+      for callers that report failures via the `(ok, output)` convention rather than exceptions.
+    """
+    stderr: str = f'{error.stderr or ""}\n{error}'.strip()
+    return subprocess.CompletedProcess(error.cmd, -signal.SIGKILL, error.output or '', stderr)
+
+
+def make_timeout_report() -> None | str:
+    """
+    Returns the run's timeout-failures as a problem-message for the update-email; None if there were none.
+    """
+    if not timeout_failures:
+        return None
+    return '\n'.join(format_timeout_failure(record) for record in timeout_failures)
+
+
+def apply_child_rlimits(pid: int, settings: dict) -> None:
+    """
+    Applies the configured memory and CPU-time rlimits to a just-started child; its own children inherit them.
+    Called by run().
+    """
+    try:
+        if settings['rlimit_as_mb']:
+            limit: int = settings['rlimit_as_mb'] * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if settings['rlimit_cpu_seconds']:
+            limit = settings['rlimit_cpu_seconds']
+            resource.prlimit(pid, resource.RLIMIT_CPU, (limit, limit))
+    except (OSError, ValueError):
+        log.exception(f'problem applying rlimits to pid, ``{pid}``')  # ie, the child already exited
+    return
+
+
+def communicate_without_reaping(process: subprocess.Popen, input: str | bytes | None) -> tuple:
+    """
+    Feeds `input` and collects stdout/stderr, like `Popen.communicate()`, but without waiting on the process,
+      so the caller can reap it with `os.wait4()` and get its resource-usage.
+    Called by run().
+    """
+    outputs: dict = {}
+
+    def read(name: str, stream) -> None:
+        outputs[name] = stream.read()
+        stream.close()
+
+    threads: list[threading.Thread] = []
+    for name in ('stdout', 'stderr'):
+        stream = getattr(process, name)
+        if stream is not None:
+            threads.append(threading.Thread(target=read, args=(name, stream), daemon=True))
+    for thread in threads:
+        thread.start()
+    if process.stdin is not None:
+        try:
+            process.stdin.write(input)
+        except BrokenPipeError:
+            pass  # the child exited without reading all its input
+        process.stdin.close()
+    for thread in threads:
+        thread.join()
+    return (outputs.get('stdout'), outputs.get('stderr'))
+
+
+def pause_for_duty_cycle(busy_seconds: float, duty_cycle: float, max_pause: float = 600.0) -> float:
+    """
+    Sleeps so that, over the child's CPU-time plus the pause, the CPU is busy at most `duty_cycle` of the time.
+    Returns the pause, in seconds.
+    Called by run().
+    """
+    pause: float = min(max_pause, busy_seconds * (1 - duty_cycle) / duty_cycle)
+    if pause > 0:
+        log.debug(f'duty-cycle pause, ``{pause:.2f}`` seconds after ``{busy_seconds:.2f}`` cpu-seconds')
+        time.sleep(pause)
+    return pause
@@ -0,0 +1,195 @@
+"""
+Module used by self_updater.py
+Contains code for the `--profile` option: a sampling profiler for a whole manage_update() run.
+
+A background thread samples every thread's Python stack at a fixed interval (wall-clock; time spent waiting on
+  a child-process shows up in the frames doing the waiting).
+Each sample is attributed to a "phase": the function manage_update() is currently in, ie `sync_dependencies`,
+  or `CompiledComparator.compare_with_previous_backup` -- through any wrapper, ie a journaled phase's run_phase(),
+  or a cached discovery's FactsCache.get(). Samples from worker-threads (ie the concurrent compile) are attributed
+  to the main thread's phase at that moment.
+
+Output, in the profile-directory:
+- `combined.folded` -- all samples, as collapsed stacks (`frame;frame;frame count`), for flamegraph.pl or speedscope.
+- `<phase>.folded` -- the phase's samples, as collapsed stacks.
+- `<phase>.txt` -- the phase's functions, by inclusive and by self time.
+- `summary.txt` -- time per phase.
+
+A phase-filter (ie `update_permissions`, or `CompiledComparator`) keeps only samples from phases whose name contains it.
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+ROOT_FUNCTION = 'manage_update'
+WRAPPER_FUNCTIONS: tuple[str, ...] = ('Checkpoint.run_phase', 'FactsCache.get')  # run phases; not phases themselves
+LISTENER_FRAME = 'handlers:QueueListener._monitor'  # the log-listener thread; not part of the update
+
+
+class SamplingProfiler:
+    """
+    Samples all threads' stacks, by manage_update()-phase, until stopped.
+    """
+
+    def __init__(self, interval: float = 0.005, phase_filters: list[str] | None = None) -> None:
+        self.interval: float = interval
+        self.phase_filters: list[str] = phase_filters or []
+        self.samples: dict[str, Counter] = {}  # phase -> Counter of stack-tuples
+        self.main_thread_id: int = threading.main_thread().ident
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.start_time: float = 0.0
+        self.elapsed: float = 0.0
+
+    def start(self) -> None:
+        self.start_time = time.monotonic()
+        self.thread = threading.Thread(target=self.sample_until_stopped, name='profiler', daemon=True)
+        self.thread.start()
+        return
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.elapsed = time.monotonic() - self.start_time
+        return
+
+    def sample_until_stopped(self) -> None:
+        own_thread_id: int = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            self.take_sample(sys._current_frames(), own_thread_id)
+        return
+
+    def take_sample(self, frames: dict, own_thread_id: int) -> None:
+        """
+        Records one sample of each thread's stack, under the main thread's current phase.
+        """
+        main_frame = frames.get(self.main_thread_id)
+        if main_frame is None:
+            return
+        main_stack: tuple[str, ...] = extract_stack(main_frame)
+        phase: str | None = determine_phase(main_stack)
+        if phase is None:
+            return  # ie before or after manage_update()
+        if self.phase_filters and not any(phase_filter in phase for phase_filter in self.phase_filters):
+            return
+        thread_names: dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+        phase_samples: Counter = self.samples.setdefault(phase, Counter())
+        for thread_id, frame in frames.items():
+            if thread_id == own_thread_id:
+                continue
+            if thread_id == self.main_thread_id:
+                stack = trim_to_root(main_stack)
+            else:
+                thread_stack: tuple[str, ...] = extract_stack(frame)
+                if thread_stack[-1] == 'thread:_worker' or LISTENER_FRAME in thread_stack:
+                    continue  # an idle pool-worker, or the log-listener
+                stack = (ROOT_FUNCTION, phase, f'[thread {thread_names.get(thread_id, thread_id)}]') + thread_stack
+            phase_samples[stack] += 1
+        return
+
+    def write(self, output_dir: Path) -> list[Path]:
+        """
+        Writes the combined and per-phase profile files; returns their paths.
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        written: list[Path] = []
+        combined: Counter = Counter()
+        summary_lines: list[str] = [
+            f'wall-time profiled: {self.elapsed:.1f}s; sample-interval: {self.interval * 1000:.0f}ms'
+        ]
+        if self.phase_filters:
+            summary_lines.append(f'phase-filters: {", ".join(self.phase_filters)}')
+        for phase, phase_samples in sorted(self.samples.items(), key=lambda item: -main_thread_count(item[1])):
+            combined.update(phase_samples)
+            safe_name: str = phase.replace('.', '-').replace('<', '').replace('>', '')
+            folded_path: Path = output_dir / f'{safe_name}.folded'
+            folded_path.write_text(make_folded_text(phase_samples))
+            text_path: Path = output_dir / f'{safe_name}.txt'
+            text_path.write_text(make_phase_report(phase, phase_samples, self.interval))
+            written.extend([folded_path, text_path])
+            summary_lines.append(f'{main_thread_count(phase_samples) * self.interval:8.2f}s  {phase}')
+        combined_path: Path = output_dir / 'combined.folded'
+        combined_path.write_text(make_folded_text(combined))
+        summary_path: Path = output_dir / 'summary.txt'
+        summary_path.write_text('\n'.join(summary_lines) + '\n')
+        written.extend([combined_path, summary_path])
+        log.info(f'ok / wrote ``{len(written)}`` profile-files to ``{output_dir}``')
+        return written
+
+
+def extract_stack(frame) -> tuple[str, ...]:
+    """
+    Returns the frame's stack, outermost first, as `module:qualified_name` labels.
+    """
+    labels: list[str] = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f'{Path(code.co_filename).stem}:{code.co_qualname}')
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+def is_root(label: str) -> bool:
+    return label.rsplit('.', 1)[-1].rsplit(':', 1)[-1] == ROOT_FUNCTION
+
+
+def determine_phase(stack: tuple[str, ...]) -> str | None:
+    """
+    Returns the function manage_update() is in (its qualified name), `manage_update` itself, or None outside of it.
+    Wrapper-frames (the checkpoint's run_phase(), the facts-cache's get()) are skipped, so a phase is named for
+      the function they run.
+    """
+    for i, label in enumerate(stack):
+        if is_root(label):
+            for phase_label in stack[i + 1 :]:
+                qualname: str = phase_label.split(':', 1)[1]
+                if qualname not in WRAPPER_FUNCTIONS:
+                    return qualname
+            return stack[-1].split(':', 1)[1] if i + 1 < len(stack) else ROOT_FUNCTION
+    return None
+
+
+def trim_to_root(stack: tuple[str, ...]) -> tuple[str, ...]:
+    """
+    Drops the frames above manage_update() (dundermain, the profiler's caller), so stacks start at the root function.
+    """
+    for i, label in enumerate(stack):
+        if is_root(label):
+            return (ROOT_FUNCTION,) + stack[i + 1 :]
+    return stack
+
+
+def main_thread_count(phase_samples: Counter) -> int:
+    return sum(count for stack, count in phase_samples.items() if not stack[2:3] or not stack[2].startswith('[thread '))
+
+
+def make_folded_text(samples: Counter) -> str:
+    """
+    Formats samples as collapsed stacks: one `frame;frame;frame count` line per distinct stack.
+    """
+    lines: list[str] = [f'{";".join(stack)} {count}' for stack, count in sorted(samples.items())]
+    return '\n'.join(lines) + ('\n' if lines else '')
+
+
+def make_phase_report(phase: str, phase_samples: Counter, interval: float, top_count: int = 25) -> str:
+    """
+    Formats a phase's functions by inclusive time (on the stack) and by self time (innermost frame).
+    """
+    inclusive: Counter = Counter()
+    self_time: Counter = Counter()
+    for stack, count in phase_samples.items():
+        for label in set(stack):
+            inclusive[label] += count
+        self_time[stack[-1]] += count
+    lines: list[str] = [f'phase: {phase}', '', 'inclusive:']
+    lines.extend(f'{count * interval:8.2f}s  {label}' for label, count in inclusive.most_common(top_count))
+    lines.extend(['', 'self:'])
+    lines.extend(f'{count * interval:8.2f}s  {label}' for label, count in self_time.most_common(top_count))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,202 @@
+"""
+Module used by roll_out_updates.py
+Contains code for rolling out the nightly update across a host's projects: a canary subset first, then the rest
+  in parallel waves -- rather than every project syncing and restarting at once.
+
+Why: projects on a host mostly share dependencies, so they pick up the same new versions on the same night;
+  updated all at once, a bad release takes them all down together.
+
+The rollout:
+- canaries -- the configured canary projects are updated (each a normal `self_updater.py` run, in its own process),
+    in parallel. Each run is then assessed: its exit-code, its run-history record (the outcome, and the followup-tests'
+    outcome), and a warm-up check of the project's `SLFUPDTR__WARMUP_URLS_JSON` URLs (see lib_warmup.py).
+- soak -- if a canary was updated, the rollout waits `SLFUPDTR__ROLLOUT_SOAK_MINUTES` (default 30), then re-checks
+    the updated canaries' warm-up URLs.
+- waves -- the other projects are updated in parallel waves. Each wave's size is set from how long the previous
+    wave's runs (first, the canaries') took: big enough to finish within `SLFUPDTR__ROLLOUT_WINDOW_MINUTES`
+    (default 120), at most `SLFUPDTR__ROLLOUT_MAX_PARALLEL` (default half the CPUs), and at most double the previous
+    wave -- so slow updates get wider waves to fit the window, and exposure still grows gradually.
+A problem in the canaries, the soak, or a wave halts the rollout; projects not yet started are left as they are.
+"""
+
+import logging
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import lib_run_history
+
+log = logging.getLogger(__name__)
+
+FAILED_OUTCOMES: tuple[str, ...] = ('failed', 'rolled-back')
+
+
+def determine_rollout_settings() -> dict:
+    """
+    Returns the rollout settings, from the optional envars:
+    - `SLFUPDTR__ROLLOUT_SOAK_MINUTES` -- wait after the canaries, before the waves (default 30)
+    - `SLFUPDTR__ROLLOUT_WINDOW_MINUTES` -- time the waves should finish within (default 120)
+    - `SLFUPDTR__ROLLOUT_MAX_PARALLEL` -- largest wave (default half the CPUs)
+    """
+    return {
+        'soak_minutes': float(os.environ.get('SLFUPDTR__ROLLOUT_SOAK_MINUTES', '30')),
+        'window_minutes': float(os.environ.get('SLFUPDTR__ROLLOUT_WINDOW_MINUTES', '120')),
+        'max_parallel': int(os.environ.get('SLFUPDTR__ROLLOUT_MAX_PARALLEL', '0')) or max(1, (os.cpu_count() or 2) // 2),
+    }
+
+
+def run_self_updater(project_path: Path) -> dict:
+    """
+    Runs the self-updater on the project, in its own process; returns its exit-code, wall-time and output-tail.
+    """
+    start: float = time.monotonic()
+    updater_path: Path = Path(__file__).resolve().parent / 'self_updater.py'
+    result: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, str(updater_path), str(project_path)], capture_output=True, text=True
+    )
+    return {
+        'returncode': result.returncode,
+        'seconds': round(time.monotonic() - start, 1),
+        'output_tail': f'{result.stdout}{result.stderr}'[-1000:],
+    }
+
+
+def check_warmup(project_path: Path) -> str | None:
+    """
+    Warms up the project's app, if warm-up URLs are configured; returns a problem-message, or None.
+    """
+    import lib_warmup  # imported here; only needed when a run updated
+
+    warmup_urls: list[str] = lib_warmup.determine_warmup_urls(project_path)
+    if not warmup_urls:
+        return None
+    (problem_message, _report) = lib_warmup.make_warmup_report(lib_warmup.warm_up(warmup_urls))
+    return problem_message
+
+
+def update_and_assess(project_path: Path, runner: Callable, warmup_checker: Callable, db_path: Path | None) -> dict:
+    """
+    Updates the project with `runner`, then assesses the run; returns the result, with `problem` set if there was one.
+    """
+    since: str = datetime.now().isoformat(timespec='seconds')
+    result: dict = {'project': project_path.name, 'path': project_path, **runner(project_path)}
+    connection = lib_run_history.connect(db_path)
+    row: tuple | None = lib_run_history.query_latest_run(connection, project_path.name, since)
+    connection.close()
+    (result['outcome'], result['test_outcome']) = (row[0], row[1]) if row else (None, None)
+    result['problem'] = None
+    if result['returncode'] != 0:
+        result['problem'] = f'self-updater exited with ``{result["returncode"]}``'
+    elif row is None:
+        result['problem'] = 'no run-history record of the run'
+    elif result['outcome'] in FAILED_OUTCOMES:
+        result['problem'] = f'run outcome ``{result["outcome"]}``'
+    elif result['test_outcome'] == 'followup-failed':
+        result['problem'] = 'followup tests failed'
+    elif result['outcome'] == 'updated':
+        result['problem'] = warmup_checker(project_path)
+    log.info(f'ok / ``{result["project"]}`` outcome ``{result["outcome"]}``; problem ``{result["problem"]}``')
+    return result
+
+
+def run_wave(
+    project_paths: list[Path], runner: Callable, warmup_checker: Callable, db_path: Path | None = None
+) -> list[dict]:
+    """
+    Updates and assesses the projects in parallel; returns their results, in order.
+    An empty wave (ie no canaries configured) returns no results.
+    """
+    if not project_paths:
+        return []
+    log.info(f'::: updating wave of ``{len(project_paths)}`` projects ----------')
+    with ThreadPoolExecutor(max_workers=len(project_paths)) as executor:
+        return list(executor.map(lambda path: update_and_assess(path, runner, warmup_checker, db_path), project_paths))
+
+
+def determine_wave_size(
+    durations: list[float], remaining: int, seconds_left: float, max_parallel: int, previous_size: int
+) -> int:
+    """
+    Returns the next wave's size: enough to finish the remaining projects within the time left, at the previous runs'
+      median duration; at most `max_parallel`, and at most double the previous wave.
+    """
+    typical: float = statistics.median(durations) if durations else 0.0
+    waves_that_fit: int = max(1, int(seconds_left // typical)) if typical > 0 else remaining
+    size: int = math.ceil(remaining / waves_that_fit)
+    return max(1, min(size, max_parallel, 2 * previous_size))
+
+
+def roll_out(
+    project_paths: list[Path],
+    canary_paths: list[Path],
+    settings: dict,
+    runner: Callable = run_self_updater,
+    warmup_checker: Callable = check_warmup,
+    sleep: Callable = time.sleep,
+    db_path: Path | None = None,
+) -> dict:
+    """
+    Updates the canaries, soaks, then updates the other projects in waves; stops at the first problem.
+    Returns {'waves': [results per wave, canaries first], 'halted': reason or None, 'not_started': [project-names]}.
+    Called by roll_out_updates.main().
+    """
+    log.info('::: rolling out updates ----------')
+    if len({path.name for path in project_paths}) != len(project_paths):
+        raise Exception('project code-directory names must be unique; the run-history records runs by that name')
+    start: float = time.monotonic()
+    remaining: list[Path] = [path for path in project_paths if path not in canary_paths]
+    rollout: dict = {'waves': [], 'halted': None, 'not_started': []}
+    ## canaries -----------------------------------------------------
+    results: list[dict] = run_wave(canary_paths, runner, warmup_checker, db_path)
+    rollout['waves'].append(results)
+    problems: list[str] = [f'{result["project"]}: {result["problem"]}' for result in results if result['problem']]
+    ## soak ---------------------------------------------------------
+    updated_canaries: list[Path] = [result['path'] for result in results if result['outcome'] == 'updated']
+    if not problems and updated_canaries:
+        log.info(f'soaking for ``{settings["soak_minutes"]}`` minutes')
+        sleep(settings['soak_minutes'] * 60)
+        problems = [f'{path.name}: after soak, {problem}' for path in updated_canaries if (problem := warmup_checker(path))]
+    if problems:
+        rollout['halted'] = f'canary problems -- {"; ".join(problems)}'
+    ## waves --------------------------------------------------------
+    wave_start: float = time.monotonic()
+    wave_size: int = len(canary_paths) or 1
+    while remaining and not rollout['halted']:
+        seconds_left: float = settings['window_minutes'] * 60 - (time.monotonic() - wave_start)
+        durations: list[float] = [result['seconds'] for result in results]
+        wave_size = determine_wave_size(durations, len(remaining), seconds_left, settings['max_parallel'], wave_size)
+        (wave, remaining) = (remaining[:wave_size], remaining[wave_size:])
+        results = run_wave(wave, runner, warmup_checker, db_path)
+        rollout['waves'].append(results)
+        problems = [f'{result["project"]}: {result["problem"]}' for result in results if result['problem']]
+        if problems:
+            rollout['halted'] = f'wave {len(rollout["waves"]) - 1} problems -- {"; ".join(problems)}'
+    rollout['not_started'] = [path.name for path in remaining]
+    rollout['seconds'] = round(time.monotonic() - start, 1)
+    log.info(f'ok / rollout done; halted, ``{rollout["halted"]}``')
+    return rollout
+
+
+def make_report(rollout: dict) -> str:
+    """
+    Formats the rollout's waves, and any halt, as plain text.
+    """
+    rows: list[tuple] = []
+    for index, results in enumerate(rollout['waves']):
+        for result in results:
+            wave_name: str = 'canary' if index == 0 else str(index)
+            rows.append((wave_name, result['project'], result['outcome'], result['seconds'], result['problem'] or ''))
+    lines: list[str] = [
+        f'rollout: {len(rollout["waves"])} waves (including canaries) in {rollout["seconds"]}s',
+        lib_run_history.format_rows(['wave', 'project', 'outcome', 'seconds', 'problem'], rows),
+    ]
+    if rollout['halted']:
+        lines.extend(['', f'HALTED: {rollout["halted"]}', f'not started: {", ".join(rollout["not_started"]) or "none"}'])
+    return '\n'.join(lines)
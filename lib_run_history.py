@@ -0,0 +1,301 @@
+"""
+Module used by self_updater.py, query_run_history.py and lib_rollout.py
+Contains code for recording each run as a structured row in a local SQLite database, and for querying the history.
+
+The database is host-wide (one for all the projects the updater manages), in the "outer-stuff" directory
+  of the self-updater by default; override with the `SLFUPDTR__RUN_HISTORY_DB` envar.
+
+During a run, code calls `note()` to add facts to the current run's record; after the run, `save_run()` inserts it,
+  with the per-phase child-process timings from lib_process_runner, in one transaction.
+A run that warmed up the app also gets a `warmups` row: readiness, time-to-first-success, and request latencies.
+The tables are indexed on the columns the queries filter and group by, so queries stay fast across years of runs.
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import lib_process_runner
+from lib_backup_store import body_digest
+from lib_bisector import find_changed_packages, parse_lockfile
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        run_id TEXT NOT NULL,
+        project TEXT NOT NULL,
+        host TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        duration REAL,
+        environment_type TEXT,
+        outcome TEXT,
+        compile_digest TEXT,
+        changed_count INTEGER,
+        test_outcome TEXT,
+        email_status TEXT,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+    CREATE INDEX IF NOT EXISTS runs_project_started_at ON runs (project, started_at);
+    CREATE TABLE IF NOT EXISTS phase_timings (
+        run_pk INTEGER NOT NULL REFERENCES runs (id),
+        phase TEXT NOT NULL,
+        wall REAL,
+        user_cpu REAL,
+        system_cpu REAL,
+        max_rss_mb REAL,
+        children INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS phase_timings_run_pk ON phase_timings (run_pk);
+    CREATE TABLE IF NOT EXISTS package_changes (
+        run_pk INTEGER NOT NULL REFERENCES runs (id),
+        package TEXT NOT NULL,
+        old_version TEXT,
+        new_version TEXT
+    );
+    CREATE INDEX IF NOT EXISTS package_changes_run_pk ON package_changes (run_pk);
+    CREATE INDEX IF NOT EXISTS package_changes_package ON package_changes (package);
+    CREATE TABLE IF NOT EXISTS warmups (
+        run_pk INTEGER NOT NULL REFERENCES runs (id),
+        ready INTEGER,
+        time_to_first_success REAL,
+        request_count INTEGER,
+        failure_count INTEGER,
+        p50 REAL,
+        p95 REAL
+    );
+    CREATE INDEX IF NOT EXISTS warmups_run_pk ON warmups (run_pk);
+"""
+
+current_run: dict = {}  # the in-progress run's record; see start_run() and note()
+
+
+## recording --------------------------------------------------------
+
+
+def start_run() -> str:
+    """
+    Starts a new run-record; returns its run-id (also used to tag the run's log lines).
+    Called by self_updater.manage_update() at startup.
+    """
+    current_run.clear()
+    current_run.update(
+        {
+            'run_id': uuid.uuid4().hex[:12],
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'start_monotonic': time.monotonic(),
+            'outcome': 'failed',  # until manage_update() says otherwise
+            'package_changes': [],
+        }
+    )
+    return current_run['run_id']
+
+
+def note(**fields) -> None:
+    """
+    Adds facts to the current run's record, ie `note(outcome='updated', test_outcome='passed')`.
+    """
+    current_run.update(fields)
+    return
+
+
+def note_changes(old_path: Path | None, new_path: Path) -> None:
+    """
+    Adds the compile-digest, and the package-changes between the previous and new backups, to the current run's record.
+    The digest ignores the backup's initial comments, so identical resolutions have identical digests.
+    Called by self_updater.manage_update() after the compare.
+    """
+    new_text: str = new_path.read_text()
+    current_run['compile_digest'] = body_digest(new_text)  # the same digest the backup-store indexes by
+    changes: list[tuple[str, str | None, str | None]] = []
+    if old_path:
+        old_packages: dict = parse_lockfile(old_path.read_text())
+        new_packages: dict = parse_lockfile(new_text)
+        for name in find_changed_packages(old_packages, new_packages):
+            changes.append((name, extract_version(old_packages.get(name)), extract_version(new_packages.get(name))))
+    current_run['package_changes'] = changes
+    current_run['changed_count'] = len(changes)
+    return
+
+
+def extract_version(requirement_lines: list[str] | None) -> str | None:
+    """
+    Returns the pinned version(s) from a package's requirement lines, ie `['django==4.2.18']` -> `4.2.18`.
+    """
+    if not requirement_lines:
+        return None
+    versions: list[str] = [line.split(';')[0].split('==')[-1].strip() for line in requirement_lines]
+    return ' | '.join(dict.fromkeys(versions))
+
+
+def determine_db_path() -> Path:
+    """
+    Returns the run-history database path: `SLFUPDTR__RUN_HISTORY_DB`, or `run_history.sqlite3` in the "outer-stuff" dir.
+    """
+    default_path: Path = Path(__file__).resolve().parent.parent / 'run_history.sqlite3'
+    return Path(os.environ.get('SLFUPDTR__RUN_HISTORY_DB') or default_path)
+
+
+def connect(db_path: Path | None = None) -> sqlite3.Connection:
+    """
+    Opens (creating if needed) the run-history database.
+    WAL mode lets the nightly inserts of many projects proceed without blocking queries, or each other for long.
+    """
+    db_path = db_path or determine_db_path()
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def save_run(project_path: Path, error: str | None = None, db_path: Path | None = None) -> None:
+    """
+    Inserts the current run's record, its per-phase timings, its package-changes, and any warm-up stats,
+      in one transaction.
+    Failures are logged, not raised; recording history shouldn't break an update.
+    Called by self_updater.py's dundermain, after the run (whether or not it succeeded).
+    """
+    if not current_run:
+        return
+    if error:
+        current_run['error'] = error[:2000]
+    try:
+        duration: float = time.monotonic() - current_run['start_monotonic']
+        phase_usage: dict = lib_process_runner.summarize_usage()
+        connection: sqlite3.Connection = connect(db_path)
+        with connection:  # one transaction
+            cursor: sqlite3.Cursor = connection.execute(
+                'INSERT INTO runs (run_id, project, host, started_at, duration, environment_type, outcome, compile_digest, '
+                'changed_count, test_outcome, email_status, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    current_run['run_id'],
+                    project_path.name,
+                    socket.gethostname(),
+                    current_run['started_at'],
+                    round(duration, 3),
+                    current_run.get('environment_type'),
+                    current_run.get('outcome'),
+                    current_run.get('compile_digest'),
+                    current_run.get('changed_count'),
+                    current_run.get('test_outcome'),
+                    current_run.get('email_status'),
+                    current_run.get('error'),
+                ),
+            )
+            run_pk: int = cursor.lastrowid
+            connection.executemany(
+                'INSERT INTO phase_timings (run_pk, phase, wall, user_cpu, system_cpu, max_rss_mb, children) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (run_pk, phase, t['wall'], t['user'], t['system'], t['max_rss_mb'], t['children'])
+                    for phase, t in phase_usage.items()
+                ],
+            )
+            connection.executemany(
+                'INSERT INTO package_changes (run_pk, package, old_version, new_version) VALUES (?, ?, ?, ?)',
+                [(run_pk, *change) for change in current_run['package_changes']],
+            )
+            warmup: dict | None = current_run.get('warmup')
+            if warmup:
+                connection.execute(
+                    'INSERT INTO warmups (run_pk, ready, time_to_first_success, request_count, failure_count, p50, p95) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        run_pk,
+                        warmup['ready'],
+                        warmup['time_to_first_success'],
+                        warmup['request_count'],
+                        warmup['failure_count'],
+                        warmup['p50'],
+                        warmup['p95'],
+                    ),
+                )
+        connection.close()
+        log.info(f'ok / saved run ``{current_run["run_id"]}`` to run-history')
+    except Exception:
+        log.exception('problem saving run-history')
+    return
+
+
+## querying ---------------------------------------------------------
+
+
+def since_timestamp(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).isoformat(timespec='seconds')
+
+
+def query_slowest_phases(connection: sqlite3.Connection, days: int, project: str | None = None) -> list[tuple]:
+    """
+    Returns (phase, runs, average-wall, max-wall, average-cpu) rows, slowest-average first.
+    """
+    sql = (
+        'SELECT p.phase, COUNT(*), ROUND(AVG(p.wall), 1), ROUND(MAX(p.wall), 1), ROUND(AVG(p.user_cpu + p.system_cpu), 1) '
+        'FROM runs r JOIN phase_timings p ON p.run_pk = r.id WHERE r.started_at >= ? AND (? IS NULL OR r.project = ?) '
+        'GROUP BY p.phase ORDER BY AVG(p.wall) DESC'
+    )
+    return connection.execute(sql, (since_timestamp(days), project, project)).fetchall()
+
+
+def query_package_churn(connection: sqlite3.Connection, days: int, limit: int = 20) -> list[tuple]:
+    """
+    Returns (package, change-count, projects-affected) rows, most-often-changed first.
+    """
+    sql = (
+        'SELECT c.package, COUNT(*), COUNT(DISTINCT r.project) FROM runs r JOIN package_changes c ON c.run_pk = r.id '
+        'WHERE r.started_at >= ? GROUP BY c.package ORDER BY COUNT(*) DESC, c.package LIMIT ?'
+    )
+    return connection.execute(sql, (since_timestamp(days), limit)).fetchall()
+
+
+def query_failure_rate(connection: sqlite3.Connection, days: int) -> list[tuple]:
+    """
+    Returns (project, runs, failures, failure-percent) rows, highest failure-rate first.
+    """
+    sql = (
+        "SELECT project, COUNT(*), SUM(outcome = 'failed'), ROUND(100.0 * SUM(outcome = 'failed') / COUNT(*), 1) "
+        'FROM runs WHERE started_at >= ? GROUP BY project ORDER BY 4 DESC, project'
+    )
+    return connection.execute(sql, (since_timestamp(days),)).fetchall()
+
+
+def query_warmup_latency(connection: sqlite3.Connection, days: int) -> list[tuple]:
+    """
+    Returns (project, warm-ups, not-ready, average-ms-to-first-success, average-p50-ms, max-p95-ms) rows,
+      slowest-p95 first.
+    """
+    sql = (
+        'SELECT r.project, COUNT(*), SUM(w.ready = 0), ROUND(AVG(w.time_to_first_success) * 1000), '
+        'ROUND(AVG(w.p50) * 1000), ROUND(MAX(w.p95) * 1000) FROM runs r JOIN warmups w ON w.run_pk = r.id '
+        'WHERE r.started_at >= ? GROUP BY r.project ORDER BY MAX(w.p95) DESC, r.project'
+    )
+    return connection.execute(sql, (since_timestamp(days),)).fetchall()
+
+
+def query_latest_run(connection: sqlite3.Connection, project: str, since: str) -> tuple | None:
+    """
+    Returns the project's most recent (outcome, test_outcome, duration, changed_count) started at or after `since`.
+    """
+    sql = (
+        'SELECT outcome, test_outcome, duration, changed_count FROM runs WHERE project = ? AND started_at >= ? '
+        'ORDER BY started_at DESC, id DESC LIMIT 1'
+    )
+    return connection.execute(sql, (project, since)).fetchone()
+
+
+def format_rows(headers: list[str], rows: list[tuple]) -> str:
+    """
+    Formats query rows as a plain-text table.
+    """
+    table: list[list[str]] = [headers] + [['' if value is None else str(value) for value in row] for row in rows]
+    widths: list[int] = [max(len(row[i]) for row in table) for i in range(len(headers))]
+    lines: list[str] = ['  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in table]
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
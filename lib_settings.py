@@ -0,0 +1,46 @@
+"""
+Module used by self_updater.py, lib_emailer.py and query_run_history.py
+Contains the updater's own settings, loaded once, on first use, from the "outer-stuff" `.env`.
+
+Importing this (or any) module has no side effects; the `.env` is only read when `get_settings()` is first called.
+Loading also puts the `.env`'s values into os.environ, where the optional `SLFUPDTR__*` envars are read.
+"""
+
+import json
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+class Settings:
+    """
+    Holds the self-updater's required settings.
+    """
+
+    def __init__(self, stuff_dir: Path) -> None:
+        self.stuff_dir: Path = stuff_dir
+        self.dotenv_path: Path = stuff_dir / '.env'
+        self.log_dir: Path = stuff_dir / 'logs'
+        if not self.dotenv_path.exists():
+            raise Exception(f'file does not exist, ``{self.dotenv_path}``')
+        from dotenv import load_dotenv  # imported here; only needed this once per process
+
+        load_dotenv(self.dotenv_path, override=True)
+        self.email_from: str = os.environ['SLFUPDTR__EMAIL_FROM']
+        self.email_host: str = os.environ['SLFUPDTR__EMAIL_HOST']
+        self.email_host_port: int = int(os.environ['SLFUPDTR__EMAIL_HOST_PORT'])
+        self.sys_admin_recipients: list = json.loads(os.environ['SLFUPDTR__SYS_ADMIN_RECIPIENTS_JSON'])
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Returns the settings, loading them on the first call.
+    """
+    stuff_dir: Path = Path(__file__).resolve().parent.parent
+    settings = Settings(stuff_dir)
+    log.debug(f'loaded settings from ``{settings.dotenv_path}``')
+    return settings
@@ -0,0 +1,193 @@
+"""
+Module used by self_updater.py
+Contains code for profiling the project's import-time after a sync.
+
+Starts the project's interpreter in the updated venv with `-X importtime`, importing the project's startup module
+  (by default `config.wsgi`, which is what Passenger loads), and parses the per-module cumulative import costs.
+Compares them with the previous run's numbers, which are saved in the `self_updater_data` directory,
+  and attributes the biggest regressions to the packages changed by the update.
+If there are no saved numbers yet (ie the project's first update), a baseline is measured in the current venv
+  before the sync, so the first update is compared too.
+"""
+
+import json
+import logging
+import os
+import subprocess
+from pathlib import Path
+
+import lib_common
+import lib_process_runner
+from lib_bisector import find_changed_packages, parse_lockfile
+from lib_call_runtests import make_local_scoped_env
+
+log = logging.getLogger(__name__)
+
+
+def capture_startup_baseline(project_path: Path, sample_count: int = 3) -> None:
+    """
+    Measures and saves the current venv's import-times, if none are saved yet, so the update has a baseline.
+    Does not raise: a profiling problem is logged, and the update goes on without a baseline.
+    Called by self_updater.manage_update() before the sync.
+    """
+    import_times_path: Path = determine_import_times_path(project_path)
+    if import_times_path.exists():
+        return
+    log.info('::: capturing startup import-time baseline ----------')
+    try:
+        startup_module: str = os.environ.get('SLFUPDTR__STARTUP_MODULE', 'config.wsgi')
+        baseline: dict = measure_import_times(project_path, startup_module, sample_count)
+        import_times_path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        log.info('ok / startup baseline saved')
+    except Exception:
+        log.exception('problem capturing startup import-time baseline')
+    return
+
+
+def determine_import_times_path(project_path: Path) -> Path:
+    return lib_common.determine_data_dir(project_path) / 'import_times.json'
+
+
+def profile_startup(project_path: Path, old_path: Path | None, new_path: Path, sample_count: int = 3) -> None | str:
+    """
+    Manages the import-time profiling; returns a report of startup regressions for the update-email, or None.
+    Does not raise: a profiling problem is logged, since the update itself has already happened.
+    Called by self_updater.manage_update() after the sync.
+    """
+    log.info('::: profiling startup import-time ----------')
+    try:
+        startup_module: str = os.environ.get('SLFUPDTR__STARTUP_MODULE', 'config.wsgi')
+        threshold_ms: float = float(os.environ.get('SLFUPDTR__STARTUP_REGRESSION_MS', '50'))
+        current: dict = measure_import_times(project_path, startup_module, sample_count)
+        import_times_path: Path = determine_import_times_path(project_path)
+        try:
+            previous: dict = json.loads(import_times_path.read_text())
+        except (FileNotFoundError, ValueError):
+            previous = {}
+        import_times_path.write_text(json.dumps(current, indent=2, sort_keys=True))
+        ## attribute to changed packages --------------------------------
+        changed_packages: dict = {}
+        if old_path:
+            old_packages: dict = parse_lockfile(old_path.read_text())
+            new_packages: dict = parse_lockfile(new_path.read_text())
+            for name in find_changed_packages(old_packages, new_packages):
+                changed_packages[name] = (old_packages.get(name, ['(new)'])[0], new_packages.get(name, ['(removed)'])[0])
+        module_distributions: dict = fetch_module_distributions(project_path)
+        report: None | str = make_startup_report(
+            previous, current, startup_module, threshold_ms, changed_packages, module_distributions
+        )
+    except Exception:
+        log.exception('problem profiling startup import-time')
+        report = None
+    log.info(f'ok / startup report, ``{report}``')
+    return report
+
+
+def measure_import_times(project_path: Path, startup_module: str, sample_count: int) -> dict:
+    """
+    Imports the startup module in the project venv with `-X importtime`, `sample_count` times.
+    Returns a dict of module-name -> cumulative microseconds, keeping each module's fastest sample to damp noise.
+    Called by profile_startup().
+    """
+    (venv_bin_path, venv_path) = lib_common.determine_venv_paths(project_path)
+    local_scoped_env: dict = make_local_scoped_env(project_path, venv_bin_path, venv_path)
+    command: list[str] = [str(venv_bin_path / 'python3'), '-X', 'importtime', '-c', f'import {startup_module}']
+    log.debug(f'command, ``{command}``')
+    import_times: dict = {}
+    for _ in range(sample_count):
+        result: subprocess.CompletedProcess = lib_process_runner.run(
+            command,
+            phase='startup_profile',
+            cwd=str(project_path),
+            env=local_scoped_env,
+            capture_output=True,
+            text=True,
+            low_impact=False,
+        )  # low_impact=False, so rlimits don't skew the measurement
+        if result.returncode != 0:
+            raise Exception(f'startup import failed; stderr tail, ``{result.stderr[-2000:]}``')
+        for module, cumulative_us in parse_importtime_output(result.stderr).items():
+            import_times[module] = min(cumulative_us, import_times.get(module, cumulative_us))
+    return import_times
+
+
+def parse_importtime_output(stderr: str) -> dict:
+    """
+    Parses `-X importtime` output lines, like `import time:       245 |       1210 |   django.utils`,
+      into a dict of module-name -> cumulative microseconds.
+    Called by measure_import_times().
+    """
+    import_times: dict = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts: list[str] = line[len('import time:') :].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # skips the header line
+        import_times[parts[2].strip()] = int(parts[1].strip())
+    return import_times
+
+
+def fetch_module_distributions(project_path: Path) -> dict:
+    """
+    Returns the venv's mapping of top-level module-name -> normalized distribution-names, ie `{'yaml': ['pyyaml']}`.
+    Called by profile_startup().
+    """
+    (venv_bin_path, venv_path) = lib_common.determine_venv_paths(project_path)
+    local_scoped_env: dict = make_local_scoped_env(project_path, venv_bin_path, venv_path)
+    code = 'import importlib.metadata, json; print(json.dumps(importlib.metadata.packages_distributions()))'
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        [str(venv_bin_path / 'python3'), '-c', code],
+        phase='startup_profile',
+        env=local_scoped_env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        log.warning(f'could not fetch module-distributions; stderr, ``{result.stderr}``')
+        return {}
+    raw: dict = json.loads(result.stdout)
+    return {module: [name.lower().replace('_', '-').replace('.', '-') for name in names] for module, names in raw.items()}
+
+
+def make_startup_report(
+    previous: dict,
+    current: dict,
+    startup_module: str,
+    threshold_ms: float,
+    changed_packages: dict,
+    module_distributions: dict,
+    limit: int = 10,
+) -> None | str:
+    """
+    Returns a report of the biggest top-level-module import-time regressions, or None if the startup module's
+      total import-time didn't grow by more than `threshold_ms` (or there's no previous run to compare with).
+    Called by profile_startup().
+    """
+    if not previous or startup_module not in previous or startup_module not in current:
+        return None
+    total_delta_ms: float = (current[startup_module] - previous[startup_module]) / 1000
+    if total_delta_ms <= threshold_ms:
+        return None
+    deltas: list[tuple[float, str]] = []
+    for module, cumulative_us in current.items():
+        if '.' in module or module == startup_module.split('.')[0]:
+            continue  # top-level third-party modules only; their cumulative time includes their submodules
+        delta_ms: float = (cumulative_us - previous.get(module, 0)) / 1000
+        if delta_ms > 0:
+            deltas.append((delta_ms, module))
+    deltas.sort(reverse=True)
+    header: str = (
+        f'Startup import-time of ``{startup_module}`` grew by {total_delta_ms:.0f} ms '
+        f'({previous[startup_module] / 1000:.0f} ms --> {current[startup_module] / 1000:.0f} ms). Biggest regressions:'
+    )
+    report_lines: list[str] = [header]
+    for delta_ms, module in deltas[:limit]:
+        attributions: list[str] = [
+            f'{old} --> {new}'
+            for name, (old, new) in changed_packages.items()
+            if name in module_distributions.get(module, [module.lower().replace('_', '-')])
+        ]
+        attribution: str = f' (changed: {"; ".join(attributions)})' if attributions else ''
+        report_lines.append(f'- {module}: +{delta_ms:.1f} ms{attribution}')
+    return '\n'.join(report_lines)
@@ -0,0 +1,103 @@
+"""
+Module used by self_updater.py
+Contains code for updating the venv by applying just the lockfile's changes, rather than a full `uv pip sync`.
+
+Given the lockfile the venv is currently synced to (the `active` backup) and the new one, plans the exact changes:
+- removals -- packages no longer in the lockfile; applied with `uv pip uninstall`.
+- installs -- packages added, or whose pinned lines changed; applied with `uv pip install --no-deps`
+    (the lockfile is already fully resolved, so nothing needs resolving).
+So the time the venv is being modified scales with the size of the change, not the size of the venv.
+
+Afterwards, `uv pip sync --dry-run` (read-only) confirms the venv matches the new lockfile.
+If it doesn't, or a change can't be applied as a delta (ie `-e`/option lines, or `--hash` continuations),
+  the caller runs the full sync, as before.
+"""
+
+import logging
+import subprocess
+from pathlib import Path
+
+import lib_process_runner
+from lib_bisector import find_changed_packages, parse_lockfile
+
+log = logging.getLogger(__name__)
+
+
+def plan_sync(old_text: str, new_text: str) -> tuple[list[str], list[str]] | None:
+    """
+    Returns (removals, installs): package-names to uninstall, and requirement-lines to install.
+    Returns None if the change can't be expressed as a delta.
+    """
+    for text in (old_text, new_text):
+        for line in text.splitlines():
+            if line.lstrip().startswith('-') or line.rstrip().endswith('\\'):
+                log.debug(f'lockfile line not plannable as a delta, ``{line}``')
+                return None
+    old_packages: dict = parse_lockfile(old_text)
+    new_packages: dict = parse_lockfile(new_text)
+    changes: list[str] = find_changed_packages(old_packages, new_packages)
+    removals: list[str] = [name for name in changes if name not in new_packages]
+    installs: list[str] = [line for name in changes for line in new_packages.get(name, [])]
+    return (removals, installs)
+
+
+def apply_plan(
+    uv_path: Path, removals: list[str], installs: list[str], local_scoped_env: dict, extra_args: list[str] | None = None
+) -> None:
+    """
+    Uninstalls the removals, then installs the changed pins. Raises CalledProcessError on a failed command.
+    `extra_args` are added to the install, ie the wheel-cache's `--find-links`.
+    """
+    if removals:
+        lib_process_runner.run([str(uv_path), 'pip', 'uninstall', *removals], phase='sync', check=True, env=local_scoped_env)
+    if installs:
+        lib_process_runner.run(
+            [str(uv_path), 'pip', 'install', '--no-deps', *(extra_args or []), *installs],
+            phase='sync',
+            check=True,
+            env=local_scoped_env,
+        )
+    return
+
+
+def venv_matches_lockfile(uv_path: Path, lockfile_path: Path, local_scoped_env: dict) -> bool:
+    """
+    Checks, without changing anything, that a full sync to the lockfile would make no changes.
+    """
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        [str(uv_path), 'pip', 'sync', '--dry-run', str(lockfile_path)],
+        phase='sync',
+        env=local_scoped_env,
+        capture_output=True,
+        text=True,
+    )
+    matches: bool = result.returncode == 0 and 'Would make no changes' in f'{result.stdout}{result.stderr}'
+    if not matches:
+        log.warning('venv does not match the lockfile; dry-run output, ``%s``', f'{result.stdout}{result.stderr}'[-2000:])
+    return matches
+
+
+def delta_sync(
+    uv_path: Path, current_path: Path, new_path: Path, local_scoped_env: dict, extra_args: list[str] | None = None
+) -> bool:
+    """
+    Plans and applies the delta from the current lockfile to the new one, then verifies the venv.
+    Returns True if the venv now matches the new lockfile; False if the caller should run the full sync.
+    Called by self_updater.sync_dependencies().
+    """
+    log.info('::: applying lockfile delta ----------')
+    plan: tuple[list[str], list[str]] | None = plan_sync(current_path.read_text(), new_path.read_text())
+    if plan is None:
+        log.info('ok / change not plannable as a delta; full sync needed')
+        return False
+    (removals, installs) = plan
+    log.debug(f'removals, ``{removals}``; installs, ``{installs}``')
+    try:
+        apply_plan(uv_path, removals, installs, local_scoped_env, extra_args)
+    except subprocess.CalledProcessError:
+        log.exception('problem applying the delta; full sync needed')
+        return False
+    if not venv_matches_lockfile(uv_path, new_path, local_scoped_env):
+        return False
+    log.info(f'ok / applied delta: ``{len(removals)}`` removals, ``{len(installs)}`` installs')
+    return True
@@ -0,0 +1,222 @@
+"""
+Module used by dedup_venvs.py
+Contains code for finding byte-identical installed files across the projects' venvs, and optionally hardlinking them
+  to one shared copy.
+
+Each project has its own `env/` next to its code-directory (see `lib_common.determine_venv_paths()`),
+  so identical copies of Django, numpy, etc take disk space, and page-cache, once per project.
+
+Finding duplicates: the venvs' `site-packages` files are bucketed by size (files already hardlinked together count
+  once), and only files in a bucket of two or more are hashed (in parallel) -- most files have a unique size,
+  so few are read. Each file's scan-time stat -- device, inode, size, mtime -- is kept with it.
+
+Files uv has already hardlinked from its cache (its default link-mode on Linux) share an inode, so count once.
+
+Consolidating: each duplicate's content is kept once in a content-store (`venv_store/{hash[:2]}/{hash}-{owner}`),
+  and every copy is replaced -- atomically, by renaming a new hardlink over it -- with a hardlink to the stored file.
+  Safe with self_updater.update_permissions(), which `chgrp`s and `chmod`s each project's `env/`:
+  only copies with the same owner, group and mode are linked together, so that project's `chgrp`/`chmod` leaves
+  a shared file as it was, for every project sharing it. (A project whose group differs keeps its own copies.)
+  Updates stay isolated: uv replaces files (never writes into them), so an upgrade in one venv leaves the others'
+  links alone. Stored files no longer linked from any venv are pruned.
+  A copy whose stat no longer matches its scan-time stat (ie uv replaced or rewrote it since -- even with its mtime
+  preserved) is skipped: its content may no longer match the group's.
+"""
+
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+RUNTIME_SUFFIXES: tuple[str, ...] = ('.py', '.pyc', '.so')  # files the apps read or map at runtime; ie page-cache
+
+
+def scan_fingerprint(stat_result: os.stat_result) -> tuple[int, int, int, int]:
+    """
+    Returns the (device, inode, size, mtime_ns) a file is checked against before it's consolidated.
+    """
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def find_site_packages_files(venv_path: Path) -> list[Path]:
+    """
+    Returns the regular files (not symlinks) in the venv's site-packages.
+    """
+    files: list[Path] = []
+    for site_packages in venv_path.glob('lib/python*/site-packages'):
+        for dir_path, _dir_names, file_names in os.walk(site_packages):
+            for file_name in file_names:
+                path = Path(dir_path) / file_name
+                if not path.is_symlink():
+                    files.append(path)
+    return files
+
+
+def bucket_by_size(venv_paths: list[Path], min_size: int) -> dict[int, list[tuple[Path, tuple]]]:
+    """
+    Returns size -> (file, scan-fingerprint) pairs, for sizes shared by files on two or more distinct inodes.
+    Files already hardlinked together are listed once per inode.
+    """
+    buckets: dict[int, dict[tuple[int, int], tuple[Path, tuple]]] = defaultdict(dict)
+    for venv_path in venv_paths:
+        for path in find_site_packages_files(venv_path):
+            stat_result: os.stat_result = path.stat()
+            if stat_result.st_size >= min_size:
+                buckets[stat_result.st_size].setdefault(
+                    (stat_result.st_dev, stat_result.st_ino), (path, scan_fingerprint(stat_result))
+                )
+    return {size: list(inodes.values()) for size, inodes in buckets.items() if len(inodes) > 1}
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_duplicate_groups(
+    venv_paths: list[Path], min_size: int = 1, worker_count: int | None = None
+) -> dict[str, list[tuple[Path, tuple]]]:
+    """
+    Returns content-hash -> byte-identical files (one path per inode, each with its scan-fingerprint),
+      for groups of two or more.
+    """
+    log.info('::: finding duplicate venv files ----------')
+    buckets: dict[int, list[tuple[Path, tuple]]] = bucket_by_size(venv_paths, min_size)
+    candidates: list[tuple[Path, tuple]] = [member for members in buckets.values() for member in members]
+    log.debug(f'hashing ``{len(candidates)}`` same-size files')
+    with ThreadPoolExecutor(max_workers=worker_count or os.cpu_count() or 1) as executor:
+        digests: list[str] = list(executor.map(hash_file, [path for path, _fingerprint in candidates]))
+    groups: dict[str, list[tuple[Path, tuple]]] = defaultdict(list)
+    for member, digest in zip(candidates, digests):
+        groups[digest].append(member)
+    duplicate_groups: dict[str, list[tuple[Path, tuple]]] = {
+        digest: members for digest, members in groups.items() if len(members) > 1
+    }
+    log.info(f'ok / found ``{len(duplicate_groups)}`` groups of duplicates')
+    return duplicate_groups
+
+
+def determine_package(path: Path) -> str:
+    """
+    Returns the file's top-level site-packages entry, ie `django` for `.../site-packages/django/db/models/base.py`.
+    """
+    parts: tuple[str, ...] = path.parts
+    return parts[parts.index('site-packages') + 1] if 'site-packages' in parts else '?'
+
+
+def summarize(groups: dict[str, list[tuple[Path, tuple]]], top_count: int = 10) -> dict:
+    """
+    Returns what consolidating the groups would save: disk (the extra copies' allocated blocks), and page-cache
+      memory (an upper bound: the extra copies of files apps read at runtime, if every project's app loads them).
+    """
+    summary: dict = {'groups': len(groups), 'extra_copies': 0, 'disk_bytes': 0, 'memory_bytes': 0}
+    by_package: dict[str, int] = defaultdict(int)
+    for members in groups.values():
+        path: Path = members[0][0]
+        stat_result: os.stat_result = path.stat()
+        extra_copies: int = len(members) - 1
+        disk_bytes: int = extra_copies * stat_result.st_blocks * 512
+        summary['extra_copies'] += extra_copies
+        summary['disk_bytes'] += disk_bytes
+        if path.suffix in RUNTIME_SUFFIXES or '.so.' in path.name:
+            summary['memory_bytes'] += extra_copies * stat_result.st_size
+        by_package[determine_package(path)] += disk_bytes
+    summary['top_packages'] = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top_count]
+    return summary
+
+
+def link_atomically(source: Path, target: Path) -> None:
+    """
+    Replaces `target` with a hardlink to `source`: a new link is made beside it, then renamed over it.
+    """
+    tmp_path: Path = target.with_name(f'.{target.name}.{os.getpid()}.dedup')
+    tmp_path.unlink(missing_ok=True)
+    os.link(source, tmp_path)
+    os.replace(tmp_path, target)
+    return
+
+
+def consolidate(groups: dict[str, list[tuple[Path, tuple]]], store_dir: Path, scanned_at_ns: int) -> dict:
+    """
+    Hardlinks each group's copies to one stored copy; returns counts of linked and skipped files.
+    Copies are only linked with others on the same filesystem as the store, with the same owner, group and mode.
+    A copy that's gone, or whose stat differs from its scan-fingerprint, is skipped; it may no longer match. So is one
+      modified since the scan started (`scanned_at_ns`, a `time.time_ns()`) -- a rewrite within the same mtime-tick.
+    """
+    log.info('::: consolidating duplicate venv files ----------')
+    store_dir.mkdir(parents=True, exist_ok=True)
+    store_dev: int = store_dir.stat().st_dev
+    counts: dict = {'linked': 0, 'skipped': 0}
+    for digest, members in groups.items():
+        partitions: dict[tuple, list[tuple[Path, os.stat_result]]] = defaultdict(list)
+        for path, fingerprint in members:
+            try:
+                stat_result: os.stat_result = path.stat()
+            except FileNotFoundError:
+                counts['skipped'] += 1
+                continue
+            if (
+                stat_result.st_dev != store_dev
+                or scan_fingerprint(stat_result) != fingerprint
+                or stat_result.st_mtime_ns >= scanned_at_ns
+            ):
+                counts['skipped'] += 1
+                continue
+            partitions[(stat_result.st_uid, stat_result.st_gid, stat_result.st_mode)].append((path, stat_result))
+        for (uid, gid, mode), copies in partitions.items():
+            stored_path: Path = store_dir / digest[:2] / f'{digest}-{uid}-{gid}-{mode:o}'
+            if not stored_path.exists():
+                stored_path.parent.mkdir(parents=True, exist_ok=True)
+                os.link(copies[0][0], stored_path)  # the first copy becomes the stored one
+            stored_ino: int = stored_path.stat().st_ino
+            for path, stat_result in copies:
+                if stat_result.st_ino == stored_ino:
+                    continue
+                link_atomically(stored_path, path)
+                counts['linked'] += 1
+    log.info(f'ok / consolidation counts, ``{counts}``')
+    return counts
+
+
+def prune_store(store_dir: Path) -> int:
+    """
+    Removes stored files no longer linked from any venv (a link-count of one: just the store's own); returns the count.
+    """
+    pruned: int = 0
+    for stored_path in store_dir.glob('*/*'):
+        if stored_path.is_file() and stored_path.stat().st_nlink == 1:
+            stored_path.unlink()
+            pruned += 1
+    return pruned
+
+
+def format_bytes(count: int) -> str:
+    return f'{count / (1024 * 1024):.1f} MB'
+
+
+def make_report(summary: dict, venv_count: int, consolidation: dict | None = None, pruned: int = 0) -> str:
+    """
+    Formats the summary (and any consolidation) as plain text.
+    """
+    lines: list[str] = [
+        f'venvs scanned: {venv_count}',
+        f'duplicate groups: {summary["groups"]}; extra copies: {summary["extra_copies"]}',
+        f'disk reclaimable: {format_bytes(summary["disk_bytes"])}',
+        f'page-cache reclaimable (upper bound): {format_bytes(summary["memory_bytes"])}',
+    ]
+    if consolidation is not None:
+        lines.append(
+            f'consolidated: {consolidation["linked"]} files linked, {consolidation["skipped"]} skipped; '
+            f'{pruned} unused stored files pruned'
+        )
+    if summary['top_packages']:
+        lines.extend(['', 'top packages by reclaimable disk:'])
+        lines.extend(f'{format_bytes(disk_bytes):>10}  {package}' for package, disk_bytes in summary['top_packages'])
+    return '\n'.join(lines)
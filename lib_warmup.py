@@ -0,0 +1,162 @@
+"""
+Module used by self_updater.py
+Contains code for warming up the project's app after the `restart.txt` touch, and measuring its readiness.
+
+The URLs come from the optional `SLFUPDTR__WARMUP_URLS_JSON` entry in the project's `.env` file, ie:
+    SLFUPDTR__WARMUP_URLS_JSON='[ "http://127.0.0.1/project/", "http://127.0.0.1/project/info/" ]'
+The number of concurrent warm-up requests is set by the optional `SLFUPDTR__WARMUP_CONCURRENCY` envar (default 4).
+"""
+
+import json
+import logging
+import math
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import dotenv
+
+log = logging.getLogger(__name__)
+
+
+def determine_warmup_urls(project_path: Path) -> list[str]:
+    """
+    Returns the warm-up URLs from the project's `.env` file; an empty list if none are configured.
+    An invalid value is logged, and no warm-up done; it runs after the sync, so it mustn't halt the update
+      (or a resumed run, which would re-run it).
+    """
+    settings: dict = dotenv.dotenv_values(project_path.parent / '.env')
+    raw: str = settings.get('SLFUPDTR__WARMUP_URLS_JSON') or '[]'
+    try:
+        urls: list[str] = json.loads(raw)
+        if not (isinstance(urls, list) and all(isinstance(url, str) for url in urls)):
+            raise ValueError('not a JSON list of URL strings')
+    except ValueError as e:
+        log.warning(f'invalid SLFUPDTR__WARMUP_URLS_JSON value, ``{raw}`` ({e}); skipping warm-up')
+        return []
+    log.debug(f'warmup urls, ``{urls}``')
+    return urls
+
+
+def determine_restart_time(project_path: Path) -> float | None:
+    """
+    Returns the time (epoch seconds) of the app's last restart, ie the modification-time of its `restart.txt`;
+      None if there isn't one.
+    """
+    try:
+        return (project_path / 'config' / 'tmp' / 'restart.txt').stat().st_mtime
+    except OSError:
+        return None
+
+
+def determine_warmup_concurrency() -> int:
+    """
+    Returns the number of concurrent warm-up requests, from the optional `SLFUPDTR__WARMUP_CONCURRENCY` envar.
+    Defaults to 4; an invalid value is logged, and the default used.
+    """
+    try:
+        concurrency: int = max(1, int(os.environ.get('SLFUPDTR__WARMUP_CONCURRENCY', '4')))
+    except ValueError:
+        log.warning('invalid SLFUPDTR__WARMUP_CONCURRENCY value; using 4')
+        concurrency = 4
+    log.debug(f'warmup concurrency, ``{concurrency}``')
+    return concurrency
+
+
+def warm_up(
+    urls: list[str],
+    restart_time: float | None = None,
+    concurrency: int | None = None,
+    rounds: int = 5,
+    ready_timeout: float = 120.0,
+    request_timeout: float = 30.0,
+) -> dict:
+    """
+    Polls the first URL until it succeeds (or `ready_timeout` passes), then sends `rounds` requests to each URL,
+      `concurrency` at a time (by default, per `determine_warmup_concurrency()`), and measures the latencies.
+    Returns a dict of: ready (bool), time_to_first_success, request_count, failure_count, p50, p95 (seconds).
+    The time_to_first_success is measured from `restart_time` (epoch seconds; see determine_restart_time()),
+      or, if that's not given, from the start of the warm-up.
+    Called by self_updater.manage_update() after the sync.
+    """
+    log.info('::: warming up app ----------')
+    start: float = time.monotonic()
+    stats: dict = {
+        'ready': False,
+        'time_to_first_success': None,
+        'request_count': 0,
+        'failure_count': 0,
+        'p50': None,
+        'p95': None,
+    }
+    ## wait for the first success -------------------------------------
+    while time.monotonic() - start < ready_timeout:
+        (ok, _latency) = fetch_url(urls[0], request_timeout)
+        if ok:
+            stats['ready'] = True
+            if restart_time is not None:
+                stats['time_to_first_success'] = max(0.0, time.time() - restart_time)
+            else:
+                stats['time_to_first_success'] = time.monotonic() - start
+            break
+        time.sleep(0.5)
+    if not stats['ready']:
+        log.warning(f'app not ready after ``{ready_timeout}`` seconds')
+        return stats
+    ## measure latencies ----------------------------------------------
+    request_urls: list[str] = [url for _ in range(rounds) for url in urls]
+    with ThreadPoolExecutor(max_workers=concurrency or determine_warmup_concurrency()) as executor:
+        results: list[tuple[bool, float]] = list(executor.map(lambda url: fetch_url(url, request_timeout), request_urls))
+    latencies: list[float] = sorted(latency for ok, latency in results if ok)
+    stats['request_count'] = len(results)
+    stats['failure_count'] = sum(1 for ok, _latency in results if not ok)
+    if latencies:
+        stats['p50'] = percentile(latencies, 50)
+        stats['p95'] = percentile(latencies, 95)
+    log.info(f'ok / warmup stats, ``{stats}``')
+    return stats
+
+
+def fetch_url(url: str, request_timeout: float) -> tuple[bool, float]:
+    """
+    Requests the URL; returns (ok, latency_seconds). Any non-2xx/3xx status, or connection problem, is not ok.
+    Called by warm_up().
+    """
+    start: float = time.monotonic()
+    try:
+        with urllib.request.urlopen(url, timeout=request_timeout) as response:
+            response.read()
+            ok: bool = 200 <= response.status < 400
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return (ok, time.monotonic() - start)
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """
+    Returns the nearest-rank percentile of already-sorted values.
+    """
+    rank: int = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def make_warmup_report(stats: dict) -> tuple[None | str, None | str]:
+    """
+    Returns (problem_message, report) for the update-email.
+    The problem_message is None unless the app didn't come back, or some warm-up requests failed.
+    The report (timings) is None if the app didn't come back, since the problem_message covers that.
+    """
+    if not stats['ready']:
+        problem_message = 'Warm-up: the app did not respond successfully after the restart.'
+        return (problem_message, None)
+    report = (
+        f'Warm-up: first success {stats["time_to_first_success"]:.1f}s after restart; '
+        f'{stats["request_count"]} requests, {stats["failure_count"]} failed'
+    )
+    if stats['p50'] is not None:
+        report += f'; latency p50 {stats["p50"] * 1000:.0f} ms, p95 {stats["p95"] * 1000:.0f} ms'
+    problem_message: None | str = report if stats['failure_count'] else None
+    return (problem_message, report)
@@ -0,0 +1,253 @@
+"""
+Module used by self_updater.py
+Contains code for a host-wide cache of wheels built from source, for pinned packages with no wheel for our platform.
+
+Without it, each `uv pip sync`, into each project's venv on the host, may rebuild those packages from their sdists.
+
+Enabled by `SLFUPDTR__WHEEL_CACHE=true`. The cache lives in `wheel_cache/` in the "outer-stuff" directory
+  (override with `SLFUPDTR__WHEEL_CACHE_DIR`), in one directory per (Python ABI, platform), ie `cp312-linux_x86_64/`:
+- built wheels, which the syncs are pointed at with `--find-links`.
+- `keys/{package}=={version}.json` -- the key's status: `built` (and the wheel's filename), `index-wheel`
+    (the index has a compatible wheel; nothing to build), or `failed` (the build failed; not retried).
+
+Right after the compile (in the compile's worker-thread, so alongside the initial tests), each pin without a status
+  is looked up on the index (`SLFUPDTR__WHEEL_CACHE_INDEX_URL`, default PyPI), and those with only an sdist are built
+  in parallel (`uv build --wheel`, with the venv's python). A pin with a status is a cache-hit, needing no network.
+Pins with environment-markers (in a `--universal` compile, often for other platforms) are left to uv, as before.
+Wheel-compatibility is judged by python/ABI tag and by OS and architecture; manylinux glibc-versions aren't checked.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import lib_common
+import lib_process_runner
+from lib_bisector import parse_lockfile
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INDEX_URL = 'https://pypi.org/simple'
+TAGS_SCRIPT = (
+    'import sys, sysconfig; '
+    "print(f'cp{sys.version_info[0]}{sys.version_info[1]}', sysconfig.get_platform().replace('-', '_').replace('.', '_'))"
+)
+
+run_stats: dict = {}  # the current run's cache-statistics; see prebuild_wheels() and make_report()
+run_stats_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return os.environ.get('SLFUPDTR__WHEEL_CACHE', '').lower() == 'true'
+
+
+def determine_cache_dir() -> Path:
+    """
+    Returns the host-wide cache directory.
+    """
+    if os.environ.get('SLFUPDTR__WHEEL_CACHE_DIR'):
+        return Path(os.environ['SLFUPDTR__WHEEL_CACHE_DIR'])
+    import lib_settings  # imported here; only needed without the envar
+
+    return lib_settings.get_settings().stuff_dir / 'wheel_cache'
+
+
+def determine_tags(python_path: Path | str) -> tuple[str, str]:
+    """
+    Returns the interpreter's (abi, platform) tags, ie ('cp312', 'linux_x86_64').
+    """
+    result: subprocess.CompletedProcess = lib_process_runner.run(
+        [str(python_path), '-c', TAGS_SCRIPT], phase='checks', check=True, capture_output=True, text=True
+    )
+    (abi, platform) = result.stdout.split()
+    return (abi, platform)
+
+
+def make_tag_dir(tags: tuple[str, str], cache_dir: Path | None = None) -> Path:
+    return (cache_dir or determine_cache_dir()) / '-'.join(tags)
+
+
+def find_links_args(python_path: Path | str) -> list[str]:
+    """
+    Returns the `--find-links` arguments pointing a uv sync/install at the cache's wheels; empty if not enabled.
+    Called by self_updater.sync_dependencies() and lib_sync_planner.apply_plan().
+    """
+    if not is_enabled():
+        return []
+    tag_dir: Path = make_tag_dir(determine_tags(python_path))
+    if not tag_dir.exists():
+        return []
+    return ['--find-links', str(tag_dir)]
+
+
+def find_unmarked_pins(lockfile_text: str) -> list[tuple[str, str]]:
+    """
+    Returns the (package, version) of each `name==version` pin without environment-markers.
+    """
+    pins: list[tuple[str, str]] = []
+    for name, lines in parse_lockfile(lockfile_text).items():
+        for line in lines:
+            if ';' not in line and '@' not in line and '==' in line:
+                pins.append((name, line.split('==', 1)[1].strip()))
+    return pins
+
+
+def normalize(name: str) -> str:
+    return name.lower().replace('_', '-').replace('.', '-')
+
+
+def is_compatible_wheel(filename: str, abi: str, platform: str) -> bool:
+    """
+    Checks a wheel's filename-tags against the interpreter's, ie `foo-1.0-cp312-cp312-manylinux_2_17_x86_64.whl`.
+    """
+    parts: list[str] = filename[: -len('.whl')].split('-')
+    (python_tags, abi_tags, platform_tags) = (parts[-3].split('.'), parts[-2].split('.'), parts[-1].split('.'))
+    abi_ok: bool = any(tag in ('none', 'abi3', abi) for tag in abi_tags)
+    python_ok: bool = any(
+        tag in ('py3', f'py{abi[2:]}', abi)
+        or ('abi3' in abi_tags and tag.startswith('cp3') and int(tag[3:]) <= int(abi[3:]))  # ie cp39-abi3 on cp312
+        for tag in python_tags
+    )
+    os_name: str = platform.split('_', 1)[0]  # ie 'linux', 'macosx'
+    arch: str = platform.split('_', 1)[1] if os_name == 'linux' else platform.split('_', 3)[-1]  # ie 'x86_64', 'arm64'
+    platform_ok: bool = any(
+        tag == 'any' or (os_name in tag and (tag.endswith(arch) or tag.endswith('universal2'))) for tag in platform_tags
+    )
+    return python_ok and abi_ok and platform_ok
+
+
+def fetch_index_files(name: str, index_url: str) -> list[dict]:
+    """
+    Returns the package's files (dicts with `filename` and `url`), from the index's JSON simple-API.
+    """
+    request = urllib.request.Request(f'{index_url}/{name}/', headers={'Accept': 'application/vnd.pypi.simple.v1+json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())['files']
+
+
+def find_sdist_to_build(name: str, version: str, abi: str, platform: str, index_url: str) -> str | None:
+    """
+    Returns the url of the pin's sdist if the index has no compatible wheel for it; otherwise None.
+    """
+    sdist_url: str | None = None
+    for file_info in fetch_index_files(name, index_url):
+        filename: str = file_info['filename']
+        if filename.endswith('.whl'):
+            (file_name, file_version) = filename.split('-')[:2]
+            if normalize(file_name) == name and file_version == version and is_compatible_wheel(filename, abi, platform):
+                return None
+        elif filename.endswith(('.tar.gz', '.zip')):
+            stem: str = filename.removesuffix('.tar.gz').removesuffix('.zip')
+            (file_name, file_version) = stem.rsplit('-', 1)
+            if normalize(file_name) == name and file_version == version:
+                sdist_url = file_info['url']
+    return sdist_url
+
+
+def build_wheel(uv_path: Path, python_path: Path | str, sdist_url: str, tag_dir: Path) -> str:
+    """
+    Downloads and builds the sdist; moves the wheel into the cache; returns the wheel's filename.
+    Builds in a temp-directory inside the cache, so the final move is a rename: a sync never sees a partial wheel.
+    """
+    with tempfile.TemporaryDirectory(prefix='.build_', dir=tag_dir) as temp_dir:
+        sdist_path: Path = Path(temp_dir) / sdist_url.split('#')[0].rsplit('/', 1)[-1]
+        with urllib.request.urlopen(sdist_url, timeout=120) as response, sdist_path.open('wb') as f:
+            shutil.copyfileobj(response, f)
+        out_dir: Path = Path(temp_dir) / 'dist'
+        lib_process_runner.run(
+            [str(uv_path), 'build', '--wheel', '--python', str(python_path), '--out-dir', str(out_dir), str(sdist_path)],
+            phase='wheel_build',
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        wheel_path: Path = next(out_dir.glob('*.whl'))
+        os.replace(wheel_path, tag_dir / wheel_path.name)
+    return wheel_path.name
+
+
+def process_pin(
+    pin: tuple[str, str], tags: tuple[str, str], tag_dir: Path, uv_path: Path, python_path: Path | str, index_url: str
+) -> str:
+    """
+    Looks up the pin's status, checking the index (and building) if it has none; records and returns the status.
+    Only a failed build is recorded as `failed`; an index-lookup or download problem (or a build-timeout) returns
+      `unknown` without recording anything, so the pin is retried next run.
+    """
+    (name, version) = pin
+    key_path: Path = tag_dir / 'keys' / f'{name}=={version}.json'
+    if key_path.exists():
+        count_stat('hits')
+        return json.loads(key_path.read_text())['status']
+    count_stat('misses')
+    entry: dict = {'status': 'index-wheel'}
+    try:
+        sdist_url: str | None = find_sdist_to_build(name, version, *tags, index_url)
+    except (urllib.error.URLError, OSError, KeyError, ValueError):
+        log.exception(f'problem looking up ``{name}=={version}`` on the index; will retry next run')
+        return 'unknown'
+    if sdist_url:
+        try:
+            entry = {'status': 'built', 'wheel': build_wheel(uv_path, python_path, sdist_url, tag_dir)}
+            log.info(f'ok / built wheel ``{entry["wheel"]}``')
+        except (subprocess.CalledProcessError, StopIteration):  # the build itself failed; recorded, so it isn't retried
+            log.exception(f'problem building ``{name}=={version}``')
+            entry = {'status': 'failed'}
+        except (lib_process_runner.ProcessTimeoutError, OSError):  # ie a download-error, or timeout; may be transient
+            log.exception(f'problem downloading or building ``{name}=={version}``; will retry next run')
+            return 'unknown'
+    count_stat(entry['status'])
+    lib_common.write_text_atomically(key_path, json.dumps(entry))
+    return entry['status']
+
+
+def count_stat(stat: str) -> None:
+    with run_stats_lock:
+        run_stats[stat] = run_stats.get(stat, 0) + 1
+    return
+
+
+def prebuild_wheels(lockfile_path: Path, uv_path: Path, python_path: Path | str, cache_dir: Path | None = None) -> dict:
+    """
+    Makes sure each of the lockfile's pins has a cache-status, building missing wheels in parallel.
+    Returns the run's statistics, ie {'hits': 40, 'misses': 2, 'index-wheel': 1, 'built': 1}.
+    Does not raise: a problem is logged, since uv will still build on demand during the sync.
+    Called by self_updater.compile_and_prebuild() right after the compile.
+    """
+    log.info('::: pre-building wheels ----------')
+    run_stats.clear()
+    try:
+        tags: tuple[str, str] = determine_tags(python_path)
+        tag_dir: Path = make_tag_dir(tags, cache_dir)
+        (tag_dir / 'keys').mkdir(parents=True, exist_ok=True)
+        index_url: str = os.environ.get('SLFUPDTR__WHEEL_CACHE_INDEX_URL', DEFAULT_INDEX_URL).rstrip('/')
+        pins: list[tuple[str, str]] = find_unmarked_pins(lockfile_path.read_text())
+        worker_count: int = int(os.environ.get('SLFUPDTR__WHEEL_CACHE_WORKERS', '0')) or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=worker_count) as executor:
+            list(executor.map(lambda pin: process_pin(pin, tags, tag_dir, uv_path, python_path, index_url), pins))
+    except Exception:
+        log.exception('problem pre-building wheels')
+    log.info(f'ok / wheel-cache stats, ``{run_stats}``')
+    return dict(run_stats)
+
+
+def make_report() -> str | None:
+    """
+    Returns the run's cache-statistics, for the update-email; None if the cache wasn't used.
+    """
+    lookups: int = run_stats.get('hits', 0) + run_stats.get('misses', 0)
+    if not lookups:
+        return None
+    hit_rate: float = 100 * run_stats.get('hits', 0) / lookups
+    return (
+        f'Wheel cache: {hit_rate:.0f}% hit rate ({run_stats.get("hits", 0)} of {lookups} pins); '
+        f'built {run_stats.get("built", 0)}, failed {run_stats.get("failed", 0)}.'
+    )
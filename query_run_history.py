@@ -0,0 +1,67 @@
+# /// script
+# requires-python = "~=3.12.0"
+# ///
+
+"""
+Answers questions about past self-updater runs, from the run-history database that self_updater.py appends to.
+
+Usage...
+`$ uv run ./query_run_history.py slowest-phases [--days 30] [--project PROJECT]`
+`$ uv run ./query_run_history.py package-churn [--days 30] [--limit 20]`
+`$ uv run ./query_run_history.py failure-rate [--days 30]`
+`$ uv run ./query_run_history.py warmup-latency [--days 30]`
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import lib_run_history
+import lib_settings
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Query the self-updater run-history.')
+    parser.add_argument(
+        '--db', type=Path, default=None, help='database path (default: SLFUPDTR__RUN_HISTORY_DB, or outer-stuff dir)'
+    )
+    subparsers = parser.add_subparsers(dest='question', required=True)
+    slowest = subparsers.add_parser('slowest-phases', help='phases with the highest average wall-time')
+    slowest.add_argument('--days', type=int, default=30)
+    slowest.add_argument('--project', default=None)
+    churn = subparsers.add_parser('package-churn', help='packages that changed most often')
+    churn.add_argument('--days', type=int, default=30)
+    churn.add_argument('--limit', type=int, default=20)
+    failures = subparsers.add_parser('failure-rate', help='failure-rate per project')
+    failures.add_argument('--days', type=int, default=30)
+    warmups = subparsers.add_parser('warmup-latency', help='post-restart warm-up readiness and latency per project')
+    warmups.add_argument('--days', type=int, default=30)
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> str:
+    """
+    Runs the requested query; returns the result as a plain-text table.
+    """
+    options: argparse.Namespace = parse_args(args)
+    if options.db is None:
+        lib_settings.get_settings()  # loads the `.env`, which may set `SLFUPDTR__RUN_HISTORY_DB`
+    connection = lib_run_history.connect(options.db)
+    if options.question == 'slowest-phases':
+        rows: list[tuple] = lib_run_history.query_slowest_phases(connection, options.days, options.project)
+        headers: list[str] = ['phase', 'runs', 'avg_wall_s', 'max_wall_s', 'avg_cpu_s']
+    elif options.question == 'package-churn':
+        rows = lib_run_history.query_package_churn(connection, options.days, options.limit)
+        headers = ['package', 'changes', 'projects']
+    elif options.question == 'warmup-latency':
+        rows = lib_run_history.query_warmup_latency(connection, options.days)
+        headers = ['project', 'warmups', 'not_ready', 'avg_first_success_ms', 'avg_p50_ms', 'max_p95_ms']
+    else:
+        rows = lib_run_history.query_failure_rate(connection, options.days)
+        headers = ['project', 'runs', 'failures', 'failure_pct']
+    connection.close()
+    return lib_run_history.format_rows(headers, rows)
+
+
+if __name__ == '__main__':
+    print(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+# /// script
+# requires-python = "~=3.12.0"
+# dependencies = ["python-dotenv~=1.0.0"]
+# ///
+
+"""
+Updates a host's projects as a staged rollout: the canary projects first, then -- after their followup tests,
+  warm-up checks, and a soak period -- the rest, in parallel waves sized from how long the canaries took.
+  A problem halts the rollout, and the sys-admins are emailed. See lib_rollout.py.
+
+Usage...
+`$ uv run ./roll_out_updates.py /path/to/project_a_code/ /path/to/project_b_code/ ... --canary /path/to/project_a_code/`
+`$ uv run ./roll_out_updates.py /path/to/*_code/ [--soak-minutes 30] [--window-minutes 120] [--max-parallel 4]`
+(With no `--canary`, the first project is the canary.)
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import lib_rollout
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    settings: dict = lib_rollout.determine_rollout_settings()
+    parser = argparse.ArgumentParser(description="Roll out the projects' updates: canaries first, then parallel waves.")
+    parser.add_argument('project_paths', nargs='+', type=Path, help='project code-directories')
+    parser.add_argument(
+        '--canary', action='append', type=Path, dest='canary_paths', default=[], help='a canary project (repeatable)'
+    )
+    parser.add_argument('--soak-minutes', type=float, default=settings['soak_minutes'])
+    parser.add_argument('--window-minutes', type=float, default=settings['window_minutes'])
+    parser.add_argument('--max-parallel', type=int, default=settings['max_parallel'])
+    return parser.parse_args(args)
+
+
+def main(args: list[str]) -> tuple[str, bool]:
+    """
+    Runs the rollout; emails the sys-admins if it was halted; returns (report, halted).
+    """
+    options: argparse.Namespace = parse_args(args)
+    project_paths: list[Path] = list(dict.fromkeys(path.resolve() for path in options.project_paths))
+    canary_paths: list[Path] = [path.resolve() for path in options.canary_paths] or project_paths[:1]
+    project_paths = canary_paths + [path for path in project_paths if path not in canary_paths]
+    settings: dict = {
+        'soak_minutes': options.soak_minutes,
+        'window_minutes': options.window_minutes,
+        'max_parallel': options.max_parallel,
+    }
+    rollout: dict = lib_rollout.roll_out(project_paths, canary_paths, settings)
+    report: str = lib_rollout.make_report(rollout)
+    if rollout['halted']:
+        import lib_emailer  # imported here; only needed when halted
+
+        emailer: lib_emailer.Emailer = lib_emailer.get_emailer(canary_paths[0])
+        emailer.send_email(emailer.sys_admin_recipients, emailer.create_setup_problem_message(f'rollout halted\n\n{report}'))
+        lib_emailer.close_emailers()
+    return (report, bool(rollout['halted']))
+
+
+if __name__ == '__main__':
+    (report, halted) = main(sys.argv[1:])
+    print(report)
+    sys.exit(1 if halted else 0)
@@ -13,46 +13,36 @@ Info...
 
 Usage...
 `$ uv run ./self_update.py "/path/to/project_code_dir/"`
+`$ uv run ./self_update.py "/path/to/project_code_dir/" --profile [--profile-phase update_permissions]`
 """
 
+import argparse
 import logging
 import os
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-from dotenv import find_dotenv, load_dotenv
-
+import lib_backup_store
+import lib_checkpoint
 import lib_common
-import lib_django_updater
 import lib_environment_checker
+import lib_facts_cache
+import lib_logging
+import lib_process_runner
+import lib_run_history
+import lib_settings
+import lib_sync_planner
 from lib_call_runtests import run_followup_tests, run_initial_tests
 from lib_compilation_evaluator import CompiledComparator
-from lib_emailer import send_email_of_diffs
-
-## load envars ------------------------------------------------------
-this_file_path = Path(__file__).resolve()
-stuff_dir = this_file_path.parent.parent
-dotenv_path = stuff_dir / '.env'
-assert dotenv_path.exists(), f'file does not exist, ``{dotenv_path}``'
-load_dotenv(find_dotenv(str(dotenv_path), raise_error_if_not_found=True), override=True)
-
-## define constants -------------------------------------------------
-ENVAR_EMAIL_FROM = os.environ['SLFUPDTR__EMAIL_FROM']
-ENVAR_EMAIL_HOST = os.environ['SLFUPDTR__EMAIL_HOST']
-ENVAR_EMAIL_HOST_PORT = os.environ['SLFUPDTR__EMAIL_HOST_PORT']
-
-## set up logging ---------------------------------------------------
-log_dir: Path = stuff_dir / 'logs'
-log_dir.mkdir(parents=True, exist_ok=True)  # creates the log-directory inside the stuff-directory if it doesn't exist
-log_file_path: Path = log_dir / 'self_updater.log'
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='[%(asctime)s] %(levelname)s [%(module)s-%(funcName)s()::%(lineno)d] %(message)s',
-    datefmt='%d/%b/%Y %H:%M:%S',
-    filename=log_file_path,
-)
+from lib_emailer import close_emailers, get_emailer, send_email_of_diffs
+
+## Note: importing this module has no side effects; settings and logging are set up in dundermain.
+## Modules only needed when the compile differs (benchmarks, warm-up, bisect, startup-profile, etc)
+##   are imported where they're used, so a no-change run doesn't pay for importing them.
+
 log = logging.getLogger(__name__)
 
 
@@ -93,7 +83,7 @@ def compile_requirements(project_path: Path, python_version: str, environment_ty
     log.debug(f'compile_command: ``{compile_command}``')
     ## run compile command ------------------------------------------
     try:
-        subprocess.run(compile_command, check=True)
+        lib_process_runner.run(compile_command, phase='compile', check=True)
         log.info('ok / uv pip compile was successful')
     except subprocess.CalledProcessError:
         message = 'Error during pip compile'
@@ -104,25 +94,83 @@ def compile_requirements(project_path: Path, python_version: str, environment_ty
     ## end def compile_requirements()
 
 
-def remove_old_backups(project_path: Path, keep_recent: int = 30) -> None:
+def compile_and_prebuild(project_path: Path, python_version: str, environment_type: str, uv_path: Path) -> Path:
+    """
+    Compiles the requirements; then, if the wheel-cache is enabled, pre-builds any missing wheels for the new pins.
+    Run in run_initial_tests_and_compile()'s worker-thread, so the pre-building overlaps the initial tests.
+    Returns the path to the newly created backup file.
+    """
+    import lib_wheel_cache  # imported here; see note at top
+
+    compiled_filepath: Path = compile_requirements(project_path, python_version, environment_type, uv_path)
+    if lib_wheel_cache.is_enabled():
+        lib_wheel_cache.prebuild_wheels(compiled_filepath, uv_path, python_version)
+    return compiled_filepath
+
+
+def run_initial_tests_and_compile(
+    uv_path: Path,
+    project_path: Path,
+    project_email_addresses: list[list[str, str]],
+    python_version: str,
+    environment_type: str,
+) -> Path:
+    """
+    Runs the initial tests and the requirements-compile concurrently; returns the path to the new backup file.
+
+    The two are independent: the tests exercise the current venv, while the compile only resolves into a new backup file.
+    So the compile (then any wheel pre-building) is started in a worker thread, and the tests run in this thread
+      (tests are skipped on production).
+
+    If the initial tests fail, the finished compile is discarded (the new backup file is removed),
+      so it won't be mistaken for the "previous" backup on the next run; then the test-exception is re-raised.
+    If the compile fails, its exception is raised after the tests have finished.
     """
-    Removes all files in the backup directory other than the most-recent files.
+    log.info('::: running initial tests and compile concurrently ----------')
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        compile_future = executor.submit(compile_and_prebuild, project_path, python_version, environment_type, uv_path)
+        try:
+            if environment_type != 'production':
+                run_initial_tests(uv_path, project_path, project_email_addresses)
+                lib_run_history.note(test_outcome='initial-passed')
+        except Exception:
+            lib_run_history.note(test_outcome='initial-failed')
+            ## discard the compile ----------------------------------
+            log.debug('initial tests failed; waiting for compile to finish so it can be discarded')
+            try:
+                compiled_filepath: Path = compile_future.result()
+                compiled_filepath.unlink(missing_ok=True)
+                log.debug(f'discarded compiled_filepath, ``{compiled_filepath}``')
+            except Exception:
+                log.exception('compile also failed; nothing to discard')
+            raise
+        compiled_requirements: Path = compile_future.result()  # raises the compile-exception, if any
+    log.info('ok / initial tests and compile finished')
+    return compiled_requirements
+
+
+def archive_old_backups(project_path: Path, keep_recent: int = 30) -> None:
     """
-    log.info('::: removing old backups ----------')
+    Keeps the most-recent backup files as-is; packs older ones into the compressed, deduplicated backup-archive,
+      and applies any retention settings. See lib_backup_store.py.
+    """
+    log.info('::: archiving old backups ----------')
     backup_dir: Path = project_path.parent / 'requirements_backups'
-    backups: list[Path] = sorted([f for f in backup_dir.iterdir() if f.is_file() and f.suffix == '.txt'], reverse=True)
-    old_backups: list[Path] = backups[keep_recent:]
-    for old_backup in old_backups:
-        log.debug(f'removing old backup: {old_backup}')
-        old_backup.unlink()
-    log.info('ok / old backups removed')
+    lib_backup_store.archive_old_backups(backup_dir, keep_recent)
+    log.info('ok / old backups archived')
     return
 
 
-def sync_dependencies(project_path: Path, backup_file: Path, uv_path: Path) -> None:
+def sync_dependencies(
+    project_path: Path, backup_file: Path, uv_path: Path, current_file: Path | None = None
+) -> tuple[int, float]:
     """
     Prepares the venv environment.
     Syncs the recent `--output` requirements.in file to the venv.
+    If the lockfile the venv is currently synced to is known (`current_file`), applies just the changes between
+      the two, and verifies the result (see lib_sync_planner.py); otherwise, or if that fails, runs the full sync.
+    Byte-compiles the changed packages, before the restart is triggered.
+    Returns the byte-compile stats, ie (file_count, elapsed_seconds).
     Exits the script if any command fails.
 
     Why this works, without explicitly "activate"-ing the venv...
@@ -136,6 +184,9 @@ def sync_dependencies(project_path: Path, backup_file: Path, uv_path: Path) -> N
     the PATH and VIRTUAL_ENV environment variables before running the command.
     """
     log.info('::: syncing dependencies ----------')
+    import lib_bytecode_compiler  # imported here; see note at top
+    import lib_wheel_cache
+
     ## prepare env-path variables -----------------------------------
     venv_tuple: tuple[Path, Path] = lib_common.determine_venv_paths(project_path)
     (venv_bin_path, venv_path) = venv_tuple
@@ -144,48 +195,85 @@ def sync_dependencies(project_path: Path, backup_file: Path, uv_path: Path) -> N
     local_scoped_env['PATH'] = f'{venv_bin_path}:{local_scoped_env["PATH"]}'  # prioritizes venv-path
     local_scoped_env['VIRTUAL_ENV'] = str(venv_path)
     ## prepare sync command ------------------------------------------
-    sync_command: list[str] = [str(uv_path), 'pip', 'sync', str(backup_file)]
+    find_links_args: list[str] = lib_wheel_cache.find_links_args(venv_bin_path / 'python3')  # empty unless enabled
+    sync_command: list[str] = [str(uv_path), 'pip', 'sync', *find_links_args, str(backup_file)]
     log.debug(f'sync_command: ``{sync_command}``')
-    try:
-        ## run sync command ------------------------------------------
-        subprocess.run(sync_command, check=True, env=local_scoped_env)  # so all installs will go to the venv
-        log.info('ok / uv pip sync was successful')
-    except subprocess.CalledProcessError:
-        message = 'Error during pip sync'
-        log.exception(message)
-        raise Exception(message)
+    dist_infos_before: set[Path] = lib_bytecode_compiler.snapshot_dist_infos(venv_path)
+    ## apply just the lockfile's changes, if possible ---------------
+    delta_synced: bool = False
+    if current_file and current_file.exists():
+        delta_synced = lib_sync_planner.delta_sync(uv_path, current_file, backup_file, local_scoped_env, find_links_args)
+    if not delta_synced:
+        try:
+            ## run sync command --------------------------------------
+            lib_process_runner.run(
+                sync_command, phase='sync', check=True, env=local_scoped_env
+            )  # so all installs will go to the venv
+            log.info('ok / uv pip sync was successful')
+        except subprocess.CalledProcessError:
+            message = 'Error during pip sync'
+            log.exception(message)
+            raise Exception(message)
+    ## byte-compile changed packages, before the restart ------------
+    changed_py_files: list[Path] = lib_bytecode_compiler.find_changed_py_files(venv_path, dist_infos_before)
+    precompile_stats: tuple[int, float] = lib_bytecode_compiler.precompile_files(venv_bin_path, changed_py_files)
     try:
         ## run `touch` to make the changes take effect ---------------
         log.info('::: running `touch` ----------')
-        subprocess.run(['touch', './config/tmp/restart.txt'], check=True)
+        lib_process_runner.run(['touch', './config/tmp/restart.txt'], phase='sync', check=True)
         log.info('ok / ran `touch`')
     except subprocess.CalledProcessError:
         message = 'Error during pip sync or touch'
         log.exception(message)
         raise Exception(message)
-    return
+    return precompile_stats
 
     ## end def sync_dependencies()
 
 
+def roll_back_update(project_path: Path, backup_file: Path, previous_backup_file: Path, uv_path: Path) -> None:
+    """
+    Re-syncs the venv to the previous backup, and discards the new backup.
+    Discarding it means the next run's compile will again differ from the newest backup, so the update is retried then.
+    Called by manage_update() when the benchmark-gate finds a regression and is configured to roll back.
+    """
+    log.info('::: rolling back update ----------')
+    sync_dependencies(project_path, previous_backup_file, uv_path, current_file=backup_file)
+    backup_file.unlink(missing_ok=True)
+    log.info(f'ok / rolled back to ``{previous_backup_file}``')
+    return
+
+
 def mark_active(backup_file: Path) -> None:
     """
-    Marks the backup file as active by adding a header comment.
+    Marks the backup file as active by pointing the backup-dir's `active` symlink at it; the file itself is unchanged.
+    Also records it in the backup-store's index.
     """
     log.info('::: marking recent-backup as active ----------')
-    with backup_file.open('r') as file:  # read the file
-        content: list[str] = file.readlines()
-    content.insert(0, '# ACTIVE\n')
-    with backup_file.open('w') as file:  # write the file
-        file.writelines(content)
+    lib_backup_store.mark_active(backup_file)
+    lib_backup_store.record_backup(backup_file)
     log.info('ok / marked recent-backup as active')
     return
 
 
+def warm_up_app(project_path: Path) -> tuple[None | str, None | str]:
+    """
+    Warms up the restarted app, if warm-up URLs are configured; returns (warmup_problems, warmup_report).
+    The warm-up stats are noted in the run-history.
+    """
+    import lib_warmup  # imported here; see note at top
+
+    warmup_urls: list[str] = lib_warmup.determine_warmup_urls(project_path)
+    if not warmup_urls:
+        return (None, None)
+    warmup_stats: dict = lib_warmup.warm_up(warmup_urls, lib_warmup.determine_restart_time(project_path))
+    lib_run_history.note(warmup=warmup_stats)
+    return lib_warmup.make_warmup_report(warmup_stats)
+
+
 def update_permissions(project_path: Path, backup_file: Path, group: str) -> None:
     """
     Update group ownership and permissions for relevant directories.
-    Mark the backup file as active by adding a header comment.
     """
     log.info('::: updating group and permissions ----------')
     backup_dir: Path = project_path.parent / 'requirements_backups'
@@ -195,8 +283,8 @@ def update_permissions(project_path: Path, backup_file: Path, group: str) -> Non
     log.debug(f'env_path: ``{env_path}``')
     for path in [env_path, backup_dir]:
         log.debug(f'updating group and permissions for path: ``{path}``')
-        subprocess.run(['chgrp', '-R', group, str(path)], check=True)
-        subprocess.run(['chmod', '-R', 'g=rwX', str(path)], check=True)
+        lib_process_runner.run(['chgrp', '-R', group, str(path)], phase='permissions', check=True)
+        lib_process_runner.run(['chmod', '-R', 'g=rwX', str(path)], phase='permissions', check=True)
     log.info('ok / updated group and permissions')
     return
 
@@ -212,6 +300,10 @@ def manage_update(project_path: str) -> None:
     Calls various helper functions to validate, compile, compare, sync, and update permissions.
     """
     log.debug('starting manage_update()')
+    run_id: str = lib_run_history.start_run()  # facts are noted as the run proceeds; saved by dundermain
+    lib_logging.set_run_id(run_id)  # tags this run's log-lines
+    lib_process_runner.apply_low_impact_to_current_process()  # no-op unless low-impact mode is enabled
+    lib_process_runner.start_run_deadline()  # child-processes still running at the deadline are killed
 
     ## ::: run environmental checks :::
     ## validate project path ----------------------------------------
@@ -219,89 +311,276 @@ def manage_update(project_path: str) -> None:
     lib_environment_checker.validate_project_path(project_path)
     ## cd to project dir --------------------------------------------
     os.chdir(project_path)
+    ## load the journal of an interrupted update, if any ------------
+    checkpoint = lib_checkpoint.Checkpoint(project_path)
+    resuming: bool = checkpoint.load()
+    ## load the cached environment-facts (each rediscovered if its sources changed) --
+    facts = lib_facts_cache.FactsCache(project_path)
     ## get email addresses ------------------------------------------
-    project_email_addresses: list[list[str, str]] = lib_environment_checker.determine_project_email_addresses(project_path)
+    project_email_addresses: list[list[str, str]] = facts.get(
+        'email_addresses', lib_environment_checker.determine_project_email_addresses, project_path
+    )
     ## check branch -------------------------------------------------
     lib_environment_checker.check_branch(project_path, project_email_addresses)  # emails admins and exits if not on main
     ## check git status ---------------------------------------------
-    lib_environment_checker.check_git_status(project_path, project_email_addresses)  # emails admins and exits if not clean
+    if checkpoint.interrupted_phase == 'copy':
+        log.info('skipping git-status check; the interrupted copy-to-codebase may have left the requirements file changed')
+    else:
+        lib_environment_checker.check_git_status(
+            project_path, project_email_addresses
+        )  # emails admins and exits if not clean
     ## get python version -------------------------------------------
-    version_info: tuple[str, str, str] = lib_environment_checker.determine_python_version(
-        project_path, project_email_addresses
+    version_info: tuple[str, str, str] = facts.get(
+        'python_version', lib_environment_checker.determine_python_version, project_path, project_email_addresses
     )  # ie, ('3.12.4', '~=3.12.0', '/path/to/python3.12')
     env_python_path_resolved = version_info[2]
     ## get environment-type -----------------------------------------
     environment_type: str = lib_environment_checker.determine_environment_type(project_path, project_email_addresses)
+    lib_run_history.note(environment_type=environment_type)
     ## get uv path --------------------------------------------------
-    uv_path: Path = lib_environment_checker.determine_uv_path()
+    uv_path: Path = facts.get('uv_path', lib_environment_checker.determine_uv_path)
     ## get group ----------------------------------------------------
-    group: str = lib_environment_checker.determine_group(project_path, project_email_addresses)
-
-    ## run initial tests --------------------------------------------
-    if environment_type != 'production':
-        run_initial_tests(uv_path, project_path, project_email_addresses)
-
-    ## ::: compileation :::
-    ## compile requirements file ------------------------------------
-    compiled_requirements: Path = compile_requirements(project_path, env_python_path_resolved, environment_type, uv_path)
-    ## cleanup old backups ------------------------------------------
-    remove_old_backups(project_path)
-    ## see if the new compile is different --------------------------
+    group: str = facts.get('group', lib_environment_checker.determine_group, project_path, project_email_addresses)
+
     compiled_comparator = CompiledComparator()
-    differences_found: bool = compiled_comparator.compare_with_previous_backup(
-        compiled_requirements, old_path=None, project_path=project_path
-    )
+    if resuming:
+        ## ::: resume the interrupted update :::
+        ## (its initial tests passed, and its compile differed) -----
+        compiled_requirements: Path = checkpoint.compiled_requirements
+        compiled_comparator.old_path = checkpoint.old_path
+        differences_found: bool = True
+    else:
+        ## ::: initial tests and compilation (run concurrently) :::
+        ## compile requirements file, while initial tests run --------
+        compiled_requirements: Path = run_initial_tests_and_compile(
+            uv_path, project_path, project_email_addresses, env_python_path_resolved, environment_type
+        )
+        ## archive old backups --------------------------------------
+        archive_old_backups(project_path)
+        ## see if the new compile is different ----------------------
+        differences_found: bool = compiled_comparator.compare_with_previous_backup(
+            compiled_requirements, old_path=None, project_path=project_path
+        )
+        lib_run_history.note_changes(compiled_comparator.old_path, compiled_requirements)
+        if not differences_found and compiled_comparator.old_path:
+            lib_backup_store.record_unchanged_backup(compiled_requirements)  # a pointer to the previous compile's body
+        if differences_found:
+            checkpoint.begin(run_id, compiled_requirements, compiled_comparator.old_path)  # journals each later phase
 
     ## ::: act on differences :::
+    update_rolled_back: bool = False
     if differences_found:
+        import lib_benchmarker  # imported here; see note at top
+
+        ## benchmark the current venv, if the project has benchmarks -
+        benchmark_settings: tuple[int, float, str] = lib_benchmarker.determine_benchmark_settings()
+        (benchmark_sample_count, benchmark_threshold, benchmark_action) = benchmark_settings
+        benchmark_before: dict = {}
+        if lib_benchmarker.find_benchmark_script(project_path) and not resuming:  # a resumed venv may be part-synced
+            benchmark_before = lib_benchmarker.run_benchmark_samples(project_path, benchmark_sample_count)
+        ## baseline the startup import-time, if there's none yet ----
+        if not resuming:
+            import lib_startup_profiler  # imported here; see note at top
+
+            lib_startup_profiler.capture_startup_baseline(project_path)
         ## since it's different, update the venv --------------------
-        sync_dependencies(project_path, compiled_requirements, uv_path)
+        precompile_stats: tuple[int, float] = checkpoint.run_phase(
+            'sync',
+            sync_dependencies,
+            project_path,
+            compiled_requirements,
+            uv_path,
+            lib_backup_store.find_active_backup(compiled_requirements.parent),  # what the venv is synced to now
+        )
+        log.debug(f'byte-compiled ``{precompile_stats[0]}`` files in ``{precompile_stats[1]:.2f}`` seconds')
+        ## benchmark the updated venv, and roll back if configured --
+        followup_benchmark_problems: None | str = checkpoint.results.get('benchmark')
+        if benchmark_before:
+            benchmark_after: dict = lib_benchmarker.run_benchmark_samples(project_path, benchmark_sample_count)
+            regressions: list[dict] = lib_benchmarker.compare_benchmarks(
+                benchmark_before, benchmark_after, benchmark_threshold
+            )
+            if regressions and benchmark_action == 'rollback' and compiled_comparator.old_path:
+                diff_text: str = compiled_comparator.make_diff_text(project_path)  # made before the new compile is discarded
+                roll_back_update(project_path, compiled_requirements, compiled_comparator.old_path, uv_path)
+                update_rolled_back = True
+                checkpoint.clear()
+            followup_benchmark_problems = lib_benchmarker.make_benchmark_report(regressions, update_rolled_back)
+            checkpoint.record('benchmark', followup_benchmark_problems)
+        if update_rolled_back:
+            followup_problems = {
+                'collectstatic_problems': None,
+                'copy_problems': None,
+                'test_problems': None,
+                'benchmark_problems': followup_benchmark_problems,
+                'timeout_problems': lib_process_runner.make_timeout_report(),
+            }
+            email_sent: bool = send_email_of_diffs(project_path, diff_text, followup_problems, project_email_addresses)
+            lib_run_history.note(outcome='rolled-back', email_status='sent' if email_sent else 'failed')
+
+    if differences_found and not update_rolled_back:
+        import lib_bisector  # imported here; see note at top
+        import lib_django_updater
+        import lib_startup_profiler
+        import lib_wheel_cache
+
+        ## (each phase is journaled; a resumed run skips those already done)
         ## mark new-compile as active -------------------------------
-        mark_active(compiled_requirements)
+        checkpoint.run_phase('mark_active', mark_active, compiled_requirements)
+        followup_notes: list[str] = [
+            f'Byte-compiled {precompile_stats[0]} changed files in {precompile_stats[1]:.1f} seconds before the restart.'
+        ]
+        ## warm up the restarted app, if configured -----------------
+        (followup_warmup_problems, warmup_report) = checkpoint.run_phase('warmup', warm_up_app, project_path)
+        if warmup_report:
+            followup_notes.append(warmup_report)
+        wheel_cache_report: None | str = lib_wheel_cache.make_report()  # None if not enabled, or on a resumed run
+        if wheel_cache_report:
+            followup_notes.append(wheel_cache_report)
         ## make diff ------------------------------------------------
-        diff_text: str = compiled_comparator.make_diff_text(project_path)
+        diff_text: str = checkpoint.run_phase('diff', compiled_comparator.make_diff_text, project_path)
         ## check for django update ----------------------------------
         followup_collectstatic_problems: None | str = None
         django_update: bool = lib_django_updater.check_for_django_update(diff_text)
         if django_update:
-            followup_collectstatic_problems = lib_django_updater.run_collectstatic(project_path)
+            followup_collectstatic_problems = checkpoint.run_phase(
+                'collectstatic', lib_django_updater.run_collectstatic, project_path
+            )
         ## copy new compile to codebase -----------------------------
         followup_copy_problems: None | str = None
-        followup_copy_problems = compiled_comparator.copy_new_compile_to_codebase(
-            compiled_requirements, project_path, environment_type
+        followup_copy_problems = checkpoint.run_phase(
+            'copy', compiled_comparator.copy_new_compile_to_codebase, compiled_requirements, project_path, environment_type
         )
         ## run post-update tests ------------------------------------
         followup_tests_problems: None | str = None
         if environment_type != 'production':
-            followup_tests_problems = run_followup_tests(uv_path, project_path, project_email_addresses)
+            followup_tests_problems = checkpoint.run_phase(
+                'followup_tests', run_followup_tests, uv_path, project_path, project_email_addresses
+            )
+            lib_run_history.note(test_outcome='followup-failed' if followup_tests_problems else 'followup-passed')
+        ## bisect a test-failure, if enabled ------------------------
+        followup_bisect_report: None | str = None
+        if followup_tests_problems and os.environ.get('SLFUPDTR__BISECT_ON_TEST_FAILURE', '').lower() == 'true':
+            followup_bisect_report = checkpoint.run_phase(
+                'bisect',
+                lib_bisector.run_bisect,
+                compiled_comparator.old_path,
+                compiled_requirements,
+                project_path,
+                env_python_path_resolved,
+                uv_path,
+            )
+        ## profile startup import-time ------------------------------
+        followup_startup_report: None | str = checkpoint.run_phase(
+            'startup_profile',
+            lib_startup_profiler.profile_startup,
+            project_path,
+            compiled_comparator.old_path,
+            compiled_requirements,
+        )
         ## send diff email ------------------------------------------
         followup_problems = {
             'collectstatic_problems': followup_collectstatic_problems,
             'copy_problems': followup_copy_problems,
             'test_problems': followup_tests_problems,
+            'bisect_report': followup_bisect_report,
+            'benchmark_problems': followup_benchmark_problems,
+            'startup_report': followup_startup_report,
+            'warmup_problems': followup_warmup_problems,
+            'timeout_problems': lib_process_runner.make_timeout_report(),
         }
-        log.debug(f'followup_problems, ``{followup_problems}``')
-        send_email_of_diffs(project_path, diff_text, followup_problems, project_email_addresses)
-        log.debug('email sent')
+        log.debug('followup_problems, ``%s``', followup_problems)
+        email_sent: bool = checkpoint.run_phase(
+            'email', send_email_of_diffs, project_path, diff_text, followup_problems, project_email_addresses, followup_notes
+        )
+        log.debug(f'email_sent, ``{email_sent}``')
+        lib_run_history.note(outcome='updated', email_status='sent' if email_sent else 'failed')
 
     ## ::: clean up :::
     ## update group and permissions ---------------------------------
     update_permissions(project_path, compiled_requirements, group)
+    checkpoint.clear()  # the update is finished
+    if not differences_found:
+        lib_run_history.note(outcome='no-changes')
     return
 
     ## end def manage_update() zz
 
 
+def set_up_settings_and_logging(project_path: str) -> None:
+    """
+    Loads the settings (the "outer-stuff" `.env`), and sets up logging into the "outer-stuff" `logs` directory,
+      to the project's own log-file.
+    Called by dundermain, before anything else; kept out of module-level so that importing this module has no side effects.
+    """
+    settings: lib_settings.Settings = lib_settings.get_settings()
+    settings.log_dir.mkdir(parents=True, exist_ok=True)  # creates the log-directory inside the stuff-directory if needed
+    log_file_path: Path = settings.log_dir / lib_logging.determine_log_name(project_path)
+    lib_logging.configure_logging(log_file_path)  # JSON-lines, written by a background thread; rotated and gzipped
+    return
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    """
+    Parses the command-line.
+    Called by dundermain.
+    """
+    parser = argparse.ArgumentParser(
+        description="Updates the project's dependencies.",
+        epilog='See usage instructions at: <https://github.com/Brown-University-Library/self_updater_code?tab=readme-ov-file#usage>',
+    )
+    parser.add_argument('project_path', help='path to the project code-directory')
+    parser.add_argument('--profile', action='store_true', help='profile the run; see lib_profiler.py')
+    parser.add_argument(
+        '--profile-phase',
+        action='append',
+        dest='profile_phases',
+        metavar='NAME',
+        help='only profile phases whose name contains NAME, ie `update_permissions` or `CompiledComparator` (repeatable)',
+    )
+    parser.add_argument('--profile-dir', type=Path, help='profile output-directory (default: "outer-stuff" `profiles/`)')
+    parser.add_argument('--profile-interval-ms', type=float, default=5.0, help='sampling interval (default: 5)')
+    return parser.parse_args(args)
+
+
 if __name__ == '__main__':
+    options: argparse.Namespace = parse_args(sys.argv[1:])  # first, so `--help` or a usage-error needs no `.env`
+    set_up_settings_and_logging(options.project_path)
     log.debug('\n\nstarting dundermain')
-    if len(sys.argv) != 2:
-        message: str = """
-        See usage instructions at:
-        <https://github.com/Brown-University-Library/self_updater_code?tab=readme-ov-file#usage>
-        """
-        message: str = message.replace('        ', '')  # removes indentation-spaces
-        print(message)
-        sys.exit(1)
-
-    project_path: str = sys.argv[1]
-    manage_update(project_path)
+
+    project_path: str = options.project_path
+    run_error: None | str = None
+    profiler = None
+    if options.profile or options.profile_phases:
+        import lib_profiler  # imported here; only needed when profiling
+
+        profiler = lib_profiler.SamplingProfiler(options.profile_interval_ms / 1000, options.profile_phases)
+        profiler.start()
+    try:
+        manage_update(project_path)
+    except lib_process_runner.ProcessTimeoutError as e:
+        ## a timeout that halted the update -- email the sys-admins -
+        log.exception('update halted by a timeout')
+        run_error = repr(e)
+        emailer = get_emailer(project_path)
+        email_message: str = emailer.create_setup_problem_message(str(e))
+        emailer.send_email(emailer.sys_admin_recipients, email_message)
+        raise
+    except BaseException as e:
+        run_error = repr(e)
+        raise
+    finally:
+        ## write the profile, if profiling -------------------------
+        if profiler:
+            profiler.stop()
+            profile_dir: Path = options.profile_dir or (
+                lib_settings.get_settings().stuff_dir / 'profiles' / datetime.now().strftime('%Y-%m-%dT%H-%M-%S')
+            )
+            profiler.write(profile_dir)
+            print(f'profile written to ``{profile_dir}``')
+        ## record per-phase resource-usage of the child-processes -
+        lib_process_runner.save_usage_history(Path(project_path).resolve())
+        ## record the run in the run-history database -------------
+        lib_run_history.save_run(Path(project_path).resolve(), run_error)
+        ## end the run's SMTP session, if one was opened -----------
+        close_emailers()
@@ -8,11 +8,32 @@
 Usage:
 
 uv run ./tests.py
+uv run ./tests.py --parallel  # splits the test-classes across one process per core; serial on a single core
+
+The tests are hermetic: git, `uv`, the hostname and the mail-server are local stand-ins (see the harness section),
+  so no network, real checkout, or mail-server is needed.
 """
 
+import atexit
+import email
+import gzip
+import json
 import logging
+import os
+import shutil
+import signal
+import socketserver
+import subprocess
 import sys
+import tempfile
+import threading
+import time
 import unittest
+import unittest.mock
+import urllib.error
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 ## set up logging ---------------------------------------------------
@@ -28,25 +49,231 @@ this_file_path = Path(__file__).resolve()
 stuff_dir = this_file_path.parent.parent
 sys.path.append(str(stuff_dir))
 from self_updater_code import (  # noqa: E402 (disables linter warning that this import is not at the top)
+    lib_backup_store,
+    lib_benchmarker,
+    lib_bisector,
+    lib_bytecode_compiler,
+    lib_call_runtests,
+    lib_checkpoint,
+    lib_churn_analytics,
+    lib_common,
     lib_django_updater,
+    lib_emailer,
+    lib_facts_cache,
     lib_git_handler,
+    lib_logging,
+    lib_process_runner,
+    lib_profiler,
+    lib_rollout,
+    lib_run_history,
+    lib_settings,
+    lib_startup_profiler,
+    lib_sync_planner,
+    lib_venv_dedup,
+    lib_warmup,
+    lib_wheel_cache,
 )
 from self_updater_code.lib_compilation_evaluator import CompiledComparator  # noqa: E402  (prevents linter problem-indicator)
 
+## ------------------------------------------------------------------
+## hermetic harness -- throwaway trees, a local git remote, fake `uv` and `hostname`, a local SMTP sink
+## ------------------------------------------------------------------
+
+GIT_ENV: dict = {
+    'GIT_AUTHOR_NAME': 'test',
+    'GIT_AUTHOR_EMAIL': 'test@example.com',
+    'GIT_COMMITTER_NAME': 'test',
+    'GIT_COMMITTER_EMAIL': 'test@example.com',
+    'GIT_CONFIG_GLOBAL': os.devnull,  # ignores the user's git-config
+    'GIT_CONFIG_NOSYSTEM': '1',
+}
+
+LOCKFILE_HEADER = '# This file was autogenerated by uv via the following command:\n#    uv pip compile (fake)\n'
+
+
+def run_git(args: list[str], cwd: Path) -> str:
+    result = subprocess.run(
+        ['git', *args], cwd=str(cwd), env={**os.environ, **GIT_ENV}, capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+def make_git_fixture(root: Path, files: dict, branch: str = 'main') -> tuple[Path, Path]:
+    """
+    Creates a bare "remote" and a clone of it holding `files` (relative-path -> text), committed and pushed.
+    Returns (clone_path, remote_path).
+    """
+    remote_path: Path = root / 'remote.git'
+    run_git(['init', '--quiet', '--bare', '--initial-branch=main', str(remote_path)], root)
+    clone_path: Path = root / 'site' / 'project_code'
+    clone_path.parent.mkdir(parents=True, exist_ok=True)
+    run_git(['clone', '--quiet', str(remote_path), str(clone_path)], root)
+    run_git(['checkout', '--quiet', '-B', 'main'], clone_path)
+    for relative_path, text in files.items():
+        (clone_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (clone_path / relative_path).write_text(text)
+    run_git(['add', '-A'], clone_path)
+    run_git(['commit', '--quiet', '-m', 'initial'], clone_path)
+    run_git(['push', '--quiet', '-u', 'origin', 'main'], clone_path)
+    if branch != 'main':
+        run_git(['checkout', '--quiet', '-b', branch], clone_path)
+    return (clone_path, remote_path)
+
+
+def write_script(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    path.chmod(0o755)
+    return
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP for smtplib.sendmail(); stores each message on the server.
+    """
+
+    def handle(self) -> None:
+        self.server.session_count += 1
+        self.wfile.write(b'220 sink\r\n')
+        recipients: list[str] = []
+        data_lines: list[str] | None = None
+        for raw_line in self.rfile:
+            line: str = raw_line.decode().rstrip('\r\n')
+            if data_lines is not None:
+                if line == '.':
+                    message = email.message_from_string('\n'.join(data_lines))
+                    parts: list = message.get_payload() if message.is_multipart() else [message]
+                    body: str = parts[0].get_payload(decode=True).decode()
+                    attachments: dict = {part.get_filename(): part.get_payload(decode=True) for part in parts[1:]}
+                    self.server.messages.append(
+                        {'to': recipients, 'subject': message['Subject'], 'body': body, 'attachments': attachments}
+                    )
+                    (recipients, data_lines) = ([], None)
+                    self.wfile.write(b'250 ok\r\n')
+                else:
+                    data_lines.append(line[1:] if line.startswith('..') else line)
+                continue
+            verb: str = line[:4].upper()
+            if verb == 'DATA':
+                data_lines = []
+                self.wfile.write(b'354 go ahead\r\n')
+            elif verb == 'QUIT':
+                self.wfile.write(b'221 bye\r\n')
+                return
+            else:
+                if verb == 'RCPT':
+                    recipients.append(line.split(':', 1)[1].strip())
+                self.wfile.write(b'250 ok\r\n')
+        return
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), SmtpSinkHandler)
+        self.messages: list[dict] = []
+        self.session_count: int = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class UpdaterTree:
+    """
+    A throwaway "outer-stuff" tree for a full self_updater.py run:
+    - `updater/` -- a copy of this code, with its `.env` pointing at the SMTP sink
+    - `site/` -- the project's "outer-stuff": its `.env`, `env/` (a python3 wrapper), `requirements_backups/`,
+        and `project_code/`, a git clone of the local bare `remote.git`
+    - `bin/` -- fake `uv` (pip compile writes the fixture lockfile; a `--dry-run` reports no changes; all commands
+        are recorded) and `hostname`
+    """
+
+    def __init__(self, root: Path, smtp_port: int, lockfile: str, previous_lockfile: str | None, **options) -> None:
+        self.root: Path = root
+        self.updater_code_path: Path = root / 'updater' / 'self_updater_code'
+        self.updater_code_path.mkdir(parents=True)
+        for py_path in this_file_path.parent.glob('*.py'):
+            shutil.copy2(py_path, self.updater_code_path)
+        (root / 'updater' / '.env').write_text(
+            f"SLFUPDTR__EMAIL_FROM='updater@example.com'\n"
+            f"SLFUPDTR__EMAIL_HOST='127.0.0.1'\n"
+            f"SLFUPDTR__EMAIL_HOST_PORT='{smtp_port}'\n"
+            f'SLFUPDTR__SYS_ADMIN_RECIPIENTS_JSON=\'[["sys admin", "sysadmin@example.com"]]\'\n'
+        )
+        ## fake commands --------------------------------------------
+        self.bin_path: Path = root / 'bin'
+        self.lockfile_path: Path = root / 'fixture_lockfile.txt'
+        self.lockfile_path.write_text(LOCKFILE_HEADER + lockfile)
+        self.uv_calls_path: Path = root / 'uv_calls.txt'
+        write_script(
+            self.bin_path / 'uv',
+            f'#!{sys.executable}\n'
+            f'import shutil, sys\n'
+            f'args = sys.argv[1:]\n'
+            f"open({str(self.uv_calls_path)!r}, 'a').write(' '.join(args) + '\\n')\n"
+            f"if args[:2] == ['pip', 'compile']:\n"
+            f"    shutil.copyfile({str(self.lockfile_path)!r}, args[args.index('--output-file') + 1])\n"
+            f"if '--dry-run' in args:\n"
+            f"    print('Would make no changes', file=sys.stderr)\n",
+        )
+        write_script(self.bin_path / 'hostname', '#!/bin/sh\necho localhost-test\n')
+        ## project "outer-stuff" ------------------------------------
+        site_path: Path = root / 'site'
+        site_path.mkdir()
+        (site_path / '.env').write_text('ADMINS_JSON=\'[["project admin", "admin@example.com"]]\'\n')
+        write_script(site_path / 'env' / 'bin' / 'python3', f'#!/bin/sh\nexec {sys.executable} "$@"\n')
+        self.backup_dir: Path = site_path / 'requirements_backups'
+        self.backup_dir.mkdir()
+        if previous_lockfile is not None:
+            (self.backup_dir / 'local_2020-01-01T00-00-00.txt').write_text(
+                '# ACTIVE\n' + LOCKFILE_HEADER + previous_lockfile
+            )
+        tests_exit_code: int = 0 if options.get('tests_pass', True) else 1
+        files: dict = {
+            '.gitignore': '__pycache__/\nconfig/tmp/restart.txt\n',
+            'config/__init__.py': '',
+            'config/wsgi.py': 'application = None\n',
+            'config/tmp/.gitkeep': '',
+            'requirements/local.in': 'requests\n',
+            'requirements/staging.in': 'requests\n',
+            'requirements/production.in': 'requests\n',
+            'requirements/local.txt': previous_lockfile or '',
+            'run_tests.py': f'import sys\nprint("ran tests")\nsys.exit({tests_exit_code})\n',
+        }
+        (self.project_path, self.remote_path) = make_git_fixture(root, files, options.get('branch', 'main'))
+
+    def run_self_updater(self) -> subprocess.CompletedProcess:
+        env: dict = {key: value for key, value in os.environ.items() if not key.startswith('SLFUPDTR__')}
+        env.update(GIT_ENV)
+        env['PATH'] = f'{self.bin_path}:{env["PATH"]}'
+        command: list[str] = [sys.executable, str(self.updater_code_path / 'self_updater.py'), str(self.project_path)]
+        return subprocess.run(command, cwd=str(self.root), env=env, capture_output=True, text=True, timeout=120)
+
+    def fetch_run_record(self) -> dict:
+        connection = lib_run_history.connect(self.root / 'updater' / 'run_history.sqlite3')
+        connection.row_factory = lib_run_history.sqlite3.Row
+        row = connection.execute('SELECT * FROM runs ORDER BY id DESC LIMIT 1').fetchone()
+        connection.close()
+        return dict(row)
+
 
 class TestGitCommands(unittest.TestCase):
     def setUp(self):
-        pass
+        self.temp_dir = tempfile.TemporaryDirectory()
+        (self.clone_path, self.remote_path) = make_git_fixture(Path(self.temp_dir.name), {'README.md': 'foo\n'})
+        self.git_env_patcher = unittest.mock.patch.dict('os.environ', GIT_ENV)
+        self.git_env_patcher.start()
 
     def tearDown(self):
-        pass
+        self.git_env_patcher.stop()
+        self.temp_dir.cleanup()
 
     def test_git_pull__A(self):
         """
         Checks that `Already up to date.` is detected properly.
-        Assumes current-project is, actually, already up-to-date.
+        Uses a fresh clone of a local bare remote, so it is, actually, already up-to-date.
         """
-        cur_dir = Path('./').resolve()
+        cur_dir = self.clone_path
         log.debug(f'cur_dir: {cur_dir}')
         git_result: tuple[bool, dict] = lib_git_handler.run_git_pull(cur_dir)
         (ok, output) = git_result
@@ -56,12 +283,12 @@ class TestGitCommands(unittest.TestCase):
     def test_git_status_clean(self):
         """
         Checks that `On branch main` is detected properly.
-        Assumes current-project is on branch `main`.
+        Uses a fresh clone, on branch `main`.
 
         Note: just looking for the word 'clean' because one version of git says "working tree clean"
             and another says "working directory clean". TODO: consider just checking the ok boolean.
         """
-        cur_dir = Path('./').resolve()
+        cur_dir = self.clone_path
         log.debug(f'cur_dir: {cur_dir}')
         git_result: tuple[bool, dict] = lib_git_handler.run_git_status(cur_dir)
         (ok, output) = git_result
@@ -71,9 +298,10 @@ class TestGitCommands(unittest.TestCase):
     def test_git_status_not_clean(self):
         """
         Checks that various non-"clean" states are detected properly.
-        Assumes current-project is on branch `main`.
+        Uses a fresh clone, on branch `main`, with a change not staged.
         """
-        target_dir = Path('../git_tests/check_changes_not_staged/').resolve()
+        target_dir = self.clone_path
+        (target_dir / 'README.md').write_text('changed\n')
         log.debug(f'cur_dir: {target_dir}')
         git_result: tuple[bool, dict] = lib_git_handler.run_git_status(target_dir)
         (ok, output) = git_result
@@ -121,6 +349,23 @@ class TestMiscellaneous(unittest.TestCase):
         result = lib_django_updater.check_for_django_update(incoming_text)
         self.assertEqual(expected, result)
 
+    def test_help__needs_no_settings(self):
+        """
+        Checks that `--help` prints usage without loading the `.env` or creating the log-directory.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            code_path = Path(temp_dir) / 'self_updater_code'
+            code_path.mkdir()
+            for py_path in this_file_path.parent.glob('*.py'):
+                shutil.copy2(py_path, code_path)
+            result = subprocess.run(
+                [sys.executable, str(code_path / 'self_updater.py'), '--help'], capture_output=True, text=True
+            )
+            logs_created = (Path(temp_dir) / 'logs').exists()
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertIn('usage:', result.stdout)
+        self.assertFalse(logs_created)
+
 
 class TestComparison(unittest.TestCase):
     def setUp(self):
@@ -170,5 +415,1466 @@ class TestComparison(unittest.TestCase):
         self.assertEqual(expected, change_check_result)
 
 
+class TestShardedTests(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_discover_test_modules(self):
+        """
+        Checks that test modules are found as dotted labels; that test-named helpers outside `tests` packages aren't;
+          and that env/hidden dirs are skipped.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir)
+            for relative_path in [
+                'foo_app/tests/test_views.py',
+                'foo_app/tests/utils.py',
+                'foo_app/test_settings.py',
+                'bar_app/tests.py',
+                'config/testing_utils.py',
+                'env/test_skip.py',
+                '.git/test_skip.py',
+            ]:
+                (project_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+                (project_path / relative_path).write_text('')
+            result = lib_call_runtests.discover_test_modules(project_path)
+        self.assertEqual(['bar_app.tests', 'foo_app.tests.test_views'], result)
+
+    def test_balance_shards(self):
+        """
+        Checks that slow modules are spread across shards, estimated from the previous run's per-shard timings,
+          and that unknown modules get the average estimate.
+        """
+        shard_timings = [{'modules': ['a'], 'seconds': 10.0}, {'modules': ['b', 'c'], 'seconds': 10.0}]
+        result = lib_call_runtests.balance_shards(['a', 'b', 'c', 'd'], shard_timings, 2)
+        self.assertEqual([['a', 'c'], ['d', 'b']], result)  # 'd' is estimated at the 6.67 average
+
+    def test_run_sharded_tests__one_process_per_shard(self):
+        """
+        Checks that each shard runs its modules in one process, with its own test-db suffix; and that the shards' results
+          are merged -- a failing shard fails the run -- and their run-times recorded per shard.
+        """
+        run_tests_code = (
+            'import os, sys\n'
+            'print(os.environ["SLFUPDTR__TEST_DB_SUFFIX"], *sys.argv[1:])\n'
+            'sys.exit(1 if "bar_app.tests" in sys.argv else 0)\n'
+        )
+        lib_process_runner.start_run_deadline(60)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'foo_project'
+            project_path.mkdir()
+            (project_path / 'run_tests.py').write_text(run_tests_code)
+            venv_bin_path = Path(temp_dir) / 'env' / 'bin'
+            venv_bin_path.mkdir(parents=True)
+            (venv_bin_path / 'python3').symlink_to(sys.executable)
+            modules = ['bar_app.tests', 'baz_app.tests', 'foo_app.tests.test_models', 'foo_app.tests.test_views']
+            (ok, output) = lib_call_runtests.run_sharded_tests(project_path, venv_bin_path, venv_bin_path.parent, modules, 2)
+            shard_timings = json.loads((Path(temp_dir) / 'self_updater_data' / 'test_shard_timings.json').read_text())
+        shard_lines = sorted(line for line in output['stdout'].splitlines() if line.startswith('_shard'))
+        self.assertEqual(
+            ['_shard0 bar_app.tests foo_app.tests.test_models', '_shard1 baz_app.tests foo_app.tests.test_views'],
+            shard_lines,
+        )
+        self.assertFalse(ok)
+        self.assertIn('## shard 0: bar_app.tests foo_app.tests.test_models -- FAILED', output['stdout'])
+        self.assertIn('## shard 1: baz_app.tests foo_app.tests.test_views -- ok', output['stdout'])
+        self.assertEqual(
+            [['bar_app.tests', 'foo_app.tests.test_models'], ['baz_app.tests', 'foo_app.tests.test_views']],
+            [shard['modules'] for shard in shard_timings],
+        )
+
+
+class TestBisector(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_parse_lockfile_and_find_changes(self):
+        """
+        Checks that comments are skipped, names are normalized, and changed packages are found.
+        """
+        old_text = '# header\nanyio==4.7.0\n    # via httpx\nDjango==4.2.17\nzope.interface==7.0\n'
+        new_text = '# header\nanyio==4.7.0\n    # via httpx\nDjango==4.2.18\nh11==0.14.0\n'
+        old_packages = lib_bisector.parse_lockfile(old_text)
+        new_packages = lib_bisector.parse_lockfile(new_text)
+        self.assertEqual(['anyio==4.7.0'], old_packages['anyio'])
+        self.assertEqual(['django', 'h11', 'zope-interface'], lib_bisector.find_changed_packages(old_packages, new_packages))
+        candidate = lib_bisector.build_candidate_lockfile(old_packages, new_packages, frozenset(['django']))
+        self.assertEqual('anyio==4.7.0\nDjango==4.2.18\nzope.interface==7.0\n', candidate)
+
+    def test_find_minimal_failing_changes(self):
+        """
+        Checks that delta-debugging narrows eight changes down to the two that, together, cause the failure.
+        """
+        changes = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+        result = lib_bisector.find_minimal_failing_changes(changes, lambda change_set: {'b', 'g'} <= change_set)
+        self.assertEqual(['b', 'g'], result)
+
+    def test_run_bisect__candidates_get_own_test_db(self):
+        """
+        Checks that each concurrently-tested candidate runs its tests with its own test-db suffix.
+        """
+        db_suffixes = []
+
+        def fake_run_candidate_tests(candidate_text, project_path, python_path, uv_path, db_suffix):
+            db_suffixes.append(db_suffix)
+            return 'bar==2.0' not in candidate_text  # ie the bar-update breaks the tests
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (old_path, new_path) = (Path(temp_dir) / 'old.txt', Path(temp_dir) / 'new.txt')
+            old_path.write_text('bar==1.0\nbaz==1.0\nfoo==1.0\nqux==1.0\n')
+            new_path.write_text('bar==2.0\nbaz==2.0\nfoo==2.0\nqux==2.0\n')
+            with unittest.mock.patch.object(lib_bisector, 'run_candidate_tests', side_effect=fake_run_candidate_tests):
+                report = lib_bisector.run_bisect(old_path, new_path, Path(temp_dir), '3.12', Path('uv'))
+        self.assertIn('bar==1.0  -->  bar==2.0', report)
+        self.assertGreater(len(db_suffixes), 2)
+        self.assertEqual(len(db_suffixes), len(set(db_suffixes)))
+
+
+class TestBenchmarker(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_compare_benchmarks__regression(self):
+        """
+        Checks that a consistent 50% slowdown is flagged, and that a noisy, overlapping metric is not.
+        """
+        before = {'home': [0.10, 0.11, 0.10, 0.12, 0.11], 'search': [0.20, 0.30, 0.25, 0.22, 0.28]}
+        after = {'home': [0.16, 0.15, 0.17, 0.16, 0.15], 'search': [0.21, 0.31, 0.24, 0.29, 0.27]}
+        regressions = lib_benchmarker.compare_benchmarks(before, after, threshold=0.10)
+        self.assertEqual(['home'], [regression['metric'] for regression in regressions])
+        self.assertAlmostEqual(1 / 252, regressions[0]['p_value'])  # exact p for complete separation with 5 and 5 samples
+
+    def test_parse_benchmark_output(self):
+        """
+        Checks that a JSON last-line is used, and that other output falls back to the wall-time.
+        """
+        self.assertEqual({'home': 0.5}, lib_benchmarker.parse_benchmark_output('warming up\n{"home": 0.5}\n', 2.0))
+        self.assertEqual({'wall_time': 2.0}, lib_benchmarker.parse_benchmark_output('all done\n', 2.0))
+        for stdout in ('{}\n', '[0.5]\n', '{"home": "fast"}\n', ''):
+            self.assertEqual({'wall_time': 2.0}, lib_benchmarker.parse_benchmark_output(stdout, 2.0), stdout)
+
+    def test_determine_benchmark_settings__invalid_values(self):
+        """
+        Checks that invalid envar values fall back to the defaults, rather than raising.
+        """
+        envars = {
+            'SLFUPDTR__BENCHMARK_SAMPLES': 'five',
+            'SLFUPDTR__BENCHMARK_THRESHOLD': '10%',
+            'SLFUPDTR__BENCHMARK_ACTION': 'revert',
+        }
+        with unittest.mock.patch.dict('os.environ', envars):
+            self.assertEqual((5, 0.10, 'report'), lib_benchmarker.determine_benchmark_settings())
+
+
+class TestStartupProfiler(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_parse_importtime_output(self):
+        """
+        Checks that the header is skipped and nested module-names are stripped.
+        """
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       245 |       1210 |   yaml.nodes\n'
+            'import time:      3000 |      90000 | config.wsgi\n'
+        )
+        expected = {'yaml.nodes': 1210, 'config.wsgi': 90000}
+        self.assertEqual(expected, lib_startup_profiler.parse_importtime_output(stderr))
+
+    def test_make_startup_report(self):
+        """
+        Checks that a regression is reported and attributed to the changed package providing the module.
+        """
+        previous = {'config.wsgi': 100_000, 'yaml': 10_000, 'django': 60_000}
+        current = {'config.wsgi': 300_000, 'yaml': 200_000, 'django': 61_000}
+        changed_packages = {'pyyaml': ('pyyaml==6.0.1', 'pyyaml==6.0.2')}
+        report = lib_startup_profiler.make_startup_report(
+            previous, current, 'config.wsgi', 50, changed_packages, {'yaml': ['pyyaml']}
+        )
+        self.assertIn('grew by 200 ms', report)
+        self.assertIn('- yaml: +190.0 ms (changed: pyyaml==6.0.1 --> pyyaml==6.0.2)', report)
+        self.assertIsNone(lib_startup_profiler.make_startup_report(previous, previous, 'config.wsgi', 50, {}, {}))
+
+    def test_capture_startup_baseline(self):
+        """
+        Checks that a baseline is measured and saved only when there are no saved import-times, ie on a first update.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'foo_project'
+            project_path.mkdir()
+            with unittest.mock.patch.object(
+                lib_startup_profiler, 'measure_import_times', return_value={'config.wsgi': 100_000}
+            ) as measure:
+                lib_startup_profiler.capture_startup_baseline(project_path)
+                lib_startup_profiler.capture_startup_baseline(project_path)  # already baselined
+            saved = json.loads((Path(temp_dir) / 'self_updater_data' / 'import_times.json').read_text())
+        self.assertEqual(1, measure.call_count)
+        self.assertEqual({'config.wsgi': 100_000}, saved)
+
+
+class TestBytecodeCompiler(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_find_and_precompile_changed_files(self):
+        """
+        Checks that only the files of newly-installed distributions are found, and that they get byte-compiled.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            venv_path = Path(temp_dir) / 'env'
+            site_packages = venv_path / 'lib' / 'python3.12' / 'site-packages'
+            for package, version in [('old_pkg', '1.0'), ('new_pkg', '2.0')]:
+                (site_packages / package).mkdir(parents=True)
+                (site_packages / package / '__init__.py').write_text('VALUE = 1\n')
+                dist_info = site_packages / f'{package}-{version}.dist-info'
+                dist_info.mkdir()
+                (dist_info / 'RECORD').write_text(f'{package}/__init__.py,sha256=abc,10\n{dist_info.name}/RECORD,,\n')
+                if package == 'old_pkg':
+                    dist_infos_before = lib_bytecode_compiler.snapshot_dist_infos(venv_path)
+            py_files = lib_bytecode_compiler.find_changed_py_files(venv_path, dist_infos_before)
+            self.assertEqual([(site_packages / 'new_pkg' / '__init__.py').resolve()], py_files)
+            venv_bin_path = venv_path / 'bin'
+            venv_bin_path.mkdir()
+            (venv_bin_path / 'python3').symlink_to(sys.executable)
+            (file_count, _elapsed) = lib_bytecode_compiler.precompile_files(venv_bin_path, py_files)
+            self.assertEqual(1, file_count)
+            self.assertTrue(list((site_packages / 'new_pkg' / '__pycache__').glob('__init__.*.pyc')))
+
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        """
+        Starts a local HTTP stand-in for the app: `/` returns 200, anything else returns 500.
+        """
+
+        class StandInHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200 if self.path == '/' else 500)
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_warm_up__ok(self):
+        """
+        Checks that a healthy app is ready, and latencies are measured.
+        """
+        stats = lib_warmup.warm_up([f'{self.base_url}/'], concurrency=2, rounds=4)
+        (problem_message, report) = lib_warmup.make_warmup_report(stats)
+        self.assertTrue(stats['ready'])
+        self.assertEqual((4, 0), (stats['request_count'], stats['failure_count']))
+        self.assertIsNone(problem_message)
+        self.assertIn('p95', report)
+
+    def test_warm_up__failing_page(self):
+        """
+        Checks that a failing page is reported as a problem, and that a down app is caught.
+        """
+        stats = lib_warmup.warm_up([f'{self.base_url}/', f'{self.base_url}/broken/'], rounds=2)
+        (problem_message, _report) = lib_warmup.make_warmup_report(stats)
+        self.assertEqual(2, stats['failure_count'])
+        self.assertIn('2 failed', problem_message)
+        stats = lib_warmup.warm_up([f'{self.base_url}/broken/'], ready_timeout=0.2)
+        self.assertFalse(stats['ready'])
+
+    def test_warm_up__from_restart_time(self):
+        """
+        Checks that the time-to-first-success is measured from the restart, not from the start of the warm-up.
+        """
+        stats = lib_warmup.warm_up([f'{self.base_url}/'], time.time() - 10, rounds=1)
+        self.assertGreaterEqual(stats['time_to_first_success'], 10)
+
+    def test_determine_warmup_urls__invalid(self):
+        """
+        Checks that an invalid warm-up setting is skipped, rather than halting the update.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'foo_project'
+            for raw in ('["http://127.0.0.1/foo/"', '"http://127.0.0.1/foo/"', '[1, 2]'):
+                (Path(temp_dir) / '.env').write_text(f"SLFUPDTR__WARMUP_URLS_JSON='{raw}'\n")
+                self.assertEqual([], lib_warmup.determine_warmup_urls(project_path), raw)
+            (Path(temp_dir) / '.env').write_text('SLFUPDTR__WARMUP_URLS_JSON=\'["http://127.0.0.1/foo/"]\'\n')
+            self.assertEqual(['http://127.0.0.1/foo/'], lib_warmup.determine_warmup_urls(project_path))
+
+    def test_determine_warmup_concurrency(self):
+        """
+        Checks that the concurrency comes from the envar, and that an invalid value falls back to the default.
+        """
+        with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__WARMUP_CONCURRENCY': '8'}):
+            self.assertEqual(8, lib_warmup.determine_warmup_concurrency())
+        with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__WARMUP_CONCURRENCY': 'lots'}):
+            self.assertEqual(4, lib_warmup.determine_warmup_concurrency())
+
+
+class TestProcessRunner(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_run__captures_output_and_rusage(self):
+        """
+        Checks that the runner behaves like subprocess.run(), and adds the child's resource-usage.
+        """
+        result = lib_process_runner.run(
+            [sys.executable, '-c', 'print(input())'], phase='checks', input='hello\n', capture_output=True, text=True
+        )
+        self.assertEqual((0, 'hello\n'), (result.returncode, result.stdout))
+        self.assertGreater(result.rusage.ru_maxrss, 0)
+        with self.assertRaises(subprocess.CalledProcessError):
+            lib_process_runner.run([sys.executable, '-c', 'raise SystemExit(3)'], phase='checks', check=True)
+
+    def test_run__invalid_low_impact_envars(self):
+        """
+        Checks that mistyped low-impact settings fall back to their defaults, rather than failing every child process.
+        """
+        envars = {'SLFUPDTR__NICENESS': 'ten', 'SLFUPDTR__RLIMIT_AS_MB': '2GB', 'SLFUPDTR__DUTY_CYCLE': 'half'}
+        with unittest.mock.patch.dict('os.environ', envars):
+            settings = lib_process_runner.determine_low_impact_settings()
+            result = lib_process_runner.run(['true'], phase='checks')
+        self.assertEqual((10, 0, 1.0), (settings['niceness'], settings['rlimit_as_mb'], settings['duty_cycle']))
+        self.assertEqual(0, result.returncode)
+
+    def test_run__timeout_kills_process_group(self):
+        """
+        Checks that an expired child, and its own child, are killed, and that the timeout is recorded.
+        """
+        lib_process_runner.start_run_deadline(60)
+        code = 'import subprocess, sys, time; subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"]); time.sleep(30)'
+        with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__PHASE_TIMEOUTS_JSON': '{"checks": 0.5}'}):
+            start = time.monotonic()
+            with self.assertRaises(lib_process_runner.ProcessTimeoutError) as context:
+                lib_process_runner.run([sys.executable, '-c', code], phase='checks', capture_output=True, text=True)
+        self.assertLess(time.monotonic() - start, 5)  # output-pipes closed promptly, so the grandchild was killed too
+        self.assertEqual('checks', context.exception.record['phase'])
+        self.assertIn('Timeout in phase ``checks``', lib_process_runner.make_timeout_report())
+        lib_process_runner.start_run_deadline(60)  # clears the recorded timeouts
+
+    def test_run__timeout_ok(self):
+        """
+        Checks that, with `timeout_ok`, a timeout is returned as a failed result carrying the timeout-description.
+        """
+        lib_process_runner.start_run_deadline(60)
+        code = 'import time; print("started", flush=True); time.sleep(30)'
+        with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__PHASE_TIMEOUTS_JSON': '{"git": 0.5}'}):
+            result = lib_process_runner.run(
+                [sys.executable, '-c', code], phase='git', capture_output=True, text=True, timeout_ok=True
+            )
+        self.assertEqual((-signal.SIGKILL, 'started\n'), (result.returncode, result.stdout))
+        self.assertIn('Timeout in phase ``git``', result.stderr)
+        lib_process_runner.start_run_deadline(60)  # clears the recorded timeouts
+
+    def test_determine_timeout__invalid_envars(self):
+        """
+        Checks that invalid phase-budgets, or an invalid run-deadline, fall back to the defaults.
+        """
+        lib_process_runner.start_run_deadline(24 * 60 * 60)  # so the phase-budgets are the smaller
+        for raw in ('{"tests": 3600', '[3600]', '{"tests": "an hour"}', '{"tests": -1}', '{"tests": true}'):
+            with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__PHASE_TIMEOUTS_JSON': raw}):
+                self.assertEqual(1800, lib_process_runner.determine_timeout('tests'), raw)
+        with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__PHASE_TIMEOUTS_JSON': '{"tests": 3600, "git": null}'}):
+            self.assertEqual(
+                (3600, 600), (lib_process_runner.determine_timeout('tests'), lib_process_runner.determine_timeout('compile'))
+            )
+        with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__RUN_DEADLINE_SECONDS': '4h'}):
+            lib_process_runner.start_run_deadline()
+        self.assertAlmostEqual(4 * 60 * 60, lib_process_runner.run_deadline - time.monotonic(), delta=5)
+        lib_process_runner.start_run_deadline(60)
+
+    def test_kill_process_group__finished(self):
+        """
+        Checks that the watchdog sends no signal once the child has finished, so a reused process-group can't be hit.
+        """
+        (expired, finished) = (threading.Event(), threading.Event())
+        finished.set()
+        with unittest.mock.patch('os.killpg') as killpg:
+            lib_process_runner.kill_process_group(12345, expired, finished)
+        killpg.assert_not_called()
+        self.assertFalse(expired.is_set())
+
+    def test_run__records_usage_by_phase(self):
+        """
+        Checks that children's resource-usage is totalled per phase, and appended to the history.
+        """
+        lib_process_runner.start_run_deadline(60)
+        for _ in range(2):
+            lib_process_runner.run([sys.executable, '-c', 'sum(range(10**6))'], phase='tests')
+        lib_process_runner.run(['true'], phase='git')
+        summary = lib_process_runner.summarize_usage()
+        self.assertEqual({'git': 1, 'tests': 2}, {phase: totals['children'] for phase, totals in summary.items()})
+        self.assertGreater(summary['tests']['user'] + summary['tests']['system'], 0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'foo_project'
+            project_path.mkdir()
+            lib_process_runner.save_usage_history(project_path)
+            history_lines = (Path(temp_dir) / 'self_updater_data' / 'resource_history.jsonl').read_text().splitlines()
+        self.assertEqual(1, len(history_lines))
+        self.assertIn('"project": "foo_project"', history_lines[0])
+
+    def test_save_usage_history__records_timeouts(self):
+        """
+        Checks that a timeout that didn't halt the run is saved with the usage-history, not only reported in the email.
+        """
+        lib_process_runner.start_run_deadline(60)
+        budgets = {'SLFUPDTR__PHASE_TIMEOUTS_JSON': '{"tests": 0.5}'}
+        with unittest.mock.patch.dict('os.environ', budgets), self.assertRaises(lib_process_runner.ProcessTimeoutError):
+            lib_process_runner.run([sys.executable, '-c', 'import time; time.sleep(30)'], phase='tests')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'foo_project'
+            project_path.mkdir()
+            lib_process_runner.save_usage_history(project_path)
+            history_lines = (Path(temp_dir) / 'self_updater_data' / 'resource_history.jsonl').read_text().splitlines()
+        entry = json.loads(history_lines[0])
+        self.assertEqual(['tests'], [record['phase'] for record in entry['timeouts']])
+        lib_process_runner.start_run_deadline(60)  # clears the recorded timeouts
+
+    def test_pause_for_duty_cycle(self):
+        """
+        Checks that a full duty-cycle never pauses, and that the pause is proportional to the busy-time.
+        """
+        self.assertEqual(0, lib_process_runner.pause_for_duty_cycle(5.0, 1.0))
+        self.assertAlmostEqual(0.03, lib_process_runner.pause_for_duty_cycle(0.01, 0.25))
+
+
+class TestRunHistory(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_save_run__and_queries(self):
+        """
+        Checks that a run's record, phase-timings and package-changes are saved, and that the queries summarize them.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            old_path = Path(temp_dir) / 'old.txt'
+            old_path.write_text('# compiled\ndjango==4.2.17\nrequests==2.32.3\n')
+            new_path = Path(temp_dir) / 'new.txt'
+            new_path.write_text('# ACTIVE\ndjango==4.2.18\nrequests==2.32.3\n')
+            db_path = Path(temp_dir) / 'run_history.sqlite3'
+            runner = lib_run_history.lib_process_runner  # the runner-module instance whose usage save_run() reads
+            runner.start_run_deadline(60)  # clears the per-phase usage
+            runner.run(['true'], phase='sync')
+            for outcome in ('updated', 'failed'):
+                lib_run_history.start_run()
+                lib_run_history.note_changes(old_path, new_path)
+                lib_run_history.note(outcome=outcome)
+                if outcome == 'updated':
+                    warmup = {'ready': True, 'time_to_first_success': 1.5, 'request_count': 10, 'failure_count': 0}
+                    lib_run_history.note(warmup={**warmup, 'p50': 0.05, 'p95': 0.2})
+                lib_run_history.save_run(Path(temp_dir) / 'foo_project', db_path=db_path)
+            connection = lib_run_history.connect(db_path)
+            churn = lib_run_history.query_package_churn(connection, days=30)
+            warmups = lib_run_history.query_warmup_latency(connection, days=30)
+            failure_rate = lib_run_history.query_failure_rate(connection, days=30)
+            phases = lib_run_history.query_slowest_phases(connection, days=30)
+            digest_count = connection.execute('SELECT COUNT(DISTINCT compile_digest) FROM runs').fetchone()[0]
+            connection.close()
+        self.assertEqual([('django', 2, 1)], churn)
+        self.assertEqual([('foo_project', 2, 1, 50.0)], failure_rate)
+        self.assertEqual(['sync'], [row[0] for row in phases])
+        self.assertEqual(1, digest_count)
+        self.assertEqual([('foo_project', 1, 0, 1500.0, 50.0, 200.0)], warmups)
+
+
+class TestLogging(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_json_lines_formatter__truncates_to_artifact(self):
+        """
+        Checks that a record becomes a JSON line with its run-id, and that an over-long message is moved to an artifact.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            formatter = lib_logging.JsonLinesFormatter(Path(temp_dir) / 'artifacts', max_message_chars=20)
+            record = logging.LogRecord('foo', logging.DEBUG, __file__, 1, 'result: %s', ('x' * 100,), None)
+            record.run_id = 'abc123'
+            entry = json.loads(formatter.format(record))
+            artifacts = list((Path(temp_dir) / 'artifacts').iterdir())
+            with gzip.open(artifacts[0], 'rt') as f:
+                artifact_text = f.read()
+        self.assertEqual('abc123', entry['run_id'])
+        self.assertTrue(entry['message'].startswith('result: xxxxxxxxxxxx ... [truncated 108 chars'))
+        self.assertEqual(f'result: {"x" * 100}', artifact_text)
+
+    def test_gzip_rotator(self):
+        """
+        Checks that a rotated log is replaced by its gzipped copy.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = Path(temp_dir) / 'self_updater__foo_project.log.1'
+            source.write_text('{"message": "foo"}\n')
+            lib_logging.gzip_rotator(str(source), f'{source}.gz')
+            with gzip.open(f'{source}.gz', 'rt') as f:
+                self.assertEqual('{"message": "foo"}\n', f.read())
+            self.assertFalse(source.exists())
+
+    def test_configure_logging__invalid_envars(self):
+        """
+        Checks that mistyped logging settings fall back to their defaults, rather than stopping the updater at startup.
+        """
+        envars = {'SLFUPDTR__LOG_MAX_BYTES': '10MB', 'SLFUPDTR__LOG_BACKUP_COUNT': 'ten', 'SLFUPDTR__LOG_ARTIFACTS_KEEP': ''}
+        root_logger = logging.getLogger()
+        (level, handlers) = (root_logger.level, list(root_logger.handlers))
+        with tempfile.TemporaryDirectory() as temp_dir, unittest.mock.patch.dict('os.environ', envars):
+            listener = lib_logging.configure_logging(Path(temp_dir) / 'self_updater__foo_project.log')
+            listener.stop()
+            listener.handlers[0].close()
+            atexit.unregister(listener.stop)
+            root_logger.handlers[:] = handlers
+            root_logger.setLevel(level)
+        file_handler = listener.handlers[0]
+        self.assertEqual((10 * 1024 * 1024, 10), (file_handler.maxBytes, file_handler.backupCount))
+
+    def test_determine_log_name(self):
+        """
+        Checks that each project's runs log to their own file, so parallel runs never rotate the same log.
+        """
+        self.assertEqual('self_updater__foo_project.log', lib_logging.determine_log_name('/srv/foo_stuff/foo_project/'))
+        self.assertNotEqual(
+            lib_logging.determine_log_name('/srv/foo_stuff/foo_project'),
+            lib_logging.determine_log_name('/srv/bar_stuff/bar_project'),
+        )
+
+
+class TestSettings(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_settings__missing_dotenv(self):
+        """
+        Checks that settings fail clearly, when first loaded, if the "outer-stuff" `.env` is missing.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir, self.assertRaises(Exception) as context:
+            lib_settings.Settings(Path(temp_dir))
+        self.assertIn('file does not exist', str(context.exception))
+
+    def test_import__no_side_effects(self):
+        """
+        Checks that importing the entry point loads neither the `.env` nor the settings.
+        """
+        code = 'import os, sys, self_updater; sys.exit(any(key.startswith("SLFUPDTR__") for key in os.environ))'
+        env = {key: value for key, value in os.environ.items() if not key.startswith('SLFUPDTR__')}
+        result = subprocess.run([sys.executable, '-c', code], cwd=str(this_file_path.parent), env=env)
+        self.assertEqual(0, result.returncode)
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_sampling_profiler__phases_and_filter(self):
+        """
+        Checks that samples are attributed to manage_update()'s phases, written as collapsed stacks, and filterable.
+        """
+
+        def slow_phase():
+            time.sleep(0.2)
+
+        def other_phase():
+            time.sleep(0.1)
+
+        def manage_update():
+            slow_phase()
+            other_phase()
+
+        for phase_filters, expected_phases in ((None, 2), (['slow_phase'], 1)):
+            profiler = lib_profiler.SamplingProfiler(interval=0.005, phase_filters=phase_filters)
+            profiler.start()
+            manage_update()
+            profiler.stop()
+            self.assertEqual(expected_phases, len(profiler.samples))
+            with tempfile.TemporaryDirectory() as temp_dir:
+                profiler.write(Path(temp_dir))
+                combined_lines = (Path(temp_dir) / 'combined.folded').read_text().splitlines()
+                summary = (Path(temp_dir) / 'summary.txt').read_text()
+            self.assertTrue(all(line.startswith('manage_update;') for line in combined_lines))
+            self.assertTrue(any(line.rsplit(' ', 1)[0].endswith('.slow_phase') for line in combined_lines))
+            self.assertIn('slow_phase', summary.splitlines()[-1 if phase_filters else 1])
+
+    def test_determine_phase__journaled_phase(self):
+        """
+        Checks that a phase run through the checkpoint's run_phase() is attributed to the phase's function.
+        """
+
+        def sync_dependencies():
+            time.sleep(0.2)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            checkpoint = lib_checkpoint.Checkpoint(Path(temp_dir) / 'project_code')
+
+            def manage_update():
+                checkpoint.run_phase('sync', sync_dependencies)
+
+            profiler = lib_profiler.SamplingProfiler(interval=0.005, phase_filters=['sync_dependencies'])
+            profiler.start()
+            manage_update()
+            profiler.stop()
+        phases = [phase.rsplit('.', 1)[-1] for phase in profiler.samples]  # may include the journal-writes, too
+        self.assertIn('sync_dependencies', phases)
+        self.assertNotIn('run_phase', phases)
+
+    def test_determine_phase__facts_cache_discovery(self):
+        """
+        Checks that a discovery run through the facts-cache's get() is attributed to the discovery function.
+        """
+
+        def determine_group():
+            time.sleep(0.2)
+            return 'staff'
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'project_code'
+            project_path.mkdir()
+            facts = lib_facts_cache.FactsCache(project_path)
+
+            def manage_update():
+                facts.get('group', determine_group)
+
+            profiler = lib_profiler.SamplingProfiler(interval=0.005)
+            profiler.start()
+            manage_update()
+            profiler.stop()
+        phases = [phase.rsplit('.', 1)[-1] for phase in profiler.samples]  # may include the cache-write, too
+        self.assertIn('determine_group', phases)
+        self.assertNotIn('get', phases)
+
+
+class TestSyncPlanner(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_plan_sync(self):
+        """
+        Checks that the plan removes dropped packages, and installs only added or changed pins (all their lines).
+        """
+        old_text = LOCKFILE_HEADER + 'django==4.2.17\n    # via foo\nidna==3.10\nrequests==2.32.3\nsix==1.16.0\n'
+        new_text = (
+            LOCKFILE_HEADER
+            + 'django==4.2.18\nidna==3.10\nrequests==2.32.3\n'
+            + "tzdata==2025.1 ; sys_platform == 'win32'\ntzdata==2024.2 ; sys_platform != 'win32'\n"
+        )
+        (removals, installs) = lib_sync_planner.plan_sync(old_text, new_text)
+        self.assertEqual(['six'], removals)
+        self.assertEqual(
+            ['django==4.2.18', "tzdata==2025.1 ; sys_platform == 'win32'", "tzdata==2024.2 ; sys_platform != 'win32'"],
+            installs,
+        )
+
+    def test_plan_sync__not_plannable(self):
+        """
+        Checks that editable/option lines and hash-continuations aren't planned as a delta.
+        """
+        self.assertIsNone(lib_sync_planner.plan_sync('requests==2.32.3\n', '-e ./vendored/foo\nrequests==2.32.3\n'))
+        self.assertIsNone(lib_sync_planner.plan_sync('requests==2.32.3\n', 'requests==2.32.4 \\\n    --hash=sha256:abc\n'))
+
+
+class TestWheelCache(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_is_compatible_wheel(self):
+        """
+        Checks wheel-tags against a CPython 3.12 linux x86_64 interpreter.
+        """
+        for filename, expected in (
+            ('six-1.17.0-py2.py3-none-any.whl', True),
+            ('lxml-5.3.0-cp312-cp312-manylinux_2_17_x86_64.manylinux2014_x86_64.whl', True),
+            ('cryptography-44.0.0-cp39-abi3-manylinux_2_28_x86_64.whl', True),
+            ('lxml-5.3.0-cp312-cp312-manylinux_2_17_aarch64.whl', False),
+            ('lxml-5.3.0-cp311-cp311-manylinux_2_17_x86_64.whl', False),
+            ('lxml-5.3.0-cp312-cp312-win_amd64.whl', False),
+        ):
+            self.assertEqual(expected, lib_wheel_cache.is_compatible_wheel(filename, 'cp312', 'linux_x86_64'), filename)
+
+    def test_prebuild_wheels__builds_sdist_only_pins_then_hits(self):
+        """
+        Checks that only sdist-only pins are built, statuses are cached (so a second run is all hits, with no index
+          lookups), and marker-pins are skipped.
+        """
+        (abi, platform) = lib_wheel_cache.determine_tags(sys.executable)
+        index_files = {
+            'six': [{'filename': 'six-1.17.0-py2.py3-none-any.whl', 'url': 'https://example.com/six.whl'}],
+            'foo-bar': [{'filename': 'foo_bar-1.0.tar.gz', 'url': 'https://example.com/foo_bar-1.0.tar.gz'}],
+        }
+        lookups = []
+
+        def fake_fetch_index_files(name, index_url):
+            lookups.append(name)
+            return index_files[name]
+
+        def fake_build_wheel(uv_path, python_path, sdist_url, tag_dir):
+            wheel_name = f'foo_bar-1.0-{abi}-{abi}-{platform}.whl'
+            (tag_dir / wheel_name).write_text('')
+            return wheel_name
+
+        lockfile_text = LOCKFILE_HEADER + "foo-bar==1.0\nsix==1.17.0\npywin32==308 ; sys_platform == 'win32'\n"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            lockfile_path = Path(temp_dir) / 'local.txt'
+            lockfile_path.write_text(lockfile_text)
+            cache_dir = Path(temp_dir) / 'wheel_cache'
+            fetch_patch = unittest.mock.patch.object(lib_wheel_cache, 'fetch_index_files', fake_fetch_index_files)
+            build_patch = unittest.mock.patch.object(lib_wheel_cache, 'build_wheel', fake_build_wheel)
+            with fetch_patch, build_patch:
+                first_stats = lib_wheel_cache.prebuild_wheels(lockfile_path, Path('uv'), sys.executable, cache_dir)
+                second_stats = lib_wheel_cache.prebuild_wheels(lockfile_path, Path('uv'), sys.executable, cache_dir)
+                report = lib_wheel_cache.make_report()
+            wheels = [path.name for path in (cache_dir / f'{abi}-{platform}').glob('*.whl')]
+        self.assertEqual({'misses': 2, 'built': 1, 'index-wheel': 1}, first_stats)
+        self.assertEqual({'hits': 2}, second_stats)
+        self.assertEqual(['foo-bar', 'six'], sorted(lookups))  # once each
+        self.assertEqual([f'foo_bar-1.0-{abi}-{abi}-{platform}.whl'], wheels)
+        self.assertEqual('Wheel cache: 100% hit rate (2 of 2 pins); built 0, failed 0.', report)
+
+    def test_process_pin__download_error_is_retried(self):
+        """
+        Checks that a download-error isn't recorded (so the next run retries the pin), but a failed build is.
+        """
+        (abi, platform) = lib_wheel_cache.determine_tags(sys.executable)
+        sdist_files = [{'filename': 'foo_bar-1.0.tar.gz', 'url': 'https://example.com/foo_bar-1.0.tar.gz'}]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tag_dir = Path(temp_dir) / f'{abi}-{platform}'
+            (tag_dir / 'keys').mkdir(parents=True)
+            fetch_patch = unittest.mock.patch.object(lib_wheel_cache, 'fetch_index_files', return_value=sdist_files)
+            statuses = []
+            for error in (urllib.error.URLError('timed out'), subprocess.CalledProcessError(1, ['uv', 'build'])):
+                build_patch = unittest.mock.patch.object(lib_wheel_cache, 'build_wheel', side_effect=error)
+                with fetch_patch, build_patch:
+                    status = lib_wheel_cache.process_pin(
+                        ('foo-bar', '1.0'), (abi, platform), tag_dir, Path('uv'), sys.executable, 'https://example.com'
+                    )
+                statuses.append((status, (tag_dir / 'keys' / 'foo-bar==1.0.json').exists()))
+        self.assertEqual([('unknown', False), ('failed', True)], statuses)
+
+
+class TestVenvDedup(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def make_venv(self, root: Path, project: str, files: dict) -> Path:
+        site_packages = root / project / 'env' / 'lib' / 'python3.12' / 'site-packages'
+        for relative_path, text in files.items():
+            (site_packages / relative_path).parent.mkdir(parents=True, exist_ok=True)
+            (site_packages / relative_path).write_text(text)
+        return root / project / 'env'
+
+    def test_find_summarize_and_consolidate(self):
+        """
+        Checks that identical files across venvs are grouped, reported, hardlinked to the store, and then not reported;
+          and that stored files unused by any venv are pruned.
+        """
+        shared = {'django/__init__.py': 'x' * 5000, 'django/db.py': 'y' * 3000}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            venv_a = self.make_venv(root, 'project_a', {**shared, 'foo/__init__.py': 'a' * 5000})
+            venv_b = self.make_venv(root, 'project_b', {**shared, 'foo/__init__.py': 'b' * 5000})
+            venv_c = self.make_venv(root, 'project_c', {'django/__init__.py': 'x' * 5000})
+            scanned_at_ns = time.time_ns()
+            groups = lib_venv_dedup.find_duplicate_groups([venv_a, venv_b, venv_c], min_size=1024)
+            summary = lib_venv_dedup.summarize(groups)
+            counts = lib_venv_dedup.consolidate(groups, root / 'venv_store', scanned_at_ns)
+            inodes = {
+                (venv / 'lib/python3.12/site-packages/django/__init__.py').stat().st_ino for venv in (venv_a, venv_b, venv_c)
+            }
+            text_after = (venv_b / 'lib/python3.12/site-packages/django/db.py').read_text()
+            groups_after = lib_venv_dedup.find_duplicate_groups([venv_a, venv_b, venv_c], min_size=1024)
+            shutil.rmtree(venv_b)
+            shutil.rmtree(venv_c)
+            pruned_while_linked = lib_venv_dedup.prune_store(root / 'venv_store')  # project_a still links both
+            shutil.rmtree(venv_a)
+            pruned = lib_venv_dedup.prune_store(root / 'venv_store')
+        self.assertEqual(2, summary['groups'])  # the differing `foo` files aren't grouped
+        self.assertEqual(3, summary['extra_copies'])
+        self.assertEqual(2 * 5000 + 3000, summary['memory_bytes'])
+        self.assertEqual('django', summary['top_packages'][0][0])
+        self.assertEqual({'linked': 3, 'skipped': 0}, counts)
+        self.assertEqual(1, len(inodes))
+        self.assertEqual('y' * 3000, text_after)
+        self.assertEqual({}, groups_after)
+        self.assertEqual((0, 2), (pruned_while_linked, pruned))
+
+    def test_consolidate__skips_files_replaced_since_scan(self):
+        """
+        Checks that a copy replaced after the scan -- same size, mtime preserved -- is left alone, not linked over.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            venv_a = self.make_venv(root, 'project_a', {'django/__init__.py': 'x' * 5000})
+            venv_b = self.make_venv(root, 'project_b', {'django/__init__.py': 'x' * 5000})
+            scanned_at_ns = time.time_ns()
+            groups = lib_venv_dedup.find_duplicate_groups([venv_a, venv_b], min_size=1024)
+            replaced_path = venv_b / 'lib/python3.12/site-packages/django/__init__.py'
+            old_stat = replaced_path.stat()
+            new_path = replaced_path.with_name('new.tmp')
+            new_path.write_text('z' * 5000)  # ie uv upgrading the package, with the wheel's mtime
+            os.utime(new_path, ns=(old_stat.st_atime_ns, old_stat.st_mtime_ns))
+            os.replace(new_path, replaced_path)
+            counts = lib_venv_dedup.consolidate(groups, root / 'venv_store', scanned_at_ns)
+            text_after = replaced_path.read_text()
+        self.assertEqual({'linked': 0, 'skipped': 1}, counts)
+        self.assertEqual('z' * 5000, text_after)
+
+
+class TestBackupStore(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def write_backups(self, backup_dir: Path, bodies: list[str]) -> list[Path]:
+        paths = []
+        for day, body in enumerate(bodies, start=1):
+            path = backup_dir / f'local_2025-01-{day:02d}T02-00-00.txt'
+            path.write_text(f'{LOCKFILE_HEADER}#    -o {path.name}\n{body}')
+            paths.append(path)
+        return paths
+
+    def test_archive_old_backups__dedups_and_reads_back(self):
+        """
+        Checks that older backups are packed into the archive once per distinct body, and read back by name.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backup_dir = Path(temp_dir)
+            bodies = ['requests==2.32.3\n', 'requests==2.32.3\n', 'requests==2.32.4\n', 'requests==2.32.5\n']
+            paths = self.write_backups(backup_dir, bodies)
+            lib_backup_store.archive_old_backups(backup_dir, keep_loose=1)
+            with zipfile.ZipFile(backup_dir / lib_backup_store.ARCHIVE_NAME) as archive:
+                member_count = len(archive.namelist())
+            loose = [path.name for path in lib_backup_store.find_recent_backups(backup_dir, count=None)]
+            second_text = lib_backup_store.read_backup(backup_dir, paths[1].stem)
+            newest_text = lib_backup_store.read_backup(backup_dir, paths[3].stem)
+        self.assertEqual(2, member_count)  # two distinct bodies among the three packed backups
+        self.assertEqual([paths[3].name], loose)
+        self.assertTrue(second_text.endswith('requests==2.32.3\n'))
+        self.assertTrue(newest_text.endswith('requests==2.32.5\n'))
+
+    def test_record_unchanged_backup__pointer(self):
+        """
+        Checks that an unchanged compile is kept as a pointer only, readable through the previous compile's body.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backup_dir = Path(temp_dir)
+            (previous_path, unchanged_path) = self.write_backups(backup_dir, ['requests==2.32.3\n', 'requests==2.32.3\n'])
+            lib_backup_store.record_backup(previous_path)
+            lib_backup_store.record_unchanged_backup(unchanged_path)
+            entries = lib_backup_store.load_index(backup_dir)
+            unchanged_text = lib_backup_store.read_backup(backup_dir, unchanged_path.stem)
+            unchanged_exists = unchanged_path.exists()
+        self.assertFalse(unchanged_exists)
+        self.assertEqual(1, len({entry['digest'] for entry in entries}))
+        self.assertTrue(unchanged_text.endswith('requests==2.32.3\n'))
+
+    def test_mark_active__symlink_and_legacy_marker(self):
+        """
+        Checks that the active backup is found from a legacy `# ACTIVE` marker, then from the symlink once marked,
+          and that archiving leaves the active backup loose.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backup_dir = Path(temp_dir)
+            paths = self.write_backups(backup_dir, ['requests==2.32.3\n', 'requests==2.32.4\n', 'requests==2.32.5\n'])
+            paths[0].write_text('# ACTIVE\n' + paths[0].read_text())
+            legacy_active = lib_backup_store.find_active_backup(backup_dir)
+            lib_backup_store.mark_active(paths[1])
+            lib_backup_store.mark_active(paths[1])  # re-marking replaces the link
+            active = lib_backup_store.find_active_backup(backup_dir)
+            lib_backup_store.archive_old_backups(backup_dir, keep_loose=1)
+            loose = lib_backup_store.find_recent_backups(backup_dir, count=None)
+        self.assertEqual(paths[0], legacy_active)
+        self.assertEqual(paths[1], active)
+        self.assertEqual([paths[2], paths[1]], loose)
+
+    def test_apply_retention__count(self):
+        """
+        Checks that retention drops the oldest archived entries, and their no-longer-referenced archive-members.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backup_dir = Path(temp_dir)
+            bodies = ['requests==2.32.1\n', 'requests==2.32.2\n', 'requests==2.32.3\n', 'requests==2.32.4\n']
+            paths = self.write_backups(backup_dir, bodies)
+            with unittest.mock.patch.dict(os.environ, {'SLFUPDTR__BACKUP_RETENTION_COUNT': '2'}):
+                lib_backup_store.archive_old_backups(backup_dir, keep_loose=1)
+            names = [entry['name'] for entry in lib_backup_store.load_index(backup_dir)]
+            with zipfile.ZipFile(backup_dir / lib_backup_store.ARCHIVE_NAME) as archive:
+                member_count = len(archive.namelist())
+            with self.assertRaises(KeyError):
+                lib_backup_store.read_backup(backup_dir, paths[0].stem)
+        self.assertEqual([paths[1].stem, paths[2].stem], names)  # the loose newest isn't indexed; it predates the index
+        self.assertEqual(2, member_count)
+
+    def test_apply_retention__old_active_backup(self):
+        """
+        Checks that an old `active` backup (ie after a rollback), kept loose, doesn't stop retention of newer entries.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backup_dir = Path(temp_dir)
+            paths = self.write_backups(backup_dir, [f'requests==2.32.{i}\n' for i in range(5)])
+            for path in paths:
+                lib_backup_store.record_backup(path)
+            lib_backup_store.mark_active(paths[0])
+            with unittest.mock.patch.dict(os.environ, {'SLFUPDTR__BACKUP_RETENTION_COUNT': '2'}):
+                lib_backup_store.archive_old_backups(backup_dir, keep_loose=1)
+            names = [entry['name'] for entry in lib_backup_store.load_index(backup_dir)]
+        self.assertEqual([paths[0].stem, paths[4].stem], names)
+
+    def test_archive_old_backups__interrupted(self):
+        """
+        Checks that packing interrupted part-way leaves the previous archive readable, and the loose backups in place.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backup_dir = Path(temp_dir)
+            paths = self.write_backups(backup_dir, [f'requests==2.32.{i}\n' for i in range(4)])
+            lib_backup_store.archive_old_backups(backup_dir, keep_loose=3)  # archives the oldest
+            real_body_digest = lib_backup_store.body_digest
+            calls = []
+
+            def failing_body_digest(text: str) -> str:
+                calls.append(text)
+                if len(calls) == 2:
+                    raise OSError('killed part-way')
+                return real_body_digest(text)
+
+            digest_patch = unittest.mock.patch.object(lib_backup_store, 'body_digest', failing_body_digest)
+            with digest_patch, self.assertRaises(OSError):
+                lib_backup_store.archive_old_backups(backup_dir, keep_loose=1)
+            loose_exist = [path.exists() for path in paths[1:]]
+            oldest_text = lib_backup_store.read_backup(backup_dir, paths[0].stem)
+        self.assertEqual([True, True, True], loose_exist)
+        self.assertTrue(oldest_text.endswith('requests==2.32.0\n'))
+
+
+class TestChurnAnalytics(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def write_history(self, project_dir: Path, bodies: dict[int, str]) -> None:
+        backup_dir = project_dir / 'requirements_backups'
+        backup_dir.mkdir(parents=True)
+        for day, body in bodies.items():
+            path = backup_dir / f'local_2025-01-{day:02d}T02-00-00.txt'
+            path.write_text(f'{LOCKFILE_HEADER}#    -o {path.name}\n{body}')
+        return
+
+    def test_scan_and_compute(self):
+        """
+        Checks that archived and loose backups across projects are scanned (each distinct body parsed once),
+          and that churn, pin-durations and update-causes (via the `# via` lines) are computed from them.
+        """
+        via_base = '    # via -r requirements/base.in\n'
+        (django_50, django_51) = (f'django==5.0\n{via_base}', f'django==5.1\n{via_base}')
+        (asgiref_37, asgiref_38) = ('asgiref==3.7\n    # via\n    #   django\n', 'asgiref==3.8\n    # via django\n')
+        (requests_3, requests_4) = (f'requests==2.32.3\n{via_base}', f'requests==2.32.4\n{via_base}')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            self.write_history(
+                root / 'project_a',
+                {
+                    1: asgiref_37 + django_50 + requests_3,
+                    2: asgiref_37 + django_50 + requests_3,
+                    3: asgiref_38 + django_50 + requests_3,
+                    4: asgiref_38 + django_51 + requests_4,
+                },
+            )
+            lib_backup_store.archive_old_backups(root / 'project_a' / 'requirements_backups', keep_loose=1)
+            self.write_history(root / 'project_b', {1: requests_3, 3: requests_4})
+            project_paths = [root / 'project_a' / 'project_code', root / 'project_b' / 'project_code']
+            (table, stats) = lib_churn_analytics.scan_projects(project_paths)
+        churn = lib_churn_analytics.compute_churn(table)
+        causes = lib_churn_analytics.compute_update_causes(table)
+        report = lib_churn_analytics.make_report(table, stats)
+        self.assertEqual((6, 5, 2, 3), (stats['snapshots'], stats['parsed'], stats['series'], stats['packages']))
+        self.assertEqual(
+            [('requests', 2, 2, 12.0, 2.5, 3.0), ('asgiref', 1, 1, 10.0, 2.0, 2.0), ('django', 1, 1, 10.0, 3.0, 3.0)], churn
+        )
+        self.assertEqual([('django', 2, 2), ('requests', 2, 1)], causes)  # asgiref's change counts for django
+        self.assertIn('most-changed packages:', report)
+
+
+class TestRollout(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_determine_wave_size(self):
+        """
+        Checks that waves widen to fit slow updates into the window, within max-parallel and double the previous wave.
+        """
+        self.assertEqual(1, lib_rollout.determine_wave_size([5.0], 4, 7200, max_parallel=4, previous_size=1))
+        self.assertEqual(2, lib_rollout.determine_wave_size([3000.0], 4, 7200, max_parallel=4, previous_size=1))
+        self.assertEqual(4, lib_rollout.determine_wave_size([3000.0], 8, 6000, max_parallel=4, previous_size=2))
+
+    def test_roll_out__halts_at_first_problem(self):
+        """
+        Checks that the canary is updated and soaked first, then the rest in waves, until a run's followup tests fail.
+        """
+        lock = threading.Lock()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / 'run_history.sqlite3'
+            project_paths = [Path(temp_dir) / f'project_{letter}_code' for letter in 'abcde']
+
+            def fake_runner(project_path: Path) -> dict:
+                with lock:
+                    lib_run_history.start_run()
+                    failed = project_path.name == 'project_d_code'
+                    lib_run_history.note(outcome='updated', test_outcome='followup-failed' if failed else 'followup-passed')
+                    lib_run_history.save_run(project_path, db_path=db_path)
+                return {'returncode': 0, 'seconds': 5.0, 'output_tail': ''}
+
+            sleeps = []
+            settings = {'soak_minutes': 1, 'window_minutes': 120, 'max_parallel': 2}
+            rollout = lib_rollout.roll_out(
+                project_paths, project_paths[:1], settings, fake_runner, lambda path: None, sleeps.append, db_path
+            )
+        self.assertEqual([60], sleeps)
+        waves = [[result['project'] for result in results] for results in rollout['waves']]
+        self.assertEqual([['project_a_code'], ['project_b_code'], ['project_c_code'], ['project_d_code']], waves)
+        self.assertIn('project_d_code: followup tests failed', rollout['halted'])
+        self.assertEqual(['project_e_code'], rollout['not_started'])
+        self.assertIn('HALTED', lib_rollout.make_report(rollout))
+
+    def test_roll_out__no_canaries(self):
+        """
+        Checks that a rollout with no canaries skips the canary-wave and soak, and updates every project in waves.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / 'run_history.sqlite3'
+            project_paths = [Path(temp_dir) / f'project_{letter}_code' for letter in 'ab']
+
+            def fake_runner(project_path: Path) -> dict:
+                lib_run_history.start_run()
+                lib_run_history.note(outcome='no-changes')
+                lib_run_history.save_run(project_path, db_path=db_path)
+                return {'returncode': 0, 'seconds': 5.0, 'output_tail': ''}
+
+            sleeps = []
+            settings = {'soak_minutes': 1, 'window_minutes': 120, 'max_parallel': 1}
+            rollout = lib_rollout.roll_out(
+                project_paths, [], settings, fake_runner, lambda path: None, sleeps.append, db_path
+            )
+        self.assertEqual([], sleeps)
+        waves = [[result['project'] for result in results] for results in rollout['waves']]
+        self.assertEqual([[], ['project_a_code'], ['project_b_code']], waves)
+        self.assertIsNone(rollout['halted'])
+
+
+class TestEmailer(unittest.TestCase):
+    def setUp(self):
+        self.smtp_sink = SmtpSink()
+        settings = unittest.mock.Mock(
+            sys_admin_recipients=[['sys admin', 'sysadmin@example.com']],
+            email_from='updater@example.com',
+            email_host='127.0.0.1',
+            email_host_port=self.smtp_sink.server_address[1],
+        )
+        self.settings_patch = unittest.mock.patch.object(lib_emailer.lib_settings, 'get_settings', return_value=settings)
+        self.settings_patch.start()
+
+    def tearDown(self):
+        self.settings_patch.stop()
+        lib_emailer.close_emailers()
+        self.smtp_sink.shutdown()
+        self.smtp_sink.server_close()
+
+    def test_create_update_ok_message__template(self):
+        """
+        Checks the rendered message, including that the diff's indentation is kept.
+        """
+        emailer = lib_emailer.get_emailer(Path('/path/to/project_code'))
+        message = emailer.create_update_ok_message('-        foo==1\n+        foo==2', 'a note')
+        expected = (
+            '\nThe venv for the project ``project_code`` has been auto-updated successfully. \n\na note\n\n'
+            'The requirements.txt diff:\n\n-        foo==1\n+        foo==2.\n\n(end-of-message)\n'
+        )
+        self.assertEqual(expected, message)
+
+    def test_send_email__one_session_and_attached_diff(self):
+        """
+        Checks that a run's emails share one Emailer and SMTP session, and that a large diff is attached gzipped.
+        """
+        diff_text = '\n'.join(f'+package{i}==1.0' for i in range(50))
+        problems = {'collectstatic_problems': None, 'copy_problems': None, 'test_problems': None}
+        recipients = [['admin', 'admin@example.com']]
+        with unittest.mock.patch.dict(os.environ, {'SLFUPDTR__EMAIL_DIFF_INLINE_MAX_BYTES': '100'}):
+            emailer = lib_emailer.get_emailer(Path('/path/to/project_code'))
+            emailer.send_email(emailer.sys_admin_recipients, emailer.create_setup_problem_message('first'))
+            sent = lib_emailer.send_email_of_diffs(Path('/path/to/project_code'), diff_text, problems, recipients)
+            same_emailer = lib_emailer.get_emailer('/path/to/project_code') is emailer
+            lib_emailer.close_emailers()
+        self.assertTrue(sent and same_emailer)
+        self.assertEqual((1, 2), (self.smtp_sink.session_count, len(self.smtp_sink.messages)))
+        attached = self.smtp_sink.messages[1]
+        self.assertIn('(50 lines) is attached, gzipped', attached['body'])
+        self.assertEqual(diff_text, gzip.decompress(attached['attachments'][lib_emailer.DIFF_ATTACHMENT_NAME]).decode())
+
+    def test_send_email_of_diffs__problems_and_invalid_envar(self):
+        """
+        Checks that the problem-messages are listed in order, skipping empty ones; and that an invalid inline-limit
+          falls back to the default, so a small diff is still inlined.
+        """
+        problems = {
+            'collectstatic_problems': None,
+            'copy_problems': 'copy failed',
+            'test_problems': '',
+            'bisect_report': 'bisected',
+        }
+        recipients = [['admin', 'admin@example.com']]
+        with unittest.mock.patch.dict(os.environ, {'SLFUPDTR__EMAIL_DIFF_INLINE_MAX_BYTES': '50KB'}):
+            sent = lib_emailer.send_email_of_diffs(Path('/path/to/project_code'), '+foo==2', problems, recipients)
+            lib_emailer.close_emailers()
+        self.assertTrue(sent)
+        body = self.smtp_sink.messages[0]['body']
+        self.assertIn('problems which should be reviewed:\ncopy failed\n\nbisected\n', body)
+        self.assertIn('The requirements.txt diff:\n\n+foo==2.', body)
+
+    def test_close__dropped_session(self):
+        """
+        Checks that closing a session the server already dropped is ignored, but that other errors aren't swallowed.
+        """
+        emailer = lib_emailer.get_emailer(Path('/path/to/project_code'))
+        emailer.smtp = unittest.mock.Mock(quit=unittest.mock.Mock(side_effect=ConnectionResetError))
+        emailer.close()
+        self.assertIsNone(emailer.smtp)
+        emailer.smtp = unittest.mock.Mock(quit=unittest.mock.Mock(side_effect=AttributeError))
+        with self.assertRaises(AttributeError):
+            emailer.close()
+        emailer.smtp = None
+
+
+class TestFactsCache(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_get__cached_until_a_source_changes(self):
+        """
+        Checks that a fact is discovered once, served from the cache (also by a new instance), and rediscovered
+          once its source changes; and that a fact whose source changed just now isn't cached.
+        """
+        calls = []
+
+        def discover(project_path: Path) -> list:
+            calls.append(project_path)
+            return [['admin', 'admin@example.com']]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'project_code'
+            project_path.mkdir()
+            env_path = Path(temp_dir) / '.env'
+            env_path.write_text('ADMINS_JSON=\'[["admin", "admin@example.com"]]\'\n')
+            racy_values = [lib_facts_cache.FactsCache(project_path).get('email_addresses', discover, project_path)]
+            racy_values.append(lib_facts_cache.FactsCache(project_path).get('email_addresses', discover, project_path))
+            racy_calls = len(calls)
+            with unittest.mock.patch.object(lib_facts_cache, 'RACY_SECONDS', 0):
+                lib_facts_cache.FactsCache(project_path).get('email_addresses', discover, project_path)
+                cached = lib_facts_cache.FactsCache(project_path).get('email_addresses', discover, project_path)
+                warm_calls = len(calls)
+                env_path.write_text('ADMINS_JSON=\'[["other", "other@example.com"]]\'\n')
+                lib_facts_cache.FactsCache(project_path).get('email_addresses', discover, project_path)
+        self.assertEqual(2, racy_calls)  # the `.env` was just written, so not cached
+        self.assertEqual(racy_values[0], racy_values[1])
+        self.assertEqual(3, warm_calls)
+        self.assertEqual([['admin', 'admin@example.com']], cached)
+        self.assertEqual(4, len(calls))
+
+    def test_get__group_sources_and_decoding(self):
+        """
+        Checks that an entry added to the project directory invalidates the group, and that cached values come back
+          as the callers' types.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'project_code'
+            project_path.mkdir()
+            with unittest.mock.patch.object(lib_facts_cache, 'RACY_SECONDS', 0):
+                facts = lib_facts_cache.FactsCache(project_path)
+                facts.get('group', lambda: 'staff')
+                facts.get('uv_path', lambda: Path(sys.executable))
+                facts = lib_facts_cache.FactsCache(project_path)
+                (group, uv_path) = (facts.get('group', lambda: 'changed'), facts.get('uv_path', lambda: None))
+                (project_path / 'new_file.txt').write_text('x')
+                group_after = lib_facts_cache.FactsCache(project_path).get('group', lambda: 'changed')
+        self.assertEqual('staff', group)
+        self.assertEqual(Path(sys.executable), uv_path)
+        self.assertEqual('changed', group_after)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_run_phase__resumes_after_interruption(self):
+        """
+        Checks that a resumed journal skips completed phases (returning their recorded results), and notes the
+          phase that was interrupted.
+        """
+        calls = []
+
+        def phase(name):
+            calls.append(name)
+            if name == 'copy':
+                raise RuntimeError('killed')  # stands in for a crash
+            return [name, 1]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'project_code'
+            compiled_path = Path(temp_dir) / 'local_2025-01-01T02-00-00.txt'
+            compiled_path.write_text('requests==2.32.4\n')
+            checkpoint = lib_checkpoint.Checkpoint(project_path)
+            self.assertFalse(checkpoint.load())
+            checkpoint.begin('abc123', compiled_path, None)
+            checkpoint.run_phase('sync', phase, 'sync')
+            with self.assertRaises(RuntimeError):
+                checkpoint.run_phase('copy', phase, 'copy')
+            resumed = lib_checkpoint.Checkpoint(project_path)
+            self.assertTrue(resumed.load())
+            sync_result = resumed.run_phase('sync', phase, 'sync')
+            self.assertEqual('copy', resumed.interrupted_phase)
+            self.assertEqual(compiled_path, resumed.compiled_requirements)
+            resumed.clear()
+            self.assertFalse(lib_checkpoint.Checkpoint(project_path).load())
+        self.assertEqual(['sync', 1], sync_result)
+        self.assertEqual(['sync', 'copy'], calls)  # sync not re-run
+
+    def test_load__discards_stale_journal(self):
+        """
+        Checks that a journal whose compile-file is gone is discarded.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'project_code'
+            checkpoint = lib_checkpoint.Checkpoint(project_path)
+            checkpoint.begin('abc123', Path(temp_dir) / 'gone.txt', None)
+            self.assertFalse(lib_checkpoint.Checkpoint(project_path).load())
+            self.assertFalse(checkpoint.journal_path.exists())
+
+    def test_load__invalid_max_age(self):
+        """
+        Checks that an invalid max-age setting falls back to the default, so a fresh journal is still resumed.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_path = Path(temp_dir) / 'project_code'
+            compiled_path = Path(temp_dir) / 'requirements_backup.txt'
+            compiled_path.write_text('foo==1\n')
+            lib_checkpoint.Checkpoint(project_path).begin('abc123', compiled_path, None)
+            with unittest.mock.patch.dict('os.environ', {'SLFUPDTR__CHECKPOINT_MAX_AGE_HOURS': 'three days'}):
+                self.assertTrue(lib_checkpoint.Checkpoint(project_path).load())
+
+    def test_write_text_atomically__keeps_mode(self):
+        """
+        Checks that an atomic write replaces the text, keeps the file's permissions, and leaves no temp-file.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'local.txt'
+            path.write_text('old\n')
+            path.chmod(0o664)
+            lib_common.write_text_atomically(path, 'new\n')
+            self.assertEqual('new\n', path.read_text())
+            self.assertEqual(0o664, path.stat().st_mode & 0o777)
+            self.assertEqual(['local.txt'], [p.name for p in Path(temp_dir).iterdir()])
+
+
+class TestEndToEnd(unittest.TestCase):
+    """
+    Runs self_updater.py, as a process, on throwaway trees; see the harness section above.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.smtp_sink = SmtpSink()
+
+    def tearDown(self):
+        self.smtp_sink.shutdown()
+        self.smtp_sink.server_close()
+        self.temp_dir.cleanup()
+
+    def make_tree(self, lockfile: str, previous_lockfile: str | None, **options) -> UpdaterTree:
+        port: int = self.smtp_sink.server_address[1]
+        return UpdaterTree(Path(self.temp_dir.name), port, lockfile, previous_lockfile, **options)
+
+    def test_manage_update__update(self):
+        """
+        Checks the full update flow: sync, restart, mark-active, commit-and-push, followup tests, diff-email.
+        """
+        tree = self.make_tree('requests==2.32.4\nurllib3==2.3.0\n', 'requests==2.32.3\nurllib3==2.3.0\n')
+        result = tree.run_self_updater()
+        self.assertEqual(0, result.returncode, result.stderr)
+        ## venv synced, app restarted ---------------------------------
+        uv_calls = tree.uv_calls_path.read_text().splitlines()
+        self.assertEqual(['pip compile', 'pip install', 'pip sync'], [' '.join(call.split()[:2]) for call in uv_calls])
+        self.assertEqual('pip install --no-deps requests==2.32.4', uv_calls[1])  # just the changed pin
+        self.assertTrue(uv_calls[2].startswith('pip sync --dry-run'))  # the venv verified, not re-synced
+        self.assertTrue((tree.project_path / 'config' / 'tmp' / 'restart.txt').exists())
+        ## new backup active; new requirements committed and pushed -
+        newest_backup = lib_backup_store.find_recent_backups(tree.backup_dir, count=1)[0]
+        self.assertEqual(newest_backup, lib_backup_store.find_active_backup(tree.backup_dir))
+        self.assertTrue(newest_backup.read_text().startswith(LOCKFILE_HEADER))  # not rewritten
+        self.assertEqual('auto-update of requirements', run_git(['log', '-1', '--format=%s'], tree.remote_path).strip())
+        self.assertIn('requests==2.32.4', run_git(['show', 'main:requirements/local.txt'], tree.remote_path))
+        ## diff emailed to the project admins -----------------------
+        self.assertEqual(1, len(self.smtp_sink.messages))
+        message = self.smtp_sink.messages[0]
+        self.assertEqual(['<admin@example.com>'], message['to'])
+        self.assertIn('+requests==2.32.4', message['body'])
+        self.assertEqual(('updated', 'followup-passed', 'sent'), self.fetch_outcomes(tree))
+
+    def test_manage_update__no_changes(self):
+        """
+        Checks that an unchanged compile neither syncs nor emails.
+        """
+        tree = self.make_tree('requests==2.32.3\n', 'requests==2.32.3\n')
+        result = tree.run_self_updater()
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual(
+            ['pip compile'], [' '.join(call.split()[:2]) for call in tree.uv_calls_path.read_text().splitlines()]
+        )
+        self.assertEqual([], self.smtp_sink.messages)
+        self.assertEqual('no-changes', tree.fetch_run_record()['outcome'])
+        ## unchanged compile kept as a pointer only -----------------
+        self.assertEqual(1, len(lib_backup_store.find_recent_backups(tree.backup_dir, count=None)))
+        self.assertEqual(1, len(lib_backup_store.load_index(tree.backup_dir)))
+
+    def test_manage_update__initial_tests_fail(self):
+        """
+        Checks that failing initial tests halt the update, discard the new compile, and email the project admins.
+        """
+        tree = self.make_tree('requests==2.32.4\n', 'requests==2.32.3\n', tests_pass=False)
+        result = tree.run_self_updater()
+        self.assertNotEqual(0, result.returncode)
+        self.assertEqual(['local_2020-01-01T00-00-00.txt'], [path.name for path in tree.backup_dir.iterdir()])
+        self.assertEqual(1, len(self.smtp_sink.messages))
+        self.assertEqual(['<admin@example.com>'], self.smtp_sink.messages[0]['to'])
+        self.assertIn('Error on initial run_tests() call', self.smtp_sink.messages[0]['body'])
+        self.assertEqual(('failed', 'initial-failed', None), self.fetch_outcomes(tree))
+
+    def test_manage_update__wrong_branch(self):
+        """
+        Checks that a project not on `main` halts the update, and emails the project admins.
+        """
+        tree = self.make_tree('requests==2.32.4\n', 'requests==2.32.3\n', branch='feature')
+        result = tree.run_self_updater()
+        self.assertNotEqual(0, result.returncode)
+        self.assertFalse(tree.uv_calls_path.exists())  # halted before compiling
+        self.assertEqual(1, len(self.smtp_sink.messages))
+        self.assertIn('instead of ``main``', self.smtp_sink.messages[0]['body'])
+
+    def test_manage_update__resumes_interrupted_update(self):
+        """
+        Checks that a run finding the journal of an update interrupted after its sync finishes that update --
+          commit-and-push, email, mark-active -- without compiling or syncing again.
+        """
+        tree = self.make_tree('requests==2.32.4\n', 'requests==2.32.3\n')
+        compiled_path = tree.backup_dir / 'local_2020-01-02T00-00-00.txt'
+        shutil.copyfile(tree.lockfile_path, compiled_path)
+        checkpoint = lib_checkpoint.Checkpoint(tree.project_path)
+        checkpoint.begin('abc123', compiled_path, tree.backup_dir / 'local_2020-01-01T00-00-00.txt')
+        checkpoint.record('sync', [3, 0.1])
+        result = tree.run_self_updater()
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertFalse(tree.uv_calls_path.exists())  # no compile, no sync
+        self.assertIn('requests==2.32.4', run_git(['show', 'main:requirements/local.txt'], tree.remote_path))
+        self.assertEqual(compiled_path, lib_backup_store.find_active_backup(tree.backup_dir))
+        self.assertEqual(1, len(self.smtp_sink.messages))
+        self.assertIn('Byte-compiled 3 changed files', self.smtp_sink.messages[0]['body'])
+        self.assertFalse(checkpoint.journal_path.exists())
+        self.assertEqual(('updated', 'followup-passed', 'sent'), self.fetch_outcomes(tree))
+
+    def fetch_outcomes(self, tree: UpdaterTree) -> tuple:
+        record: dict = tree.fetch_run_record()
+        return (record['outcome'], record['test_outcome'], record['email_status'])
+
+
+def run_in_parallel() -> int:
+    """
+    Runs the test-classes across one process per core, each running its share; returns the exit-code.
+    (The tests are hermetic, so they don't interfere with each other.)
+    A process per core pays the interpreter start-up and imports once per core, not once per test; on a single core
+      there's nothing to gain, so the tests run serially.
+    """
+    worker_count: int = os.cpu_count() or 1
+    if worker_count < 2:
+        print('one core; running the tests serially')
+        return 0 if unittest.main(argv=[sys.argv[0]], exit=False).result.wasSuccessful() else 1
+    suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
+    class_sizes: dict[str, int] = {}
+    for group in suite:
+        for test in group:
+            class_name: str = test.id().split('.')[1]
+            class_sizes[class_name] = class_sizes.get(class_name, 0) + 1
+    shares: list[list[str]] = [[] for _ in range(min(worker_count, len(class_sizes)))]
+    loads: list[int] = [0] * len(shares)
+    for class_name in sorted(class_sizes, key=lambda name: (-class_sizes[name], name)):  # biggest first, to the lightest
+        lightest: int = loads.index(min(loads))
+        shares[lightest].append(class_name)
+        loads[lightest] += class_sizes[class_name]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(shares)) as executor:
+        results = list(
+            executor.map(
+                lambda share: subprocess.run([sys.executable, __file__, *share], capture_output=True, text=True), shares
+            )
+        )
+    failed_shares: list[list[str]] = [share for share, result in zip(shares, results) if result.returncode != 0]
+    for share, result in zip(shares, results):
+        if result.returncode != 0:
+            print(f'FAILED in {", ".join(share)}\n{result.stderr[-3000:]}')
+    print(f'ran {sum(class_sizes.values())} tests in {len(shares)} processes in {time.monotonic() - start:.1f}s')
+    return 1 if failed_shares else 0
+
+
 if __name__ == '__main__':
+    if sys.argv[1:] == ['--parallel']:
+        sys.exit(run_in_parallel())
     unittest.main()